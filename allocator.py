@@ -0,0 +1,69 @@
+import time
+from sqlite3 import Connection
+from typing import Dict, Optional
+
+# Пул свободных устройств - частичные индексы по status = 'Free'.
+# Внутри пула устройства выдаются по кругу: сначала то, что дольше всех
+# не выдавалось (last_claimed_at), при равенстве - по component_id.
+_CLAIM_QUERY = """
+    UPDATE components
+    SET status = 'Active', groups_id = ?, last_claimed_at = ?
+    WHERE component_id = (
+        SELECT component_id FROM components
+        WHERE status = 'Free' AND component_type = ?{filters}
+        ORDER BY last_claimed_at, component_id
+        LIMIT 1
+    )
+    RETURNING component_id, location, port1, port2, ip, port1_user, port2_user
+"""
+
+CLAIM_COLUMNS = ("component_id", "location", "port1", "port2", "ip", "port1_user", "port2_user")
+
+
+def claim_query(model: Optional[str], location: Optional[int]) -> str:
+    """Текст запроса выдачи устройства из пула с нужными фильтрами"""
+    filters = ""
+    if model is not None:
+        filters += " AND model = ?"
+    if location is not None:
+        filters += " AND location = ?"
+    return _CLAIM_QUERY.format(filters=filters)
+
+
+def claim_component(
+        db: Connection,
+        component_type: str,
+        groups_id: str,
+        model: Optional[str] = None,
+        location: Optional[int] = None,
+) -> Optional[Dict[str, str]]:
+    """
+    Забирает из пула одно свободное устройство одним UPDATE ... RETURNING.
+    Возвращает поля устройства или None, если пул пуст.
+    Транзакцией управляет вызывающий код.
+    """
+    params = [groups_id, time.time_ns(), component_type]
+    if model is not None:
+        params.append(model)
+    if location is not None:
+        params.append(location)
+    row = db.execute(claim_query(model, location), params).fetchone()
+    return dict(zip(CLAIM_COLUMNS, row)) if row else None
+
+
+def free_pool_size(
+        db: Connection,
+        component_type: str,
+        model: Optional[str] = None,
+        location: Optional[int] = None,
+) -> int:
+    """Количество свободных устройств в пуле"""
+    query = "SELECT COUNT(*) FROM components WHERE status = 'Free' AND component_type = ?"
+    params = [component_type]
+    if model is not None:
+        query += " AND model = ?"
+        params.append(model)
+    if location is not None:
+        query += " AND location = ?"
+        params.append(location)
+    return db.execute(query, params).fetchone()[0]
@@ -0,0 +1,254 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple, Union
+
+import yaml
+
+# Сколько ansible-playbook одновременно может настраивать одну группу
+# коммутаторов (KK-224, KK-344, KK-411); разные группы идут параллельно
+GROUP_LIMIT = int(os.getenv("ANSIBLE_GROUP_LIMIT", "1"))
+MAX_WORKERS = int(os.getenv("ANSIBLE_WORKERS", "8"))
+# Окно (с), в течение которого изменения одной группы копятся для общего запуска
+BATCH_WINDOW = float(os.getenv("ANSIBLE_BATCH_WINDOW", "0.5"))
+
+
+def run_ansible_playbook(
+        playbook_path: str,
+        inventory_path: str = "",
+        verbose: bool = False
+) -> Dict[str, Union[bool, str]]:
+    """
+    Выполняет Ansible playbook на КК
+    :param playbook_path: Путь к файлу playbook.yml
+    :param inventory_path: Путь к inventory-файлу (опционально)
+    :param verbose: Вывод подробной информации
+    :return: Словарь с результатами выполнения
+    """
+
+    # Проверка существования playbook
+    if not os.path.exists(playbook_path):
+        return {
+            "success": False,
+            "error": f"Playbook file not found: {playbook_path}"
+        }
+
+    # Формирование базовой команды
+    command = ["ansible-playbook", playbook_path]
+
+    # Добавление inventory файла
+    if inventory_path:
+        if not os.path.exists(inventory_path):
+            return {
+                "success": False,
+                "error": f"Inventory file not found: {inventory_path}"
+            }
+        command.extend(["-i", inventory_path])
+
+    # Добавление verbose режима
+    if verbose:
+        command.append("-vvvv")
+
+    try:
+        # Выполнение команды
+        result = subprocess.run(
+            command,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+
+        return {
+            "success": True,
+            "stdout": result.stdout,
+            "stderr": result.stderr,
+            "return_code": result.returncode
+        }
+
+    except subprocess.CalledProcessError as e:
+        return {
+            "success": False,
+            "error": "Playbook execution failed",
+            "stdout": e.stdout,
+            "stderr": e.stderr,
+            "return_code": e.returncode
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Unexpected error: {str(e)}"
+        }
+
+
+def write_group_playbooks(device_group: Dict[str, dict], prefix: str = "lab") -> Dict[str, str]:
+    """
+    Записывает по одному playbook на группу коммутаторов в отдельный временный каталог.
+    Возвращает пути: {группа Ansible: путь к playbook}. Пустой словарь - настраивать нечего.
+    """
+    if not device_group:
+        return {}
+    directory = tempfile.mkdtemp(prefix=re.sub(r"[^\w.-]", "_", prefix) + "-")
+    playbooks = {}
+    try:
+        for group_name, play in device_group.items():
+            path = os.path.join(directory, f"{group_name}.yaml")
+            with open(path, "w", encoding='utf-8') as f:
+                f.write(yaml.dump([play], indent=2, allow_unicode=True))
+            playbooks[group_name] = path
+    except Exception:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+    return playbooks
+
+
+def remove_playbooks(playbooks: Dict[str, str]) -> None:
+    """Удаляет временные каталоги playbook"""
+    for directory in {os.path.dirname(path) for path in playbooks.values()}:
+        shutil.rmtree(directory, ignore_errors=True)
+    return None
+
+
+def _line_key(line: str) -> str:
+    """Команда без отрицания: «cdp enable» и «no cdp enable» настраивают одно и то же"""
+    line = line.strip()
+    return line[3:] if line.startswith("no ") else line
+
+
+def merge_tasks(task_lists: Iterable[List[dict]]) -> List[dict]:
+    """
+    Сливает задания нескольких запусков в одно задание на интерфейс.
+    Строки конфигурации идут в порядке поступления; из противоречащих друг
+    другу команд (X / no X) остаётся последняя, чтобы итог совпадал с
+    последовательным применением исходных playbook.
+    """
+    merged: Dict[str, dict] = {}
+    counts: Dict[str, int] = {}
+    result = []
+    for tasks in task_lists:
+        for task in tasks:
+            config = task.get('ios_config', {})
+            parents = config.get('parents')
+            if parents is None:
+                result.append(task)
+                continue
+            if parents not in merged:
+                merged[parents] = {
+                    'name': task['name'],
+                    'ios_config': {'parents': parents, 'lines': {}},
+                }
+                counts[parents] = 0
+                result.append(merged[parents])
+            lines = merged[parents]['ios_config']['lines']
+            for line in config.get('lines', []):
+                key = _line_key(line)
+                lines.pop(key, None)
+                lines[key] = line
+            counts[parents] += 1
+    for parents, task in merged.items():
+        task['ios_config']['lines'] = list(task['ios_config']['lines'].values())
+        if counts[parents] > 1:
+            task['name'] = f"Настройка {parents}: изменений {counts[parents]}"
+    return result
+
+
+class AnsibleBackend:
+    """Применение плея группы коммутаторов запуском ansible-playbook"""
+    name = "ansible"
+
+    def __init__(self, inventory_path: str = "inventory.ini", verbose: bool = True):
+        self.inventory_path = inventory_path
+        self.verbose = verbose
+
+    def apply(self, group_name: str, play: dict) -> Dict[str, Union[bool, str]]:
+        playbooks = write_group_playbooks({group_name: play}, prefix=f"batch-{group_name}")
+        try:
+            result = run_ansible_playbook(
+                playbook_path=playbooks[group_name],
+                inventory_path=self.inventory_path,
+                verbose=self.verbose
+            )
+        finally:
+            remove_playbooks(playbooks)
+        result["backend"] = self.name
+        return result
+
+    def close(self) -> None:
+        return None
+
+
+class PlaybookExecutor:
+    """
+    Параллельный запуск ansible-playbook с объединением изменений.
+    Задания, пришедшие для группы коммутаторов в течение окна batch_window
+    (а также пока группа занята предыдущим запуском), сливаются в один playbook
+    и применяются одним запуском; его результат получает каждый отправитель.
+    Разные группы настраиваются параллельно, одна группа - не более group_limit
+    запусков одновременно. Плей применяет backend (по умолчанию ansible-playbook;
+    другие реализации - в switch_driver).
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS, group_limit: int = GROUP_LIMIT,
+                 batch_window: float = BATCH_WINDOW, inventory_path: str = "inventory.ini",
+                 verbose: bool = True, backend=None):
+        self.group_limit = group_limit
+        self.batch_window = batch_window
+        self.backend = backend if backend is not None else AnsibleBackend(inventory_path, verbose)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ansible")
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+        self._pending: Dict[str, List[Tuple[List[dict], Future]]] = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, group_name: str) -> threading.Semaphore:
+        with self._lock:
+            if group_name not in self._semaphores:
+                self._semaphores[group_name] = threading.Semaphore(self.group_limit)
+            return self._semaphores[group_name]
+
+    def submit(self, group_name: str, tasks: List[dict]) -> Future:
+        """Ставит задания группы коммутаторов в ближайший общий запуск"""
+        future = Future()
+        with self._lock:
+            batch = self._pending.setdefault(group_name, [])
+            batch.append((tasks, future))
+            first = len(batch) == 1
+        if first:
+            timer = threading.Timer(self.batch_window, self._executor.submit, (self._flush, group_name))
+            timer.daemon = True
+            timer.start()
+        return future
+
+    def _flush(self, group_name: str) -> None:
+        with self._semaphore(group_name):
+            with self._lock:
+                batch = self._pending.pop(group_name, [])
+            if not batch:
+                return
+            play = {'hosts': group_name, 'gather_facts': 'no',
+                    'tasks': merge_tasks(tasks for tasks, _ in batch)}
+            try:
+                result = self.backend.apply(group_name, play)
+            except Exception as e:
+                result = {
+                    "success": False,
+                    "error": f"Unexpected error: {str(e)}"
+                }
+        result["batch_size"] = len(batch)
+        for _, future in batch:
+            future.set_result(result)
+
+    def run(self, plays: Dict[str, dict]) -> Dict[str, Dict[str, Union[bool, str]]]:
+        """Применяет плеи групп коммутаторов и ждёт завершения; результаты по группам"""
+        futures = {
+            group_name: self.submit(group_name, play['tasks'])
+            for group_name, play in plays.items()
+        }
+        return {group_name: future.result() for group_name, future in futures.items()}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        self.backend.close()
@@ -1,7 +1,7 @@
 import os
 import sqlite3
 
-from unl_store import unl_table_create
+from migrations import migrate
 
 
 def create_and_populate_database(db_filename="test.db"):
@@ -15,33 +15,9 @@ def create_and_populate_database(db_filename="test.db"):
         conn = sqlite3.connect(db_filename)
         cursor = conn.cursor()
 
-        # 1. Создание таблицы components (если она еще не существует)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS components (
-                component_id INTEGER PRIMARY KEY,
-                component_type TEXT,
-                location INTEGER,
-                model TEXT,
-                status TEXT,
-                port1 TEXT,
-                port2 TEXT,
-                groups_id TEXT DEFAULT NULL,
-                ip TEXT,
-                port1_user TEXT,
-                port2_user TEXT
-            )
-        """)
-        print("Таблица 'components' успешно создана.")
-        cursor.execute("""
-               CREATE TABLE IF NOT EXISTS vlan_config (
-                   vlan INTEGER,
-                   switchport TEXT,
-                   groups_id TEXT DEFAULT NULL,
-                   audience INTEGER DEFAULT NULL,
-                   connection TEXT
-               )
-           """)
-        print("Таблица 'vlan_config' успешно создана.")
+        # 1. Создание схемы (таблицы, индексы, ограничения) через миграции
+        migrate(conn)
+        print("Схема базы данных успешно создана.")
 
         # 2. Заполнение таблицы данными
         data = [
@@ -62,14 +38,12 @@ def create_and_populate_database(db_filename="test.db"):
         ]
 
         cursor.executemany("""
-            INSERT INTO components (component_id, component_type, location, model, status, port1, port2, groups_id, ip)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) 
+            INSERT INTO components (component_id, component_type, location, model, status, port1, port2, groups_id, ip,
+                                    port1_user, port2_user)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, data)
         print("Данные успешно вставлены в таблицу 'components'.")
 
-        unl_table_create(db=conn)
-        print("Создание таблицы 'files'")
-
         # 4. Сохранение изменений и закрытие соединения
         conn.commit()
         print(f"База данных '{db_filename}' успешно создана и заполнена.")
@@ -0,0 +1,145 @@
+"""
+Нагрузочный тест выдачи устройств: 10 000 устройств и 500 одновременных
+запусков лабораторной работы (reserve_devices из нескольких потоков).
+Для сравнения измеряется выбор устройства прежним ORDER BY RANDOM().
+
+    python bench/allocator_load.py [--components 10000] [--launches 500] [--threads 16]
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from allocator import claim_component  # noqa: E402
+from database import ConnectionPool  # noqa: E402
+from reservation import reserve_devices  # noqa: E402
+
+# Набор устройств запуска: как в лабораторной работе 1
+LAB_DEVICES = [
+    {"name": "PC1", "device_type": "PC"},
+    {"name": "Switch1", "device_type": "Switch", "vendor": "Cisco"},
+    {"name": "Switch2", "device_type": "Switch", "vendor": "Any"},
+    {"name": "PC2", "device_type": "PC"},
+]
+LOCATIONS = (224, 344, 411)
+MODELS = ("Cisco", "Huawei")
+
+# Выбор устройства до allocator.py: сортировка всех свободных устройств вида
+LEGACY_PICK = """
+    SELECT component_id, location, port1, port2, ip, port1_user, port2_user FROM components
+    WHERE component_type = ? AND model = ? AND status = 'Free'
+    ORDER BY RANDOM() LIMIT 1
+"""
+
+
+def populate(pool: ConnectionPool, components: int) -> None:
+    """Устройства: 40% коммутаторов, 10% маршрутизаторов, остальное - PC"""
+    rows = []
+    for component_id in range(1, components + 1):
+        share = component_id % 10
+        kind = "Switch" if share < 4 else "Router" if share == 4 else "PC"
+        model = None if kind == "PC" else MODELS[component_id % len(MODELS)]
+        rows.append((component_id, kind, LOCATIONS[component_id % len(LOCATIONS)], model, "Free",
+                     f"f1/0/{component_id % 48}", f"f1/1/{component_id % 48}", f"10.0.0.1:{2000 + component_id}",
+                     "f0/1", "f0/2"))
+    with pool.unit_of_work() as conn:
+        conn.executemany("""
+            INSERT INTO components (component_id, component_type, location, model, status,
+                                    port1, port2, ip, port1_user, port2_user)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def run_launches(pool: ConnectionPool, launches: int, threads: int) -> Dict[str, object]:
+    """Одновременные запуски: каждый поток резервирует свою долю групп"""
+    latencies: List[float] = []
+    failures: List[str] = []
+    lock = threading.Lock()
+
+    def work(worker: int) -> None:
+        for number in range(worker, launches, threads):
+            started = time.perf_counter()
+            try:
+                with pool.checkout() as conn:
+                    result = reserve_devices(conn, [dict(device) for device in LAB_DEVICES], f"G{number}")
+                error = None if result else result.describe()
+            except Exception as e:
+                error = repr(e)
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+                if error:
+                    failures.append(error)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=work, args=(worker,)) for worker in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return {"elapsed": time.perf_counter() - started, "latencies": latencies, "failures": failures}
+
+
+def pick_timings(pool: ConnectionPool, picks: int) -> Dict[str, float]:
+    """Среднее время выбора одного коммутатора (мс); выдача откатывается"""
+    timings = {}
+    with pool.checkout() as conn:
+        for name, pick in (
+                ("allocator", lambda: claim_component(conn, "Switch", "bench", model="Cisco")),
+                ("ORDER BY RANDOM()", lambda: conn.execute(LEGACY_PICK, ("Switch", "Cisco")).fetchone())):
+            conn.execute("BEGIN")
+            started = time.perf_counter()
+            for _ in range(picks):
+                pick()
+            timings[name] = (time.perf_counter() - started) * 1000 / picks
+            conn.rollback()
+    return timings
+
+
+def bench(components: int, launches: int, threads: int) -> int:
+    with tempfile.TemporaryDirectory() as directory:
+        pool = ConnectionPool(str(Path(directory) / "load.db"), max_connections=threads, timeout=60)
+        try:
+            populate(pool, components)
+            result = run_launches(pool, launches, threads)
+            with pool.checkout() as conn:
+                active, groups, incomplete = conn.execute("""
+                    SELECT COUNT(*), COUNT(DISTINCT groups_id),
+                           (SELECT COUNT(*) FROM (SELECT groups_id FROM components WHERE status = 'Active'
+                                                  GROUP BY groups_id HAVING COUNT(*) != ?))
+                    FROM components WHERE status = 'Active'
+                """, (len(LAB_DEVICES),)).fetchone()
+            timings = pick_timings(pool, 200)
+        finally:
+            pool.close()
+    latencies = result["latencies"]
+    print(f"{components} устройств, {launches} запусков в {threads} потоках: {result['elapsed']:.2f} с, "
+          f"{launches / result['elapsed']:.0f} запусков/с")
+    print(f"Задержка запуска: p50 {percentile(latencies, 0.5):.1f} мс, p95 {percentile(latencies, 0.95):.1f} мс, "
+          f"макс. {max(latencies):.1f} мс")
+    print(f"Выдано {active} устройств {groups} группам, ошибок {len(result['failures'])}, "
+          f"групп с неполным набором {incomplete}")
+    for name, timing in timings.items():
+        print(f"Выбор коммутатора ({name}): {timing:.3f} мс")
+    for failure in result["failures"][:5]:
+        print(f"✖ {failure}")
+    ok = not result["failures"] and groups == launches and active == launches * len(LAB_DEVICES) and not incomplete
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест выдачи устройств")
+    parser.add_argument("--components", type=int, default=10000, help="устройств в базе")
+    parser.add_argument("--launches", type=int, default=500, help="одновременных запусков")
+    parser.add_argument("--threads", type=int, default=16, help="потоков запуска")
+    args = parser.parse_args()
+    sys.exit(bench(args.components, args.launches, args.threads))
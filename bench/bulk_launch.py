@@ -0,0 +1,143 @@
+"""
+Запуск лабораторной работы для всей учебной группы: N последовательных
+run_lab (как сейчас запускает преподаватель, группа за группой) против одного
+вызова run_labs_bulk. Коммутаторы не нужны: плей применяет имитатор с
+задержкой --apply-delay (время одного запуска ansible-playbook), UNL
+генерируются настоящим пулем процессов из шаблона лабораторной работы 1.
+
+    python bench/bulk_launch.py [--groups 30] [--apply-delay 1.0] [--workers 4]
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+LOCATIONS = (224, 344, 411)
+
+
+class SimulatedBackend:
+    """Применение плея без коммутаторов: задержка одного запуска и счётчик запусков"""
+    name = "simulated"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.applied = 0
+        self._lock = threading.Lock()
+
+    def apply(self, group_name: str, play: dict) -> Dict[str, object]:
+        with self._lock:
+            self.applied += 1
+        time.sleep(self.delay)
+        return {"success": True, "stdout": "", "backend": self.name}
+
+    def close(self) -> None:
+        return None
+
+
+def prepare_workdir(path: Path) -> None:
+    """Каталог сервиса: каталог лабораторных работ и шаблон лабораторной работы 1"""
+    shutil.copy(ROOT / "labs_config.yaml", path)
+    (path / "templates").mkdir()
+    shutil.copy(ROOT / "templates" / "Lab_2_2.html", path / "templates" / "1.html")
+
+
+def populate(conn, groups: int) -> None:
+    """По два коммутатора и два PC на группу (лабораторная работа 1), свои порты у каждого устройства"""
+    conn.execute("DELETE FROM components")
+    rows = []
+    for number in range(2 * groups):
+        rows.append((len(rows) + 1, "Switch", LOCATIONS[number % len(LOCATIONS)], "Cisco", "Free",
+                     f"f1/0/{2 * number + 1}", f"f1/0/{2 * number + 2}", f"10.0.0.1:{3000 + number}",
+                     f"f0/{2 * number + 1}", f"f0/{2 * number + 2}"))
+    for number in range(2 * groups):
+        rows.append((len(rows) + 1, "PC", 2000 + number, None, "Free",
+                     2000 + number, None, f"pnet:{4000 + number}", None, None))
+    conn.executemany("""
+        INSERT INTO components (component_id, component_type, location, model, status,
+                                port1, port2, ip, port1_user, port2_user)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+
+def launched(main, group_ids: List[str]) -> int:
+    """Сколько групп получили UNL"""
+    with main.db_pool.checkout() as conn:
+        return sum(main.unl_file_info(conn, group_id) is not None for group_id in group_ids)
+
+
+def bench(groups: int, apply_delay: float, workers: int) -> int:
+    with tempfile.TemporaryDirectory() as directory:
+        prepare_workdir(Path(directory))
+        os.chdir(directory)
+        os.environ["RENDER_WORKERS"] = str(workers)
+        os.environ.pop("ANSIBLE_DISABLE", None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            import bd
+            bd.create_and_populate_database("test.db")
+            import main
+            main.db_pool.migrate()
+            with main.db_pool.unit_of_work() as conn:
+                populate(conn, groups)
+            main.dashboard.invalidate()
+            main.render_service.start([main.lab_template_path(1)])
+        backend = SimulatedBackend(apply_delay)
+        main.playbook_executor.backend = backend
+        try:
+            single_groups = [f"S{number}" for number in range(groups)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                for group_id in single_groups:
+                    main.run_lab(1, group_id, use_warm=False)
+                single = time.perf_counter() - started
+            single_applied, single_ok = backend.applied, launched(main, single_groups)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                backend.delay = 0
+                for group_id in single_groups:
+                    main.clear_bd(group_id)
+                backend.delay, backend.applied = apply_delay, 0
+
+            bulk_groups = [f"B{number}" for number in range(groups)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                manifest = main.run_labs_bulk(1, bulk_groups)
+                bulk = time.perf_counter() - started
+            bulk_applied, bulk_ok = backend.applied, launched(main, bulk_groups)
+            statuses = [group["status"] for group in manifest["groups"]]
+        finally:
+            main.job_queue.shutdown()
+            main.playbook_executor.shutdown()
+            main.render_service.shutdown()
+            main.db_pool.close()
+            os.chdir(ROOT)
+
+    print(f"{groups} групп, применение плея {apply_delay * 1000:.0f} мс, процессов генерации UNL {workers}")
+    print(f"Запуски по одной группе: {single:.2f} с ({single * 1000 / groups:.0f} мс на группу), "
+          f"запусков плея {single_applied}, UNL у {single_ok} групп")
+    print(f"Один bulk-запуск:        {bulk:.2f} с ({bulk * 1000 / groups:.0f} мс на группу), "
+          f"запусков плея {bulk_applied}, UNL у {bulk_ok} групп")
+    print(f"Ускорение: x{single / bulk:.1f}")
+    ok = (single_ok == groups and bulk_ok == groups and statuses.count("success") == groups
+          and bulk < single)
+    if not ok:
+        print(f"✖ Регрессия: статусы bulk-запуска {sorted(set(statuses))}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="N запусков по одной группе против одного bulk-запуска")
+    parser.add_argument("--groups", type=int, default=30, help="групп в учебной группе")
+    parser.add_argument("--apply-delay", type=float, default=1.0, help="время применения одного плея, с")
+    parser.add_argument("--workers", type=int, default=4, help="процессов генерации UNL")
+    args = parser.parse_args()
+    sys.exit(bench(args.groups, args.apply_delay, args.workers))
@@ -0,0 +1,96 @@
+"""
+Задержка применения плея группы коммутаторов: native-backend (Telnet-сессии
+из пула) против ansible-playbook. Коммутатор - имитатор fake_switch.FakeSwitch
+с задержкой ответа на команду. Имитатор не поддерживает SSH, поэтому для
+ansible-playbook измеряется нижняя граница: запуск процесса, разбор плея и
+попытка подключения (если ansible-playbook не установлен, замер пропускается).
+
+    python bench/switch_backend.py [--plays 20] [--ports 4] [--latency 0.002]
+"""
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ansible_runner import AnsibleBackend  # noqa: E402
+from fake_switch import FakeSwitch  # noqa: E402
+from switch_driver import NativeBackend, SessionPool  # noqa: E402
+
+GROUP_NAME = "KK-344"
+
+
+def lab_play(ports: int, vlan: int) -> dict:
+    """Плей запуска лабораторной работы: ports портов в access VLAN"""
+    return {"hosts": GROUP_NAME, "gather_facts": "no", "tasks": [
+        {"name": f"Настройка порта f1/0/{port} в VLAN {vlan}",
+         "ios_config": {"parents": f"interface f1/0/{port}",
+                        "lines": ["switchport mode access", f"switchport access vlan {vlan}", "no cdp enable"]}}
+        for port in range(1, ports + 1)]}
+
+
+def write_inventory(path: Path, port: int) -> str:
+    path.write_text(
+        f"[{GROUP_NAME}]\nsw344 ansible_host=127.0.0.1 native_port={port} ansible_port={port} "
+        f"ansible_user=admin ansible_password=admin\n\n"
+        f"[{GROUP_NAME}:vars]\nnative_transport=telnet\n"
+        f"ansible_connection=ansible.netcommon.network_cli\nansible_network_os=cisco.ios.ios\n",
+        encoding="utf-8")
+    return str(path)
+
+
+def timings(plays: int, ports: int, apply: Callable[[dict], Dict]) -> List[float]:
+    """Время применения каждого плея (мс)"""
+    result = []
+    for number in range(plays):
+        started = time.perf_counter()
+        apply(lab_play(ports, 10 + number))
+        result.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def report(name: str, values: List[float]) -> None:
+    print(f"{name:<28} первый {values[0]:8.1f} мс, медиана {statistics.median(values):8.1f} мс, "
+          f"макс. {max(values):8.1f} мс")
+
+
+def bench(plays: int, ports: int, latency: float) -> int:
+    switch = FakeSwitch(GROUP_NAME, latency=latency).start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            inventory = write_inventory(Path(directory) / "inventory.ini", switch.address[1])
+            native = NativeBackend(inventory, SessionPool())
+            try:
+                results = []
+                native_timings = timings(plays, ports, lambda play: results.append(native.apply(GROUP_NAME, play)))
+            finally:
+                native.close()
+            failed = [result["error"] for result in results if not result["success"]]
+            print(f"{plays} плеев по {ports} портов, задержка коммутатора {latency * 1000:.1f} мс на команду")
+            report("native (Telnet, пул сессий)", native_timings)
+            print(f"Сессий с коммутатором: {switch.connections}, команд портов: {switch.commands}")
+            if shutil.which("ansible-playbook"):
+                ansible = AnsibleBackend(inventory, verbose=False)
+                report("ansible-playbook", timings(min(plays, 3), ports,
+                                                   lambda play: ansible.apply(GROUP_NAME, play)))
+            else:
+                print("ansible-playbook не установлен: замер пропущен")
+    finally:
+        switch.stop()
+    for error in failed[:5]:
+        print(f"✖ {error}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Задержка native-backend и ansible-playbook на имитаторе")
+    parser.add_argument("--plays", type=int, default=20, help="плеев подряд")
+    parser.add_argument("--ports", type=int, default=4, help="портов в плее")
+    parser.add_argument("--latency", type=float, default=0.002, help="задержка ответа коммутатора, с")
+    args = parser.parse_args()
+    sys.exit(bench(args.plays, args.ports, args.latency))
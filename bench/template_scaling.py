@@ -0,0 +1,86 @@
+"""
+Масштабирование генерации UNL по числу узлов шаблона.
+Синтетические шаблоны - цепочка из N узлов с соединением между соседними.
+Время на узел не должно расти с размером шаблона (линейная сложность).
+
+    python bench/template_scaling.py [--sizes 50 200 1000] [--runs 5]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pnetLabParser import TemplateParams, compile_template, process_template_html  # noqa: E402
+
+# Допустимый рост времени на узел между самым маленьким и самым большим шаблоном
+MAX_PER_NODE_GROWTH = 2.0
+
+
+def synthetic_template(nodes: int) -> str:
+    """HTML страницы PNETLab с цепочкой из nodes узлов"""
+    parts = ['<html><body><div id="lab-viewport">']
+    for i in range(1, nodes + 1):
+        parts.append(
+            f'<div id="node{i}" class="context-menu node node{i} node_frame" style="top: {i}px" '
+            f'data-status="0" data-name="N{i}"><div class="tag hidden"><i class="fa"></i></div>'
+            f'<i title="Telnet: null" class="node_icon nodehtmlconsole"><img src="a.png"></i>'
+            f'<div class="node_name"><i class="node_status fa"></i>&nbsp;N{i}</div></div>')
+    for i in range(1, nodes):
+        parts.append(
+            f'<svg class="jtk-connector node{i} node{i + 1}"></svg><div class="jtk-endpoint"></div>'
+            f'<div class="jtk-overlay node{i} node{i + 1}">'
+            f'<div class="node_interface" position="src">e0/0</div>'
+            f'<div class="node_interface" position="dst">e0/1</div></div>')
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def substitutions(nodes: int) -> Tuple[Dict[str, str], List[Dict[str, str]]]:
+    """Telnet-ссылки всех узлов и интерфейсы всех соединений"""
+    telnet_links = {f'N{i}': f'telnet://10.0.0.{i % 250}:{2000 + i}' for i in range(1, nodes + 1)}
+    interface_mapping = [{f'N{i}': 'f0/1', f'N{i + 1}': 'f0/2'} for i in range(1, nodes)]
+    return telnet_links, interface_mapping
+
+
+def best_of(runs: int, action: Callable[[], object]) -> float:
+    """Лучшее время выполнения action из runs запусков (мс)"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        action()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def bench(sizes: List[int], runs: int) -> int:
+    per_node = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for nodes in sizes:
+            template_path = Path(directory) / f"synthetic_{nodes}.html"
+            content = synthetic_template(nodes)
+            template_path.write_text(content, encoding="utf-8")
+            telnet_links, interface_mapping = substitutions(nodes)
+            params = TemplateParams(template_path, "MyLab", telnet_links, interface_mapping)
+            processed = best_of(runs, lambda: process_template_html(content, params))
+            compiled = compile_template(template_path)
+            compiling = best_of(runs, lambda: compile_template(template_path))
+            rendering = best_of(runs, lambda: compiled.render(telnet_links, interface_mapping))
+            per_node[nodes] = processed / nodes
+            print(f"{nodes:>5} узлов: обработка {processed:8.1f} мс ({processed / nodes * 1000:6.1f} мкс/узел), "
+                  f"компиляция {compiling:8.1f} мс, подстановка {rendering:6.2f} мс")
+    growth = per_node[max(sizes)] / per_node[min(sizes)]
+    print(f"Рост времени обработки на узел ({min(sizes)} -> {max(sizes)} узлов): x{growth:.2f} "
+          f"(допустимо x{MAX_PER_NODE_GROWTH:.1f})")
+    return 1 if growth > MAX_PER_NODE_GROWTH else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Масштабирование генерации UNL по числу узлов")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000], help="число узлов шаблонов")
+    parser.add_argument("--runs", type=int, default=5, help="запусков на размер")
+    args = parser.parse_args()
+    sys.exit(bench(args.sizes, args.runs))
@@ -0,0 +1,103 @@
+"""
+Масштабирование подстановки портов в соединения (main.update_topology)
+по числу соединений лабораторной работы. Топология - кольцо коммутаторов,
+к каждому подключён PC. Для сравнения измеряется прежнее сопоставление
+устройств по подстроке имени (перебор всех устройств для каждого соединения).
+
+    python bench/topology_scaling.py [--switches 50 200 800] [--runs 5]
+"""
+import argparse
+import gc
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lab_catalog import LabSpec, parse_lab  # noqa: E402
+from main import update_topology  # noqa: E402
+
+# Допустимый рост времени на соединение между самой маленькой и самой большой топологией
+MAX_PER_LINK_GROWTH = 2.0
+
+
+def ring_lab(switches: int) -> LabSpec:
+    """Кольцо из switches коммутаторов, к каждому подключён PC: 2 * switches соединений"""
+    devices = ([{"name": f"PC{i}", "device_type": "PC"} for i in range(1, switches + 1)]
+               + [{"name": f"Switch{i}", "device_type": "Switch"} for i in range(1, switches + 1)])
+    topology = ([{"source": f"PC{i}(vlan)", "target": f"Switch{i}(port1)"} for i in range(1, switches + 1)]
+                + [{"source": f"Switch{i}(port2)", "target": f"Switch{i % switches + 1}(port1)", "connection": "trunk"}
+                   for i in range(1, switches + 1)])
+    return parse_lab("ring", {"devices": devices, "topology": topology})
+
+
+def reserved_devices(lab: LabSpec) -> dict:
+    """Копия лабораторной работы с портами, как после резервирования"""
+    lab_config = lab.instantiate()
+    for index, device in enumerate(lab_config["devices"]):
+        device.update(hosts=344 if device["device_type"] != "PC" else "no host",
+                      port1=f"f1/0/{index}", port2=f"f1/1/{index}", port1_user="f0/1", port2_user="f0/2")
+    return lab_config
+
+
+def legacy_update_topology(devices, topology):
+    """Сопоставление до компиляции топологии: подстрока имени и суффикса порта"""
+    for top in topology:
+        for device in devices:
+            for side in ("source", "target"):
+                if device['name'] in top[side]:
+                    if device["device_type"] == 'PC':
+                        top["vlan"] = device["port1"]
+                        top[f'name in {side}'] = device['name']
+                    for port in ("port2", "port1"):
+                        if f"({port})" in top[side]:
+                            top[side] = device[port]
+                            top[f'name in {side}'] = device['name']
+                            top[f"{side} user"] = device[f"{port}_user"]
+                            break
+                    top[f"host in {side}"] = device["hosts"]
+
+
+def best_of(runs: int, prepare: Callable[[], dict], action: Callable[[dict], None]) -> float:
+    """Лучшее время action из runs запусков (мс), каждый раз на новой копии; без сборки мусора"""
+    timings = []
+    for _ in range(runs):
+        lab_config = prepare()
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            action(lab_config)
+            timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            gc.enable()
+    return min(timings)
+
+
+def bench(sizes: List[int], runs: int) -> int:
+    per_link = {}
+    for switches in sizes:
+        started = time.perf_counter()
+        lab = ring_lab(switches)
+        compiling = (time.perf_counter() - started) * 1000
+        links = len(lab.topology)
+        resolving = best_of(runs, lambda: reserved_devices(lab),
+                            lambda config: update_topology(config["devices"], config["topology"], lab.topology))
+        legacy = best_of(runs, lambda: reserved_devices(lab),
+                         lambda config: legacy_update_topology(config["devices"], config["topology"]))
+        per_link[links] = resolving / links
+        print(f"{links:>5} соединений: компиляция {compiling:7.2f} мс, подстановка {resolving:7.3f} мс "
+              f"({resolving / links * 1000:5.2f} мкс/соединение), по подстроке {legacy:9.2f} мс")
+    growth = per_link[max(per_link)] / per_link[min(per_link)]
+    print(f"Рост времени подстановки на соединение ({min(per_link)} -> {max(per_link)}): x{growth:.2f} "
+          f"(допустимо x{MAX_PER_LINK_GROWTH:.1f})")
+    return 1 if growth > MAX_PER_LINK_GROWTH else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Масштабирование подстановки портов в топологию")
+    parser.add_argument("--switches", type=int, nargs="+", default=[50, 200, 800], help="коммутаторов в кольце")
+    parser.add_argument("--runs", type=int, default=5, help="запусков на размер")
+    args = parser.parse_args()
+    sys.exit(bench(args.switches, args.runs))
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from database import ConnectionPool
+
+# Аудитории для отображения
+AUDIENCES = (224, 344, 411)
+
+# Цвета статусов (yellow, lightgreen, lightcoral), вычислены заранее
+STATUS_COLORS = {
+    'Active': '#ffff00',
+    'Free': '#90ee90',
+}
+ERROR_COLOR = '#f08080'
+EMPTY_CELL = {"text": "", "backgroundColor": "#FFFFFF"}  # white
+
+# Снимок пересобирается не реже, чем раз в SNAPSHOT_TTL секунд:
+# так подхватываются изменения базы в обход сервиса (например, bd.py)
+SNAPSHOT_TTL = 30.0
+# Сколько последних изменений хранится для догоняющих подписчиков SSE
+HISTORY_SIZE = 64
+HEARTBEAT_INTERVAL = 15.0
+
+
+def device_cell(index: int, component_type: str, model: str, status: str, group_id) -> dict:
+    """Ячейка таблицы для устройства (index - номер строки в аудитории)"""
+    device_name = f"{component_type[0]}{index + 1}-{model}"
+    if status == 'Active' and group_id is not None:
+        device_name += f" (G{group_id})"
+    return {
+        "component_type": component_type,
+        "model": model,
+        "text": device_name,
+        "status": status,
+        "group_id": group_id,
+        "backgroundColor": STATUS_COLORS.get(status, ERROR_COLOR),
+    }
+
+
+def build_table(db: sqlite3.Connection, audiences: Sequence[int] = AUDIENCES) -> dict:
+    """Таблица состояния устройств по аудиториям одним запросом"""
+    placeholders = ", ".join("?" * len(audiences))
+    columns = {aud: [] for aud in audiences}
+    for location, component_type, model, status, group_id in db.execute(
+            "SELECT location, component_type, model, status, groups_id FROM components "
+            f"WHERE location IN ({placeholders}) ORDER BY location, component_id", tuple(audiences)):
+        column = columns[location]
+        column.append(device_cell(len(column), component_type, model, status, group_id))
+
+    max_rows = max((len(column) for column in columns.values()), default=0)
+    return {
+        "table": {
+            "headers": [f"P{aud}" for aud in audiences],
+            "rows": [
+                {"cells": [columns[aud][i] if i < len(columns[aud]) else EMPTY_CELL for aud in audiences]}
+                for i in range(max_rows)
+            ]
+        }
+    }
+
+
+def changed_cells(old: dict, new: dict) -> Optional[List[dict]]:
+    """
+    Ячейки, изменившиеся между двумя таблицами: [{row, col, cell}].
+    None - изменилась форма таблицы, нужна полная перерисовка.
+    """
+    old_table, new_table = old["table"], new["table"]
+    if old_table["headers"] != new_table["headers"] or len(old_table["rows"]) != len(new_table["rows"]):
+        return None
+    changes = []
+    for row_index, (old_row, new_row) in enumerate(zip(old_table["rows"], new_table["rows"])):
+        for col_index, (old_cell, new_cell) in enumerate(zip(old_row["cells"], new_row["cells"])):
+            if old_cell != new_cell:
+                changes.append({"row": row_index, "col": col_index, "cell": new_cell})
+    return changes
+
+
+class Dashboard:
+    """
+    Кэшированный снимок таблицы устройств.
+    Пересобирается только после invalidate() (резервирование/освобождение)
+    или по истечении SNAPSHOT_TTL; подписчики SSE получают изменённые ячейки.
+    """
+
+    def __init__(self, db_pool: ConnectionPool, audiences: Sequence[int] = AUDIENCES, ttl: float = SNAPSHOT_TTL):
+        self.db_pool = db_pool
+        self.audiences = tuple(audiences)
+        self.ttl = ttl
+        self.version = 0
+        self.table: Optional[dict] = None
+        self.body = b""
+        self.etag = ""
+        self._built_at = 0.0
+        self._dirty = True
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def invalidate(self) -> None:
+        """Отмечает снимок устаревшим после резервирования или освобождения устройств"""
+        with self._lock:
+            self._dirty = True
+        try:
+            # Пересборка сразу, чтобы подписчики SSE получили изменения
+            self.refresh()
+        except sqlite3.Error as e:
+            print(f"Ошибка обновления таблицы устройств: {e}")
+
+    def snapshot(self) -> Tuple[int, str, bytes]:
+        """Текущий снимок: версия, ETag и готовое JSON-тело ответа"""
+        self.refresh()
+        with self._lock:
+            return self.version, self.etag, self.body
+
+    def refresh(self) -> None:
+        with self._lock:
+            if not self._dirty and time.monotonic() - self._built_at < self.ttl:
+                return
+            with self.db_pool.checkout() as conn:
+                table = build_table(conn, self.audiences)
+            self._built_at = time.monotonic()
+            self._dirty = False
+            if table == self.table:
+                return
+            changes = changed_cells(self.table, table) if self.table is not None else None
+            self.table = table
+            self.body = json.dumps(table, ensure_ascii=False).encode('utf-8')
+            self.etag = hashlib.sha1(self.body).hexdigest()
+            self.version += 1
+            self._history.append((self.version, changes))
+            self._changed.notify_all()
+
+    def _changes_since(self, version: int) -> Optional[List[dict]]:
+        """Изменения после версии version или None, если нужна вся таблица"""
+        if version == self.version:
+            return []
+        history = [item for item in self._history if item[0] > version]
+        if not history or history[0][0] != version + 1 or any(changes is None for _, changes in history):
+            return None
+        latest = {}
+        for _, changes in history:
+            for change in changes:
+                latest[(change["row"], change["col"])] = change
+        return list(latest.values())
+
+    def events(self) -> Iterator[str]:
+        """Поток Server-Sent Events: сначала вся таблица, затем изменённые ячейки"""
+        version, _, body = self.snapshot()
+        yield f"id: {version}\nevent: table\ndata: {body.decode('utf-8')}\n\n"
+        while True:
+            with self._lock:
+                self._changed.wait_for(lambda: self.version != version, timeout=min(self.ttl, HEARTBEAT_INTERVAL))
+                changes = self._changes_since(version)
+                version, body = self.version, self.body
+            if changes is None:
+                yield f"id: {version}\nevent: table\ndata: {body.decode('utf-8')}\n\n"
+            elif changes:
+                data = json.dumps({"version": version, "cells": changes}, ensure_ascii=False)
+                yield f"id: {version}\nevent: cells\ndata: {data}\n\n"
+            else:
+                # Проверка TTL и поддержание соединения
+                yield ": keep-alive\n\n"
+                self.refresh()
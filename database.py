@@ -0,0 +1,145 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from sqlite3 import Connection
+from typing import Iterator
+
+from migrations import configure_connection, migrate
+
+# Подготовленные запросы кэшируются модулем sqlite3 в каждом соединении по тексту SQL;
+# соединения пула переживают запросы, поэтому кэш переиспользуется
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_MS = 5000
+# Соединений в пуле (одновременно работающих с базой потоков)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+# Сколько поток ждёт свободного соединения, прежде чем получить отказ (с)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+
+class PoolTimeoutError(Exception):
+    """Все соединения пула заняты дольше допустимого"""
+
+
+class PooledConnection(Connection):
+    """Соединение пула; generation - поколение пула, в котором оно открыто"""
+    generation = 0
+
+
+class ConnectionPool:
+    """
+    Пул соединений SQLite: не более max_connections настроенных соединений,
+    которые выдаются на время работы (checkout) и возвращаются в пул.
+    Соединения настраиваются при открытии (WAL, synchronous=NORMAL, busy_timeout),
+    миграции применяются при первом подключении.
+    Повторный checkout в том же потоке получает уже выданное потоку соединение.
+    """
+
+    def __init__(self, db_filename: str, max_connections: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT,
+                 busy_timeout_ms: int = BUSY_TIMEOUT_MS, cached_statements: int = STATEMENT_CACHE_SIZE):
+        self.db_filename = db_filename
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._idle: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._local = threading.local()
+        self._migrated = False
+        self._lock = threading.Lock()
+        # Соединения, выданные до close(), при возврате закрываются
+        self._generation = 0
+
+    def _open(self) -> PooledConnection:
+        # Соединение переходит между потоками, но в каждый момент принадлежит одному
+        conn = sqlite3.connect(self.db_filename, cached_statements=self.cached_statements,
+                               check_same_thread=False, factory=PooledConnection)
+        configure_connection(conn, self.busy_timeout_ms)
+        with self._lock:
+            if not self._migrated:
+                migrate(conn)
+                self._migrated = True
+        conn.generation = self._generation
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        """
+        Берёт соединение из пула (вызывающий обязан вернуть его через release).
+        Ждёт свободного соединения не дольше timeout, затем PoolTimeoutError.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(f"Нет свободных соединений с базой данных ({self.max_connections})")
+        try:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: PooledConnection) -> None:
+        """Возвращает соединение в пул; незавершённая транзакция откатывается"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if conn.generation == self._generation:
+                self._idle.put(conn)
+            else:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Соединение с базой данных закрыто после ошибки: {e}")
+            conn.close()
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def checkout(self) -> Iterator[Connection]:
+        """Соединение на время блока with; вложенный checkout в том же потоке получает то же соединение"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self.acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self.release(conn)
+
+    @contextmanager
+    def unit_of_work(self, immediate: bool = True) -> Iterator[Connection]:
+        """
+        Явная транзакция: commit при успехе, rollback при исключении.
+        immediate - сразу взять блокировку записи (BEGIN IMMEDIATE).
+        Вложенный unit_of_work выполняется в транзакции внешнего.
+        """
+        with self.checkout() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            if conn.in_transaction:
+                conn.commit()
+
+    def migrate(self) -> None:
+        """Применяет миграции схемы (при запуске сервиса, до первого запроса)"""
+        with self.checkout():
+            pass
+
+    def close(self) -> None:
+        """Закрывает свободные соединения; выданные закроются при возврате"""
+        self._generation += 1
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return None
@@ -0,0 +1,221 @@
+import argparse
+import re
+import socket
+import socketserver
+import threading
+import time
+from typing import Dict, Optional
+
+# Имитация коммутатора Cisco IOS по Telnet для проверки и замеров
+# native-backend (switch_driver) без оборудования.
+# Поддерживаются вход, enable, режимы конфигурации и команды портов,
+# которые генерирует сервис; остальное - «% Invalid input».
+
+IAC, WILL, DO = 255, 251, 253
+OPT_ECHO, OPT_SGA, OPT_TTYPE = 1, 3, 24
+IAC_RE = re.compile(rb"\xff[\xfb-\xfe].|\xff\xfa.*?\xff\xf0", re.S)
+
+# Команды режима интерфейса: параметр и допустимые значения (None - флаг)
+INTERFACE_COMMANDS = {
+    "switchport mode": re.compile(r"access|dot1q-tunnel"),
+    "switchport access vlan": re.compile(r"\d+"),
+    "switchport trunk encapsulation": re.compile(r"dot1q"),
+    "cdp enable": None,
+}
+
+
+class FakeSwitchHandler(socketserver.StreamRequestHandler):
+    """Одна Telnet-сессия с имитатором"""
+
+    def setup(self) -> None:
+        super().setup()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.switch: FakeSwitch = self.server.switch
+        self.switch.connections += 1
+        self.mode = "login"
+        self.username = ""
+        self.interface: Optional[str] = None
+        self._pending = b""
+
+    def write(self, text: str) -> None:
+        self.wfile.write(text.encode("utf-8"))
+
+    def prompt(self) -> str:
+        hostname = self.switch.hostname
+        return {
+            "login": "Username: ",
+            "password": "Password: ",
+            "user": f"{hostname}>",
+            "enable": "Password: ",
+            "exec": f"{hostname}#",
+            "config": f"{hostname}(config)#",
+            "interface": f"{hostname}(config-if)#",
+        }[self.mode]
+
+    def read_line(self) -> Optional[str]:
+        while b"\n" not in self._pending:
+            data = self.request.recv(4096)
+            if not data:
+                return None
+            self._pending += IAC_RE.sub(b"", data)
+        line, self._pending = self._pending.split(b"\n", 1)
+        return line.rstrip(b"\r").decode("utf-8", errors="replace")
+
+    def handle(self) -> None:
+        self.wfile.write(bytes((IAC, WILL, OPT_ECHO, IAC, WILL, OPT_SGA, IAC, DO, OPT_TTYPE)))
+        self.write(self.prompt())
+        while True:
+            line = self.read_line()
+            if line is None:
+                return
+            if self.mode not in ("password", "enable"):
+                # Коммутатор повторяет введённые символы (кроме пароля)
+                self.write(line + "\r\n")
+            else:
+                self.write("\r\n")
+            if self.switch.latency:
+                time.sleep(self.switch.latency)
+            if not self.execute(line.strip()):
+                return
+            self.write(self.prompt())
+
+    def execute(self, line: str) -> bool:
+        """Выполняет команду в текущем режиме; False - закрыть сессию"""
+        switch = self.switch
+        if self.mode == "login":
+            self.username = line
+            self.mode = "password"
+        elif self.mode == "password":
+            if (self.username, line) != (switch.username, switch.password):
+                self.write("% Authentication failed\r\n")
+                return False
+            self.mode = "user"
+        elif self.mode == "enable":
+            self.mode = "exec" if line == switch.enable_password else "user"
+        elif not line:
+            pass
+        elif line in ("exit", "logout") and self.mode in ("user", "exec"):
+            return False
+        elif self.mode == "user":
+            if line == "enable":
+                self.mode = "enable"
+            else:
+                self.invalid()
+        elif self.mode == "exec":
+            if line in ("configure terminal", "conf t"):
+                self.mode = "config"
+            elif line == "terminal length 0":
+                pass
+            elif line.startswith("show running-config interface "):
+                self.write(switch.show_interface(line.split()[-1]))
+            else:
+                self.invalid()
+        elif line == "end":
+            self.mode, self.interface = "exec", None
+        elif line == "exit":
+            self.mode, self.interface = ("config", None) if self.mode == "interface" else ("exec", None)
+        elif line.startswith("interface "):
+            self.mode, self.interface = "interface", line.split(" ", 1)[1]
+        elif self.mode == "interface" and switch.apply(self.interface, line):
+            pass
+        else:
+            self.invalid()
+        return True
+
+    def invalid(self) -> None:
+        self.write("                    ^\r\n% Invalid input detected at '^' marker.\r\n\r\n")
+
+
+class FakeSwitch:
+    """
+    Имитатор коммутатора: сервер в фоновом потоке и состояние портов в памяти.
+    latency - задержка ответа на каждую команду (с), как у CLI настоящего коммутатора.
+    """
+
+    def __init__(self, hostname: str = "Switch", host: str = "127.0.0.1", port: int = 0,
+                 username: str = "admin", password: str = "admin", enable_password: str = "admin",
+                 latency: float = 0.0):
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.enable_password = enable_password
+        self.latency = latency
+        self.interfaces: Dict[str, Dict[str, object]] = {}
+        self.commands = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer((host, port), FakeSwitchHandler, bind_and_activate=False)
+        self._server.allow_reuse_address = True
+        self._server.daemon_threads = True
+        self._server.server_bind()
+        self._server.server_activate()
+        self._server.switch = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def apply(self, interface: str, line: str) -> bool:
+        """Команда режима интерфейса; False - команда не поддерживается"""
+        negate = line.startswith("no ")
+        command = line.removeprefix("no ")
+        for key, values in INTERFACE_COMMANDS.items():
+            if values is None and command == key:
+                value = not negate
+            elif values is not None and command.startswith(key + " ") and values.fullmatch(command[len(key) + 1:]):
+                value = None if negate else command[len(key) + 1:]
+            else:
+                continue
+            with self._lock:
+                self.commands += 1
+                config = self.interfaces.setdefault(interface, {})
+                if value is None:
+                    config.pop(key, None)
+                else:
+                    config[key] = value
+            return True
+        return False
+
+    def show_interface(self, interface: str) -> str:
+        with self._lock:
+            config = dict(self.interfaces.get(interface, {}))
+        lines = [f"interface {interface}"]
+        for key, value in config.items():
+            if value is True:
+                lines.append(f" {key}")
+            elif value is False:
+                lines.append(f" no {key}")
+            else:
+                lines.append(f" {key} {value}")
+        return "\r\n".join(lines) + "\r\n"
+
+    def start(self) -> "FakeSwitch":
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"fake-{self.hostname}", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Имитатор коммутатора Cisco IOS по Telnet")
+    parser.add_argument("--hostname", default="Switch")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2323)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа на команду, с")
+    args = parser.parse_args()
+    switch = FakeSwitch(args.hostname, args.host, args.port, args.username, args.password, args.password,
+                        args.latency)
+    print(f"{args.hostname} слушает {args.host}:{switch.address[1]} (вход {args.username}/{args.password})")
+    try:
+        switch.serve_forever()
+    except KeyboardInterrupt:
+        switch.stop()
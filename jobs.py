@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from database import ConnectionPool
+
+# Обработчик задания: получает параметры и функцию для сообщения о ходе выполнения,
+# возвращает результат (сериализуемый в JSON)
+JobHandler = Callable[[dict, Callable[[str], None]], dict]
+
+JOB_COLUMNS = ("id", "kind", "payload", "status", "stage", "result", "error",
+               "created_at", "started_at", "finished_at")
+
+
+class QueueFullError(Exception):
+    """Очередь заданий переполнена"""
+
+
+class JobQueue:
+    """
+    Очередь фоновых заданий (запуск и очистка лабораторных работ).
+    Задания хранятся в таблице jobs, выполняются ограниченным пулом потоков;
+    ожидающие задания переживают перезапуск процесса (см. recover()).
+    """
+
+    def __init__(self, db_pool: ConnectionPool, handlers: Dict[str, JobHandler], max_workers: int = 4,
+                 max_pending: int = 200):
+        self.db_pool = db_pool
+        self.handlers = handlers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, payload: dict) -> str:
+        """Ставит задание в очередь и сразу возвращает его id"""
+        if kind not in self.handlers:
+            raise ValueError(f"Неизвестный тип задания: {kind}")
+        job_id = uuid.uuid4().hex
+        with self._lock, self.db_pool.unit_of_work() as conn:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')"
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                raise QueueFullError(f"В очереди уже {pending} заданий")
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, stage, created_at) VALUES (?, ?, ?, 'pending', 'queued', ?)",
+                (job_id, kind, json.dumps(payload), time.time())
+            )
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Состояние задания или None"""
+        with self.db_pool.checkout() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if not row:
+            return None
+        job = dict(zip(JOB_COLUMNS, row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def recover(self) -> int:
+        """
+        Возобновляет задания после перезапуска: ожидающие снова ставятся в пул,
+        прерванные на середине помечаются ошибкой (повтор мог бы занять ресурсы дважды).
+        """
+        with self.db_pool.unit_of_work() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE status = 'running'",
+                ("Прервано перезапуском сервиса", time.time())
+            )
+            pending = [row[0] for row in conn.execute(
+                "SELECT id FROM jobs WHERE status = 'pending' ORDER BY created_at"
+            )]
+        for job_id in pending:
+            self._executor.submit(self._run, job_id)
+        return len(pending)
+
+    def _set_stage(self, job_id: str, stage: str) -> None:
+        with self.db_pool.unit_of_work() as conn:
+            conn.execute("UPDATE jobs SET stage = ? WHERE id = ?", (stage, job_id))
+
+    def _run(self, job_id: str) -> None:
+        # Задание забирает тот, кто первым переведёт его в running
+        with self.db_pool.unit_of_work() as conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET status = 'running', stage = 'running', started_at = ? "
+                "WHERE id = ? AND status = 'pending' RETURNING kind, payload",
+                (time.time(), job_id)
+            ).fetchone()
+        if not claimed:
+            return
+        kind, payload = claimed
+        try:
+            result = self.handlers[kind](json.loads(payload), lambda stage: self._set_stage(job_id, stage))
+            status, error = 'done', None
+        except Exception as e:
+            print(f"Ошибка выполнения задания {job_id} ({kind}): {e}")
+            result, status, error = None, 'failed', str(e)
+        with self.db_pool.unit_of_work() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,167 @@
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import yaml
+
+# Конец соединения в топологии: «Имя(port1)», «Имя(port2)» или «PC(vlan)»
+ENDPOINT_RE = re.compile(r'^(?P<name>[^()\s]+)\((?P<port>port1|port2|vlan)\)$')
+
+
+class LabCatalogError(ValueError):
+    """Некорректная конфигурация лабораторных работ"""
+
+
+@dataclass(frozen=True, slots=True)
+class DeviceSpec:
+    name: str
+    device_type: str
+    # Прочие поля устройства из конфигурации (например, hosts), по порядку
+    options: Tuple[Tuple[str, object], ...] = ()
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "device_type": self.device_type, **dict(self.options)}
+
+
+@dataclass(frozen=True, slots=True)
+class Endpoint:
+    """Конец соединения: устройство и роль порта (port1, port2 или vlan для PC)"""
+    device: str
+    port: str
+
+    def __str__(self) -> str:
+        return f"{self.device}({self.port})"
+
+
+@dataclass(frozen=True, slots=True)
+class LinkSpec:
+    source: Endpoint
+    target: Endpoint
+    # Тип соединения: default (access) или trunk; прочие типы VLAN не получают
+    link_type: str = "default"
+    options: Tuple[Tuple[str, object], ...] = ()
+
+    def to_dict(self) -> dict:
+        return {"source": str(self.source), "target": str(self.target), **dict(self.options)}
+
+
+@dataclass(frozen=True, slots=True)
+class LabSpec:
+    key: str
+    devices: Tuple[DeviceSpec, ...]
+    topology: Tuple[LinkSpec, ...]
+
+    def instantiate(self) -> dict:
+        """Изменяемая копия для одного запуска: run_lab дополняет устройства и соединения на месте"""
+        return {
+            "devices": [device.to_dict() for device in self.devices],
+            "topology": [link.to_dict() for link in self.topology],
+        }
+
+
+def _options(item: dict, known: Tuple[str, ...]) -> Tuple[Tuple[str, object], ...]:
+    return tuple((key, value) for key, value in item.items() if key not in known)
+
+
+def parse_lab(key: str, config: dict) -> LabSpec:
+    """Проверяет описание одной лабораторной работы и превращает его в LabSpec"""
+    if not isinstance(config, dict):
+        raise LabCatalogError(f"{key}: описание должно быть словарём")
+    devices = config.get("devices")
+    topology = config.get("topology")
+    if not isinstance(devices, list) or not devices:
+        raise LabCatalogError(f"{key}: нет списка devices")
+    if not isinstance(topology, list):
+        raise LabCatalogError(f"{key}: нет списка topology")
+
+    device_specs = []
+    types: Dict[str, str] = {}
+    for device in devices:
+        if not isinstance(device, dict) or not device.get("name") or not device.get("device_type"):
+            raise LabCatalogError(f"{key}: у устройства должны быть name и device_type: {device}")
+        name, device_type = str(device["name"]), str(device["device_type"])
+        if name in types:
+            raise LabCatalogError(f"{key}: устройство {name} описано дважды")
+        types[name] = device_type
+        device_specs.append(DeviceSpec(name, device_type, _options(device, ("name", "device_type"))))
+
+    link_specs = []
+    for link in topology:
+        if not isinstance(link, dict) or "source" not in link or "target" not in link:
+            raise LabCatalogError(f"{key}: у соединения должны быть source и target: {link}")
+        endpoints = []
+        for side in ("source", "target"):
+            match = ENDPOINT_RE.match(str(link[side]))
+            if not match:
+                raise LabCatalogError(f"{key}: некорректный {side} «{link[side]}», ожидается Имя(port1|port2|vlan)")
+            device_type = types.get(match["name"])
+            if device_type is None:
+                raise LabCatalogError(f"{key}: соединение ссылается на неизвестное устройство {match['name']}")
+            if (device_type == "PC") != (match["port"] == "vlan"):
+                raise LabCatalogError(f"{key}: порт {match['port']} не подходит устройству {match['name']} ({device_type})")
+            endpoints.append(Endpoint(match["name"], match["port"]))
+        link_type = str(link.get("connection", "default"))
+        link_specs.append(LinkSpec(endpoints[0], endpoints[1], link_type, _options(link, ("source", "target"))))
+
+    return LabSpec(key, tuple(device_specs), tuple(link_specs))
+
+
+def parse_catalog(content: str) -> Dict[str, LabSpec]:
+    """Разбор и проверка всего файла конфигурации"""
+    config = yaml.safe_load(content)
+    if not isinstance(config, dict) or not isinstance(config.get("labs"), dict):
+        raise LabCatalogError("В конфигурации нет раздела labs")
+    return {str(key): parse_lab(str(key), lab) for key, lab in config["labs"].items()}
+
+
+class LabCatalog:
+    """
+    Каталог лабораторных работ в памяти.
+    Файл разбирается один раз и перечитывается только при изменении mtime;
+    новый каталог подменяет старый целиком и только если он корректен.
+    """
+
+    def __init__(self, path: str = "labs_config.yaml"):
+        self.path = path
+        self._labs: Optional[Dict[str, LabSpec]] = None
+        self._mtime_ns: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, LabSpec]:
+        """Загружает каталог; ошибка конфигурации при старте - исключение"""
+        with self._lock:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+            with open(self.path, "r", encoding="utf-8") as file:
+                labs = parse_catalog(file.read())
+            self._labs, self._mtime_ns = labs, mtime_ns
+            return labs
+
+    def labs(self) -> Dict[str, LabSpec]:
+        """Актуальный каталог; при изменённом файле - перечитывается"""
+        labs = self._labs
+        if labs is None:
+            return self.load()
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            print(f"Файл {self.path} недоступен, используется прежний каталог: {e}")
+            return labs
+        if mtime_ns == self._mtime_ns:
+            return labs
+        try:
+            return self.load()
+        except (OSError, yaml.YAMLError, LabCatalogError) as e:
+            # Битый файл не должен ломать запуски: работаем со старым каталогом
+            # и не перечитываем файл, пока он снова не изменится
+            print(f"Ошибка перечитывания {self.path}, используется прежний каталог: {e}")
+            self._mtime_ns = mtime_ns
+            return labs
+
+    def get(self, lab_number) -> LabSpec:
+        lab_key = f"lab{lab_number}"
+        lab = self.labs().get(lab_key)
+        if lab is None:
+            raise ValueError(f"Лабораторная работа {lab_number} не найдена в конфигурации")
+        return lab
@@ -1,106 +1,133 @@
 import io
 import os
 import sqlite3
-import subprocess
-from typing import Dict, Union, List, Tuple
+from datetime import datetime, timezone
 
-import matplotlib.colors as mcolors
-import yaml
-from flask import Flask, jsonify, request, render_template, send_file
+from flask import Flask, jsonify, request, render_template, send_file, stream_with_context, url_for
 from flask_swagger_ui import get_swaggerui_blueprint
 
-from pnetLabParser import generate_unl_from_template
+from ansible_runner import PlaybookExecutor
+from dashboard import Dashboard
+from database import ConnectionPool
+from jobs import JobQueue, QueueFullError
+from lab_catalog import LabCatalog
 from prepare_unl import prepare_telnet_links, prepare_interface_mapping
-from unl_store import unl_file_content_get, unl_file_save_or_update, unl_file_delete
+from prewarm import WarmPool
+from render_service import RenderQueueFullError, RenderResult, RenderService, RenderSpec
+from reservation import GroupLaunchedError, ReservationError, ReservationResult, reserve_devices, reserve_many
+from switch_driver import create_backend
+from switch_state import (
+    CONNECTION_MODES, DEFAULT_STATE, PortPushQueue, confirm_states, forget_states, reconcile, target_state,
+)
+from vlan_pool import VlanPool, VlanPoolExhaustedError
+from unl_store import (
+    CHUNK_SIZE as UNL_CHUNK_SIZE, UnlInputs, unl_decompress_chunks, unl_file_delete, unl_file_info,
+    unl_file_read, unl_file_save_or_update, unl_files_save_or_update, unl_inputs_get,
+)
 
 db_filename = 'test.db'
+db_pool = ConnectionPool(db_filename)
 
 app = Flask(__name__)
 
+playbook_executor = PlaybookExecutor(backend=create_backend())
+dashboard = Dashboard(db_pool)
+lab_catalog = LabCatalog('labs_config.yaml')
+render_service = RenderService()
+port_pushes = PortPushQueue()
+
+
+def load_lab_config(lab_number):
+    """Конфигурация лабораторной работы из каталога: отдельная копия на каждый запуск"""
+    return lab_catalog.get(lab_number).instantiate()
+
 
-def run_ansible_playbook(
-        playbook_path: str,
-        inventory_path: str = "",
-        verbose: bool = False
-) -> Dict[str, Union[bool, str]]:
+def run_lab(lab_number, group_id, manual_url="", vendor="Any", progress=None, use_warm=True) -> bytes | None:
     """
-    Выполняет Ansible playbook на КК
-    :param playbook_path: Путь к файлу playbook.yml
-    :param inventory_path: Путь к inventory-файлу (опционально)
-    :param verbose: Вывод подробной информации
-    :return: Словарь с результатами выполнения
+    Запускает указанную лабораторную работу; progress(stage) сообщает о ходе выполнения.
+    Если есть заранее запущенный слот (use_warm), группа просто получает его.
+    Уже запущенная группа второй набор устройств не получает (GroupLaunchedError).
     """
+    report = progress or (lambda stage: None)
+    if group_id:
+        with db_pool.checkout() as conn:
+            if group_launched(conn, group_id):
+                raise GroupLaunchedError(group_id)
+    if use_warm and group_id:
+        content = warm_pool.claim(lab_number, group_id, manual_url, vendor)
+        if content is not None:
+            dashboard.invalidate()
+            report('claimed')
+            return content
+    if not render_service.has_capacity():
+        # Отказ до резервирования: иначе устройства остались бы заняты без UNL
+        raise RenderQueueFullError("Очередь генерации UNL заполнена, повторите запрос позже")
+    lab = lab_catalog.get(lab_number)
+    lab_config = lab.instantiate()
+    devices = lab_config['devices']
+    topology = lab_config['topology']
+    assign_vendors(devices, vendor)
+    report('planning')
+    status = planner(devices, topology, lab.topology, group_id)
+    print(topology)
+    if not status:
+        return None
+    spec = unl_render_spec(lab_number, manual_url, devices, topology, debug=True)
+    print(spec.telnet_links)
+    print(spec.interface_mapping)
+    report('rendering')
+    try:
+        result = render_service.render(spec)
+        with db_pool.checkout() as conn:
+            unl_file_save_or_update(conn, group_id, result.content, unl_inputs(spec, result))
+    except BaseException:
+        # Без UNL группа не получит лабораторную работу: устройства и VLAN освобождаются
+        clear_bd(group_id)
+        raise
+    return result.content
 
-    # Проверка существования playbook
-    if not os.path.exists(playbook_path):
-        return {
-            "success": False,
-            "error": f"Playbook file not found: {playbook_path}"
-        }
-
-    # Формирование базовой команды
-    command = ["ansible-playbook", playbook_path]
 
-    # Добавление inventory файла
-    if inventory_path:
-        if not os.path.exists(inventory_path):
-            return {
-                "success": False,
-                "error": f"Inventory file not found: {inventory_path}"
-            }
-        command.extend(["-i", inventory_path])
+def rerender_lab(group_id, telnet_links=None, interface_mapping=None, manual_url=None) -> bytes | None:
+    """
+    Повторная генерация UNL группы после изменения части входных данных
+    (например, замены устройства): telnet_links дополняют и заменяют
+    сохранённые ссылки, interface_mapping - соединения тех же пар узлов.
+    Пересчитываются только затронутые места шаблона, идентификатор
+    лабораторной работы сохраняется. None - у группы нет сохранённых входных данных.
+    """
+    with db_pool.checkout() as conn:
+        inputs = unl_inputs_get(conn, group_id)
+    if inputs is None:
+        return None
+    previous = inputs.state
+    spec = RenderSpec(
+        template_path=previous.template_path,
+        lab_name=inputs.lab_name,
+        manual_url=inputs.manual_url if manual_url is None else manual_url,
+        telnet_links={**previous.telnet_links, **(telnet_links or {})},
+        interface_mapping=merge_interface_mapping(previous.interface_mapping, interface_mapping or []),
+        previous=previous,
+    )
+    result = render_service.render(spec)
+    with db_pool.checkout() as conn:
+        unl_file_save_or_update(conn, group_id, result.content, unl_inputs(spec, result))
+    return result.content
 
-    # Добавление verbose режима
-    if verbose:
-        command.append("-vvvv")
 
-    try:
-        # Выполнение команды
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-
-        return {
-            "success": True,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "return_code": result.returncode
-        }
+def merge_interface_mapping(mapping, changes):
+    """Соединения mapping, в которых соединения тех же пар узлов заменены на changes (новые - в конце)"""
+    replaced = {frozenset(connection): connection for connection in changes}
+    merged = [replaced.pop(frozenset(connection), connection) for connection in mapping]
+    return merged + list(replaced.values())
 
-    except subprocess.CalledProcessError as e:
-        return {
-            "success": False,
-            "error": "Playbook execution failed",
-            "stdout": e.stdout,
-            "stderr": e.stderr,
-            "return_code": e.returncode
-        }
 
-    except Exception as e:
-        return {
-            "success": False,
-            "error": f"Unexpected error: {str(e)}"
-        }
+def unl_inputs(spec: RenderSpec, result: RenderResult) -> UnlInputs:
+    """Входные данные генерации, сохраняемые вместе с UNL-файлом"""
+    return UnlInputs(spec.lab_name, spec.manual_url, result.state)
 
 
-def load_lab_config(lab_number):
-    """Загружает конфигурацию лабораторной работы из файла"""
-    with open('labs_config.yaml', 'r') as file:
-        config = yaml.safe_load(file)
-        lab_key = f"lab{lab_number}"
-        if lab_key not in config['labs']:
-            raise ValueError(f"Лабораторная работа {lab_number} не найдена в конфигурации")
-        return config['labs'][lab_key]
-
-
-def run_lab(lab_number, group_id, manual_url="", vendor="Any") -> bytes | None:
-    """Запускает указанную лабораторную работу"""
-    lab_config = load_lab_config(lab_number)
-    devices = lab_config['devices']
-    topology = lab_config['topology']
+def assign_vendors(devices, vendor):
+    """Вендор устройств (кроме PC): один для всех или список по порядку"""
     vendor_index = 0
     for dev in devices:
         if dev["device_type"] != "PC":
@@ -111,183 +138,256 @@ def run_lab(lab_number, group_id, manual_url="", vendor="Any") -> bytes | None:
             else:
                 dev["vendor"] = "Any"
             vendor_index += 1
-        else:
-            continue
-    status = planner(devices, topology, group_id)
-    print(topology)
-    if not status:
-        return None
-    telnet_links = prepare_telnet_links(devices)
-    print(telnet_links)
-    interface_mapping = prepare_interface_mapping(topology)
-    print(interface_mapping)
-    content = generate_unl_from_template(
-        template_path=f"templates/{lab_number}.html",
+
+
+def lab_template_path(lab_number) -> str:
+    """Шаблон UNL лабораторной работы"""
+    return f"templates/{lab_number}.html"
+
+
+def unl_render_spec(lab_number, manual_url, devices, topology, debug=False) -> RenderSpec:
+    """Параметры генерации UNL для зарезервированной лабораторной работы"""
+    return RenderSpec(
+        template_path=lab_template_path(lab_number),
         lab_name="MyLab",
         manual_url=manual_url,
-        telnet_links=telnet_links,
-        interface_mapping=interface_mapping,
-        debug=True
+        telnet_links=prepare_telnet_links(devices),
+        interface_mapping=prepare_interface_mapping(topology),
+        debug=debug,
     )
-    with sqlite3.connect(db_filename) as conn:
-        unl_file_save_or_update(conn, group_id, content)
-    return content
 
 
-def update_topology(devices, topology):
-    vlans = free_vm(len(topology))
-    for top in topology:
-        for device in devices:
-            if device['name'] in top["source"]:
-                if device["device_type"] == 'PC':
-                    top["vlan"] = device["port1"]
-                    top['name in source'] = device['name']
-                if "(port2)" in top["source"]:
-                    top["source"] = device["port2"]
-                    top['name in source'] = device['name']
-                    top["source user"] = device["port2_user"]
-                elif "(port1)" in top["source"]:
-                    top["source"] = device["port1"]
-                    top['name in source'] = device['name']
-                    top["source user"] = device["port1_user"]
-                top["host in source"] = device["hosts"]
-            if device['name'] in top["target"]:
-                if device["device_type"] == 'PC':
-                    top["vlan"] = device["port1"]
-                    top['name in target'] = device['name']
-                if "(port2)" in top["target"]:
-                    top["target"] = device["port2"]
-                    top['name in target'] = device['name']
-                    top["target user"] = device["port2_user"]
-                elif "(port1)" in top["target"]:
-                    top["target"] = device["port1"]
-                    top["target user"] = device["port1_user"]
-                    top['name in target'] = device['name']
-                top["host in target"] = device["hosts"]
-        if 'vlan' not in top:
-            top["vlan"] = vlans.pop()[0]
-
-
-def planner(devices, topology, group_id):
-    status = update_bd(devices, group_id)
-    if not status:
-        return False
-    update_topology(devices, topology)
-    if not group_id:
-        return True
-    status = create_playbook(topology, group_id)
-    run_playbook()
-    return status
+def run_labs_bulk(lab_number, group_ids, manual_url="", vendor="Any", progress=None) -> dict:
+    """
+    Запускает лабораторную работу сразу для нескольких групп (вся учебная группа).
+    Группы сначала получают готовые слоты прогрева; остальные резервируются
+    одной транзакцией (каждая группа целиком или никак), изменения VLAN всех
+    групп применяются одним плеем на группу коммутаторов, UNL генерируются
+    в пуле процессов и сохраняются одним commit.
+    Группы, у которых уже есть UNL или занятые устройства, пропускаются (status: exists).
+    Возвращает манифест с результатом по каждой группе.
+    """
+    report = progress or (lambda stage: None)
+    manifest = {}
+    pending = []
+    with db_pool.checkout() as conn:
+        for group_id in group_ids:
+            if group_launched(conn, group_id):
+                # Повторный запуск не должен занимать второй набор устройств и VLAN
+                manifest[group_id] = {'status': 'exists'}
+            elif warm_pool.claim(lab_number, group_id, manual_url, vendor) is not None:
+                manifest[group_id] = {'status': 'success', 'source': 'warm'}
+            else:
+                pending.append(group_id)
+
+    lab = lab_catalog.get(lab_number)
+    launches = {}
+    for group_id in pending:
+        lab_config = lab.instantiate()
+        assign_vendors(lab_config['devices'], vendor)
+        launches[group_id] = lab_config
+    plays = {}
+    port_states = {}
+
+    def on_reserved(conn, group_id, components):
+        devices, topology = launches[group_id]['devices'], launches[group_id]['topology']
+        fill_devices(devices, components)
+        update_topology(devices, topology, lab.topology)
+        plays[group_id], port_states[group_id] = create_playbook(conn, topology, group_id)
+        push.add(port_states[group_id])
+
+    report('planning')
+    with port_pushes.sequence() as push:
+        with db_pool.checkout() as conn:
+            results = reserve_many(conn, [(group_id, launches[group_id]['devices']) for group_id in pending],
+                                   on_reserved=on_reserved)
+        reserved = [group_id for group_id in pending if results[group_id]]
+        for group_id in pending:
+            if not results[group_id]:
+                manifest[group_id] = {'status': 'error', 'message': results[group_id].describe(),
+                                      'missing': results[group_id].missing}
+        dashboard.invalidate()
+
+        report('configuring')
+        merged = {}
+        merged_states = {}
+        for group_id in reserved:
+            for switch_group, play in plays[group_id].items():
+                merged.setdefault(switch_group, {**play, 'tasks': []})['tasks'].extend(play['tasks'])
+            merged_states.update(port_states[group_id])
+        switch_results = run_playbook(merged, merged_states, push)
+
+    report('rendering')
+    specs = {
+        group_id: unl_render_spec(lab_number, manual_url, launches[group_id]['devices'],
+                                  launches[group_id]['topology'])
+        for group_id in reserved
+    }
+    try:
+        results = render_service.render_many(specs)
+        with db_pool.checkout() as conn:
+            unl_files_save_or_update(conn,
+                                     {group_id: result.content for group_id, result in results.items()},
+                                     {group_id: unl_inputs(specs[group_id], result)
+                                      for group_id, result in results.items()})
+    except BaseException:
+        for group_id in reserved:
+            clear_bd(group_id)
+        raise
+    for group_id in reserved:
+        manifest[group_id] = {
+            'status': 'success',
+            'source': 'bulk',
+            'switches': {switch_group: switch_results.get(switch_group, {}).get('success')
+                         for switch_group in plays[group_id]},
+        }
+    return {
+        'lab_number': lab_number,
+        'groups': [{'group_id': group_id, **manifest[group_id]} for group_id in group_ids],
+    }
 
 
-def update_bd(devices, group_id) -> bool:
-    try:
-        with sqlite3.connect(db_filename) as conn:
-            cursor = conn.cursor()
-            cursor.execute("BEGIN TRANSACTION;")
-            for device in devices:
-                # Проверка доступности
-                if device["device_type"] != 'PC':
-                    if device["vendor"] != "Any":
-                        available_devices = cursor.execute(
-                            """SELECT COUNT(*), component_id, location,port1,port2,ip,port1_user,port2_user FROM components
-                           WHERE component_type=? AND model=? and status=?
-                           ORDER BY RANDOM() 
-                           LIMIT 1
-                           """,
-                            (device["device_type"], "Free")
-                        ).fetchone()
-                        device["hosts"] = (available_devices[2])
-                        device["port1"] = (available_devices[3])
-                        device["port2"] = (available_devices[4])
-                        device["port1_user"] = available_devices[6]
-                        device["port2_user"] = available_devices[7]
-                        device["ip"] = available_devices[5]
-                    else:
-                        available_devices = cursor.execute(
-                            """SELECT COUNT(*), component_id, location,port1,port2,ip,port1_user,port2_user FROM components
-                            WHERE component_type=? AND status=?
-                            ORDER BY RANDOM() 
-                            LIMIT 1
-                            """, (device["device_type"], "Free")).fetchone()
-                        device["hosts"] = (available_devices[2])
-                        device["port1"] = (available_devices[3])
-                        device["port2"] = (available_devices[4])
-                        device["port1_user"] = available_devices[6]
-                        device["port2_user"] = available_devices[7]
-                        device["ip"] = available_devices[5]
-                else:
-                    available_devices = cursor.execute(
-                        """SELECT COUNT(*), component_id, location, port1,ip FROM components
-                        WHERE component_type=? AND status=?
-                        ORDER BY RANDOM() 
-                        LIMIT 1
-                        """, (device["device_type"], "Free")).fetchone()
-                    device["hosts"] = "no host"
-                    device["port1"] = available_devices[3]
-                    device["ip"] = available_devices[4]
-                if available_devices[0]:
-                    # Если устройство доступно, обновляем статус
-                    cursor.execute(
-                        """UPDATE components
-                            SET status=?, groups_id = ?
-                            WHERE component_id=?
-                         """, ('Active', group_id, available_devices[1]))
-
-                else:
-                    print("Оборудование отсутствует!")
-                    conn.rollback()
-                    return False
-            conn.commit()
+def group_launched(conn, group_id, reserved=0) -> bool:
+    """
+    Запущена ли уже лабораторная работа группы: есть сохранённый UNL или выданные устройства.
+    reserved - сколько устройств группа получила в текущей транзакции (они не считаются).
+    """
+    if unl_file_info(conn, group_id) is not None:
         return True
-    except Exception as e:
-        print(f"Ошибка: {e}")
-    return False
+    return conn.execute(
+        "SELECT 1 FROM components WHERE groups_id = ? AND status = 'Active' LIMIT 1 OFFSET ?", (group_id, reserved)
+    ).fetchone() is not None
 
 
-def run_playbook():
-    if os.getenv("ANSIBLE_DISABLE") == 'true':
-        return
-    # Запуск playbook с inventory и переменными
-    result = run_ansible_playbook(
-        playbook_path="vlan_playbook.yaml",
-        inventory_path="inventory.ini",
-        verbose=True
-    )
-    if result["success"]:
-        print("Playbook выполнен успешно!")
-        print(result["stdout"])
-    else:
-        print("Ошибка выполнения playbook:")
-        print(result.get("error", ""))
-        print(result["stderr"])
+def update_topology(devices, topology, links):
+    """
+    Подставляет в соединения реальные порты зарезервированных устройств.
+    links - скомпилированные соединения лабораторной работы (LinkSpec) в порядке topology;
+    устройства сопоставляются по точному имени за один проход.
+    """
+    by_name = {device['name']: device for device in devices}
+    for top, link in zip(topology, links):
+        for side, endpoint in (("source", link.source), ("target", link.target)):
+            device = by_name.get(endpoint.device)
+            if device is None:
+                continue
+            top[f"name in {side}"] = device['name']
+            top[f"host in {side}"] = device["hosts"]
+            if endpoint.port == "vlan":
+                top["vlan"] = device["port1"]
+            else:
+                top[side] = device[endpoint.port]
+                top[f"{side} user"] = device[f"{endpoint.port}_user"]
+
+
+def planner(devices, topology, links, group_id):
+    plays = {}
+    port_states = {}
+
+    def plan(conn):
+        # Выполняется в транзакции резервирования устройств
+        if group_id and group_launched(conn, group_id, reserved=len(devices)):
+            # Параллельный запуск той же группы успел зарезервировать раньше
+            raise GroupLaunchedError(group_id)
+        update_topology(devices, topology, links)
+        if group_id:
+            group_plays, states = create_playbook(conn, topology, group_id)
+            plays.update(group_plays)
+            port_states.update(states)
+            push.add(states)
+
+    with port_pushes.sequence() as push:
+        try:
+            reservation = update_bd(devices, group_id, plan)
+        except VlanPoolExhaustedError as e:
+            print(f"Нет свободных VLAN: {e}")
+            return False
+        if not reservation:
+            raise ReservationError(reservation)
+        if not group_id:
+            return True
+        run_playbook(plays, port_states, push)
+    return True
 
 
-def free_vm(count) -> List[Tuple[int]]:
-    """Возвращает указанное количество свободных VLAN."""
-    used_vlans = get_used_vlans()
-    available_vlans = []
+def update_bd(devices, group_id, plan=None) -> ReservationResult:
+    """
+    Резервирует весь набор устройств для группы и дополняет описания устройств.
+    plan(conn) выполняется в той же транзакции, что и резервирование.
+    """
+    def on_reserved(conn, components):
+        fill_devices(devices, components)
+        if plan is not None:
+            plan(conn)
+
+    with db_pool.checkout() as conn:
+        result = reserve_devices(conn, devices, group_id, on_reserved=on_reserved)
+    if not result:
+        print(f"Оборудование отсутствует! {result.describe()}")
+        return result
+    dashboard.invalidate()
+    return result
+
+
+def fill_devices(devices, components):
+    """Переносит в описания устройств данные выданного оборудования"""
+    for device, component in zip(devices, components):
+        if device["device_type"] != 'PC':
+            device["hosts"] = component["location"]
+            device["port1"] = component["port1"]
+            device["port2"] = component["port2"]
+            device["port1_user"] = component["port1_user"]
+            device["port2_user"] = component["port2_user"]
+            device["ip"] = component["ip"]
+        else:
+            device["hosts"] = "no host"
+            device["port1"] = component["port1"]
+            device["ip"] = component["ip"]
 
-    # Ищем свободные VLAN в диапазоне 10-1000 с шагом 10
-    for vlan in range(10, 1001, 10):
-        if vlan not in used_vlans:
-            available_vlans.append((vlan,))
-            if len(available_vlans) == count:
-                break
 
-    return available_vlans if len(available_vlans) >= count else []
+def run_playbook(plays, port_states=None, push=None):
+    """
+    Применяет плеи групп коммутаторов; изменения разных запусков объединяются исполнителем.
+    port_states - желаемые состояния портов {(группа, порт): PortState}, записанные
+    неподтверждёнными при планировании: после применения они подтверждаются,
+    для групп с ошибкой (и при отключённом Ansible) - снимаются.
+    push - отправка в очереди port_pushes: сначала завершаются более ранние отправки на те же порты.
+    Возвращает результаты по группам коммутаторов.
+    """
+    if os.getenv("ANSIBLE_DISABLE") == 'true' or not plays:
+        settle_port_states({}, port_states)
+        return {}
+    if push is not None:
+        push.wait()
+    results = playbook_executor.run(plays)
+    failed = {group_name for group_name in plays if not results.get(group_name, {}).get("success")}
+    settle_port_states({key: state for key, state in (port_states or {}).items() if key[0] not in failed},
+                       {key: state for key, state in (port_states or {}).items() if key[0] in failed})
+    for group_name, result in results.items():
+        if result["success"]:
+            print(f"Playbook {group_name} выполнен успешно через {result.get('backend')} "
+                  f"(запусков в пакете: {result['batch_size']})!")
+            print(result["stdout"])
+        else:
+            print(f"Ошибка выполнения playbook {group_name}:")
+            print(result.get("error", ""))
+            print(result.get("stderr", ""))
+    return results
 
 
-def get_used_vlans() -> List[int]:
-    """Возвращает список занятых VLAN из базы данных."""
+def settle_port_states(pushed, failed):
+    """
+    Подтверждает состояния портов, отправленные на коммутаторы, и снимает
+    неотправленные: такие порты получат полную конфигурацию при следующей настройке
+    """
+    if not pushed and not failed:
+        return
     try:
-        with sqlite3.connect('test.db') as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT vlan FROM vlan_config WHERE groups_id != 0")
-            return [row[0] for row in cursor.fetchall()]
+        with db_pool.unit_of_work() as conn:
+            confirm_states(conn, pushed)
+            forget_states(conn, failed)
     except sqlite3.Error as e:
-        print(f"Ошибка при получении занятых VLAN: {e}")
-        return []
+        print(f"Ошибка сохранения состояния портов: {e}")
 
 
 def get_group_name(auditorium):
@@ -304,191 +404,223 @@ def get_group_name(auditorium):
         return "group_unknown"
 
 
-def create_playbook(topology, group_id, output_file="vlan_playbook.yaml"):
-    playbook = []
-    device_group = {}
+def switch_ports(top):
+    """Настраиваемые порты коммутаторов соединения: (порт, группа Ansible, тип соединения)"""
+    ports = []
+    connection = top.get("connection", "default")
+    if connection not in ("default", "trunk"):
+        return ports
+    for side in ("source", "target"):
+        if "PC" not in top[side]:
+            ports.append((top[side], get_group_name(top[f"host in {side}"]), connection))
+    return ports
+
+
+def assign_vlans(pool, topology) -> None:
+    """Выдаёт соединениям VLAN из пулов доменов (групп коммутаторов) их портов"""
     for top in topology:
-        if "PC" not in top["source"]:
-            auditorium = get_group_name(top["host in source"])
-            if auditorium not in device_group:
-                device_group[auditorium] = {'hosts': auditorium, 'gather_facts': 'no', 'tasks': []}
-            if 'connection' in top:
-                if top["connection"] == "trunk":
-                    add_trunk_vlan_task(device_group, auditorium, top["source"], top["vlan"])
-                    add_vlan(top["vlan"], top["source"], group_id, auditorium, "trunk")
-            else:
-                add_vlan_task(device_group, auditorium, top["source"], top["vlan"])
-                add_vlan(top["vlan"], top["source"], group_id, auditorium, "default")
-        if "PC" not in top["target"]:
-            auditorium = get_group_name(top["host in target"])
-            if auditorium not in device_group:
-                device_group[auditorium] = {'hosts': auditorium, 'gather_facts': 'no', 'tasks': []}
-            if 'connection' in top:
-                if top["connection"] == "trunk":
-                    add_trunk_vlan_task(device_group, auditorium, top["target"], top["vlan"])
-                    add_vlan(top["vlan"], top["target"], group_id, auditorium, "trunk")
-            else:
-                add_vlan_task(device_group, auditorium, top["target"], top["vlan"])
-                add_vlan(top["vlan"], top["target"], group_id, auditorium)
+        domains = [auditorium for _, auditorium, _ in switch_ports(top)]
+        if 'vlan' in top:
+            # VLAN порта PC фиксирован, но тоже занимает номер в домене
+            pool.reserve(domains, top["vlan"])
+        elif domains:
+            vlan = pool.allocate(domains)
+            if vlan is None:
+                raise VlanPoolExhaustedError(', '.join(domains))
+            top["vlan"] = vlan
+
+
+def create_playbook(conn, topology, group_id):
+    """
+    Выдаёт VLAN соединениям, записывает их в vlan_config одним executemany
+    и готовит плеи по группам коммутаторов: {группа Ansible: плей}.
+    В плеи попадают только порты, состояние которых меняется.
+    Транзакцией управляет вызывающий код.
+    Возвращает плеи и желаемые состояния портов (для run_playbook).
+    """
+    rows = []
+    targets = {}
+    pool = VlanPool(conn)
+    assign_vlans(pool, topology)
+    for top in topology:
+        for port, auditorium, connection in switch_ports(top):
+            targets[(auditorium, port)] = target_state(connection, top["vlan"])
+            rows.append((top["vlan"], port, group_id, auditorium, connection))
+    add_vlans(conn, rows)
+    pool.save()
+    device_group = {}
+    for (auditorium, port), lines in reconcile(conn, targets).items():
+        add_port_task(device_group, auditorium, port, targets[(auditorium, port)].vlan, lines)
     print(device_group)
-    # Преобразуем словарь групп в список плейбучных заданий
-    playbook.extend(list(device_group.values()))
-    try:
-        # Конвертирование плейбука в YAML и запись в файл
-        playbook_yaml = yaml.dump(playbook, indent=2, allow_unicode=True)
-        with open(output_file, "w", encoding='utf-8') as f:
-            f.write(playbook_yaml)
-        return True
-    except Exception as e:
-        print(f"Ошибка при записи playbook в файл: {e}")
-        return False
+    return device_group, targets
 
 
-def add_vlan(vlan, switchport, groups_id, audience, connection="default"):
-    try:
-        with sqlite3.connect('test.db') as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO vlan_config (vlan, switchport, groups_id, audience,connection)
-                VALUES (?, ?, ?, ?, ?)
-            """, (vlan, switchport, groups_id, audience, connection))
-            conn.commit()
-    except sqlite3.Error as e:
-        print(f"Ошибка при добавлении VLAN: {e}")
-    finally:
-        if conn:
-            conn.close()
+def add_vlans(conn, rows):
+    """Запись VLAN портов: строки (vlan, switchport, groups_id, audience, connection)"""
+    conn.executemany("""
+        INSERT INTO vlan_config (vlan, switchport, groups_id, audience, connection)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
 
 
-def add_vlan_task(device_group, group_name, interface_name, vlan):
+def add_port_task(device_group, group_name, interface_name, vlan, lines):
+    if group_name not in device_group:
+        device_group[group_name] = {'hosts': group_name, 'gather_facts': 'no', 'tasks': []}
     task = {
         'name': f"Настройка порта {interface_name} в VLAN {vlan}",
         'ios_config': {
             'parents': f"interface {interface_name}",
-            'lines': [
-                "switchport mode access",
-                f"switchport access vlan {vlan}",
-                "no cdp enable",
-            ],
+            'lines': lines,
         },
     }
     device_group[group_name]['tasks'].append(task)
 
 
-def add_trunk_vlan_task(device_group, group_name, interface_name, vlan, encapsulation="dot1q"):
-    task = {
-        'name': f"Настройка порта {interface_name} в VLAN {vlan}",
-        'ios_config': {
-            'parents': f"interface {interface_name}",
-            'lines': [
-                f"switchport access vlan {vlan}",
-                "switchport mode dot1q-tunnel",
-                "no cdp enable"
-            ],
-        },
-    }
-    device_group[group_name]['tasks'].append(task)
+def clear_vlan(conn, groups_id):
+    """
+    Удаляет VLAN группы, освобождает их в пулах и готовит плеи их снятия
+    по группам коммутаторов (только для портов, которые ещё не освобождены).
+    Транзакцией управляет вызывающий код. Возвращает {группа Ansible: плей}
+    и состояния освобождаемых портов (для run_playbook).
+    """
+    available_devices = conn.execute(
+        """DELETE FROM vlan_config
+           WHERE groups_id = ?
+           RETURNING vlan, switchport, groups_id, audience, connection
+        """, (groups_id,)
+    ).fetchall()
+    pool = VlanPool(conn)
+    pool.release((device[3], device[0]) for device in available_devices)
+    pool.save()
+    # Порты без сохранённого состояния считаются настроенными по vlan_config
+    assumed = {(device[3], device[1]): target_state(device[4], device[0])
+               for device in available_devices if device[4] in CONNECTION_MODES}
+    targets = {key: DEFAULT_STATE for key in assumed}
+    changes = reconcile(conn, targets, assumed)
+    print(f"Удалено {len(available_devices)} записей с groups_id = {groups_id}")
+
+    device_group = {}
+    for (auditorium, port), lines in changes.items():
+        add_port_task(device_group, auditorium, port, assumed[(auditorium, port)].vlan, lines)
+    return device_group, targets
 
 
-def clear_vlan(groups_id, output_file="vlan_playbook.yaml"):
+def clear_bd(groups_id):
+    """
+    Освобождает лабораторную работу группы. UNL-файл, устройства и VLAN
+    (vlan_config и пулы) удаляются одной транзакцией: параллельный запуск
+    не получит освобождённое устройство, порт которого ещё занят в vlan_config.
+    Коммутаторы перенастраиваются после commit, но не раньше отправок
+    на те же порты, запланированных до освобождения.
+    """
+    with port_pushes.sequence() as push:
+        try:
+            with db_pool.unit_of_work() as conn:
+                unl_file_delete(db=conn, groups_id=groups_id)
+                cursor = conn.execute(
+                    "UPDATE components SET groups_id = NULL, status = 'Free' "
+                    "WHERE groups_id = ? AND status IN ('Active', 'Free')", (groups_id,))
+                plays, port_states = clear_vlan(conn, groups_id)
+                push.add(port_states)
+        except sqlite3.Error as e:
+            print(f"Произошла ошибка при работе с базой данных: {e}")
+            return False
+        print(f"Обновлено {cursor.rowcount} записей в components.")
+        dashboard.invalidate()
+        run_playbook(plays, port_states, push)
+    return True
+
+
+def job_run_lab(payload, progress):
+    """
+    Фоновое задание запуска лабораторной работы. Если группа уже запущена
+    (например, повторно поставленным заданием), результат - её сохранённый UNL.
+    """
     try:
-        with sqlite3.connect('test.db') as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """SELECT * FROM vlan_config
-                WHERE groups_id = ?
-                """, (groups_id,)
-            )
-
-            available_devices = cursor.fetchall()
-            cursor.execute(
-                """DELETE FROM vlan_config
-                   WHERE groups_id = ?     
-                """, (groups_id,)
-            )
-
-            conn.commit()
-            print(f"Удалено {cursor.rowcount} записей с groups_id = {groups_id}")
-            playbook = []
-            device_group = {}
-            for device in available_devices:
-                print(device)
-                auditorium = device[3]
-                connection = device[4]
-                if auditorium not in device_group:
-                    device_group[auditorium] = {'hosts': auditorium, 'gather_facts': 'no', 'tasks': []}
-                if connection == "trunk":
-                    del_trunk_task(device_group, auditorium, device[1], device[0])
-                else:
-                    del_vlan_task(device_group, auditorium, device[1], device[0])
-            playbook.extend(list(device_group.values()))
-            try:
-                playbook_yaml = yaml.dump(playbook, indent=2, allow_unicode=True)
-                with open(output_file, "w", encoding='utf-8') as f:
-                    f.write(playbook_yaml)
-                return True
-            except Exception as e:
-                print(f"Ошибка при записи playbook в файл: {e}")
-                return False
-    except sqlite3.Error as e:
-        print(f"Ошибка при добавлении VLAN: {e}")
-    finally:
-        if conn:
-            conn.close()
+        content = run_lab(payload['lab_number'], payload['group_id'], payload.get('manual_url') or "",
+                          payload.get('vendor') or "Any", progress=progress)
+    except GroupLaunchedError:
+        with db_pool.checkout() as conn:
+            artifact = unl_file_info(conn, payload['group_id'])
+        if artifact is None:
+            raise
+        return {'group_id': payload['group_id'], 'size': artifact.size, 'existing': True}
+    if not content:
+        raise ValueError(f"Lab {payload['lab_number']} not created")
+    return {'group_id': payload['group_id'], 'size': len(content)}
+
+
+def job_run_labs_bulk(payload, progress):
+    """Фоновое задание массового запуска лабораторной работы"""
+    return run_labs_bulk(payload['lab_number'], payload['group_ids'], payload.get('manual_url') or "",
+                         payload.get('vendor') or "Any", progress=progress)
+
+
+def job_clear_db(payload, progress):
+    """Фоновое задание очистки конфигурации группы"""
+    if not clear_bd(payload['group_id']):
+        raise RuntimeError(f"Database for group {payload['group_id']} not cleared")
+    return {'group_id': payload['group_id']}
+
+
+job_queue = JobQueue(
+    db_pool,
+    {'run_lab': job_run_lab, 'run_labs_bulk': job_run_labs_bulk, 'clear_db': job_clear_db},
+    max_workers=int(os.getenv("JOB_WORKERS", "4")),
+)
 
+warm_pool = WarmPool(
+    db_pool,
+    launch=lambda lab_number, group_id, manual_url, vendor: run_lab(
+        lab_number, group_id, manual_url, vendor, use_warm=False),
+    release=clear_bd,
+)
 
-def del_trunk_task(device_group, group_name, interface_name, vlan, encapsulation="dot1q"):
-    task = {
-        'name': f"Настройка порта {interface_name} в VLAN {vlan}",
-        'ios_config': {
-            'parents': f"interface {interface_name}",
-            'lines': [
-                f"no switchport access vlan {vlan}",
-                f"no switchport trunk encapsulation {encapsulation}",
-                "no switchport mode dot1q-tunnel",
-                "cdp enable"
-            ],
-        },
-    }
-    device_group[group_name]['tasks'].append(task)
 
+def unl_validators(response, artifact, gzip_body):
+    """Заголовки кэширования: строгий ETag по SHA-256 содержимого и Last-Modified"""
+    response.set_etag(f"{artifact.hash}-gzip" if gzip_body else artifact.hash)
+    response.last_modified = datetime.fromtimestamp(artifact.updated_at, tz=timezone.utc)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
 
-def del_vlan_task(device_group, group_name, interface_name, vlan):
-    task = {
-        'name': f"Настройка порта {interface_name} в VLAN {vlan}",
-        'ios_config': {
-            'parents': f"interface {interface_name}",
-            'lines': [
-                "no switchport mode access",
-                f"no switchport access vlan {vlan}",
-                "cdp enable",
-            ],
-        },
-    }
-    device_group[group_name]['tasks'].append(task)
 
+def unl_response(group_id):
+    """
+    Сохранённый UNL-файл группы или None, если файла нет.
+    Поддерживаются 304 и Range; клиенту, принимающему gzip, сжатое тело
+    хранилища отдаётся как есть, остальным - распаковывается потоком.
+    ETag и Last-Modified берутся из unl_file_info при каждом запросе
+    (поиск по индексу), поэтому одинаковы во всех процессах сервиса.
+    Сжатое тело читается в память, и соединение возвращается в пул до
+    отправки ответа: медленные клиенты не занимают соединения пула.
+    """
+    with db_pool.checkout() as conn:
+        artifact = unl_file_info(conn, group_id)
+        if artifact is None:
+            return None
+        stored = unl_file_read(conn, artifact)
+
+    gzip_body = artifact.encoding == 'gzip' and request.accept_encodings['gzip'] > 0
+    if gzip_body:
+        body, length = stored, artifact.stored_size
+    else:
+        body, length = unl_decompress_chunks(stored, UNL_CHUNK_SIZE), artifact.size
+    response = app.response_class(body, mimetype='application/xml', direct_passthrough=True)
+    if gzip_body:
+        response.content_encoding = 'gzip'
+    response.content_length = length
+    response.headers.set('Content-Disposition', 'attachment', filename=f'{group_id}.unl')
+    unl_validators(response, artifact, gzip_body)
+    return response.make_conditional(request, accept_ranges=True, complete_length=length)
 
-def clear_bd(groups_id, db_filename='test.db'):  # Добавим db_filename как параметр
-    conn = None  # Инициализируем conn вне try
-    try:
-        conn = sqlite3.connect(db_filename)
-        unl_file_delete(db=conn, groups_id=groups_id)
-        cursor = conn.cursor()
-        query = "UPDATE components SET groups_id = NULL, status = 'Free' WHERE status = 'Active' OR status = 'Free' AND `groups_id` = ?"
-        cursor.execute(query, (groups_id,))
-        conn.commit()
-        print(f"Обновлено {cursor.rowcount} записей в components.")
-        try:
-            clear_vlan(groups_id)
-        except Exception as e:
-            print(f"Ошибка при вызове clear_vlan: {e}")
-            return False
-        run_playbook()
-    except sqlite3.Error as e:
-        print(f"Произошла ошибка при работе с базой данных: {e}")
-    finally:
-        if conn:
-            conn.close()
+
+def job_accepted(job_id):
+    return jsonify({
+        'status': 'accepted',
+        'job_id': job_id,
+        'status_url': url_for('api_job_status', job_id=job_id)
+    }), 202
 
 
 @app.route('/')
@@ -498,67 +630,21 @@ def generate_table():
 
 @app.route('/api/devices')
 def get_devices():
-    conn = None
-    try:
-        conn = sqlite3.connect(db_filename)
-        cursor = conn.cursor()
-        audiences = [224, 344, 411]  # Аудитории для отображения
-
-        # Собираем данные из базы
-        table_data = {}
-        for aud in audiences:
-            cursor.execute(
-                "SELECT component_type, model, status, groups_id FROM components WHERE location = ?", (aud,)
-            )
-            devices = cursor.fetchall()
-
-            for i, device in enumerate(devices):
-                table_data.setdefault(aud, []).append(device)
-
-        # Определяем максимальное количество строк
-        max_rows = max(len(table_data.get(aud, [])) for aud in audiences)
-
-        # Формируем структуру ответа
-        result = {
-            "table": {
-                "headers": [f"P{aud}" for aud in audiences],
-                "rows": []
-            }
-        }
-        # Заполняем строки таблицы
-        for i in range(max_rows):
-            row = {"cells": []}
-            for aud in audiences:
-                cell = {}
-                if i < len(table_data.get(aud, [])):
-                    # Данные из SELECT'а
-                    component_type, model, status, group_id = table_data[aud][i]
-                    device_name = f"{component_type[0]}{i + 1}-{model}"
-                    if status == 'Active' and group_id is not None:
-                        device_name += f" (G{group_id})"
-                    cell["component_type"] = component_type
-                    cell["model"] = model
-                    cell["text"] = device_name
-                    cell["status"] = status
-                    cell["group_id"] = group_id
-                    # Определяем цвет в зависимости от статуса
-                    if status == 'Active':
-                        cell["backgroundColor"] = mcolors.to_hex('yellow')
-                    elif status == 'Free':
-                        cell["backgroundColor"] = mcolors.to_hex('lightgreen')
-                    else:
-                        cell["backgroundColor"] = mcolors.to_hex('lightcoral')
-                else:
-                    cell["text"] = ""
-                    cell["backgroundColor"] = "#FFFFFF"  # white
-                row["cells"].append(cell)
-            result["table"]["rows"].append(row)
-
-        return jsonify(result)
-
-    finally:
-        if conn:
-            conn.close()
+    _, etag, body = dashboard.snapshot()
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+@app.route('/api/devices/stream')
+def stream_devices():
+    """Изменения таблицы устройств через Server-Sent Events"""
+    return app.response_class(
+        stream_with_context(dashboard.events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 @app.route('/api/clear_db', methods=['POST'])
@@ -574,11 +660,23 @@ def api_clear_db():
                 'message': 'group_id is required'
             }), 400
 
-        clear_bd(group_id)
+        if data.get('async'):
+            return job_accepted(job_queue.submit('clear_db', {'group_id': group_id}))
+
+        if not clear_bd(group_id):
+            return jsonify({
+                'status': 'error',
+                'message': f'Database for group {group_id} not cleared'
+            }), 500
         return jsonify({
             'status': 'success',
             'message': f'Database cleared for group {group_id}'
         })
+    except QueueFullError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 429
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -596,15 +694,9 @@ def api_run_lab():
         group_id = data.get('group_id')
         manual_url = data.get('manual_url')
 
-        with sqlite3.connect(db_filename) as conn:
-            content_file_unl = unl_file_content_get(conn, group_id)
-        if content_file_unl:
-            return send_file(
-                io.BytesIO(content_file_unl),
-                mimetype='application/xml',
-                as_attachment=True,
-                download_name='%s.unl' % group_id
-            ), 200
+        cached = unl_response(group_id)
+        if cached is not None:
+            return cached
 
         if not group_id:
             return jsonify({
@@ -616,6 +708,13 @@ def api_run_lab():
                 'status': 'error',
                 'message': 'lab_number is required'
             }), 400
+        if data.get('async'):
+            return job_accepted(job_queue.submit('run_lab', {
+                'lab_number': lab_number,
+                'group_id': group_id,
+                'manual_url': manual_url,
+                'vendor': vendor
+            }))
         unl_file = run_lab(lab_number, group_id, manual_url or "", vendor or "Any")
         if not unl_file:
             return jsonify({
@@ -628,6 +727,27 @@ def api_run_lab():
             as_attachment=True,
             download_name='%s.unl' % group_id
         ), 200
+    except ReservationError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'missing': e.result.missing
+        }), 409
+    except GroupLaunchedError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 409
+    except QueueFullError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 429
+    except RenderQueueFullError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, {'Retry-After': '5'}
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -635,6 +755,173 @@ def api_run_lab():
         }), 500
 
 
+@app.route('/api/run_labs/bulk', methods=['POST'])
+def api_run_labs_bulk():
+    """API endpoint to run a lab work for several groups at once"""
+    try:
+        data = request.get_json()
+        lab_number = data.get('lab_number')
+        group_ids = data.get('group_ids')
+        vendor = data.get('vendor')
+        manual_url = data.get('manual_url')
+
+        if not lab_number:
+            return jsonify({
+                'status': 'error',
+                'message': 'lab_number is required'
+            }), 400
+        if not isinstance(group_ids, list) or not group_ids or not all(group_ids):
+            return jsonify({
+                'status': 'error',
+                'message': 'group_ids must be a non-empty list'
+            }), 400
+        if len(set(map(str, group_ids))) != len(group_ids):
+            return jsonify({
+                'status': 'error',
+                'message': 'group_ids must be unique'
+            }), 400
+        if data.get('async'):
+            return job_accepted(job_queue.submit('run_labs_bulk', {
+                'lab_number': lab_number,
+                'group_ids': group_ids,
+                'manual_url': manual_url,
+                'vendor': vendor
+            }))
+        manifest = run_labs_bulk(lab_number, group_ids, manual_url or "", vendor or "Any")
+        return jsonify({
+            'status': 'success',
+            **manifest
+        })
+    except QueueFullError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 429
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    """API endpoint to get the status of a background job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({
+            'status': 'error',
+            'message': f'Job {job_id} not found'
+        }), 404
+    if job['status'] == 'done':
+        job['result_url'] = url_for('api_job_result', job_id=job_id)
+    return jsonify(job)
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def api_job_result(job_id):
+    """API endpoint to get the result of a finished background job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({
+            'status': 'error',
+            'message': f'Job {job_id} not found'
+        }), 404
+    if job['status'] != 'done':
+        return jsonify({
+            'status': 'error',
+            'message': f'Job {job_id} is {job["status"]}',
+            'error': job['error']
+        }), 409
+    if job['kind'] != 'run_lab':
+        return jsonify({
+            'status': 'success',
+            'result': job['result']
+        })
+    group_id = job['result']['group_id']
+    response = unl_response(group_id)
+    if response is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'UNL for group {group_id} not found'
+        }), 404
+    return response
+
+
+@app.route('/api/labs/<group_id>.unl', methods=['GET'])
+def api_lab_file(group_id):
+    """API endpoint to download the stored UNL file of a group (ETag, 304, Range, gzip)"""
+    response = unl_response(group_id)
+    if response is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'UNL for group {group_id} not found'
+        }), 404
+    return response
+
+
+@app.route('/api/labs/<group_id>.unl', methods=['PATCH'])
+def api_lab_file_update(group_id):
+    """API endpoint to re-render the stored UNL file of a group after a partial input change"""
+    try:
+        data = request.get_json()
+        telnet_links = data.get('telnet_links') or {}
+        interface_mapping = data.get('interface_mapping') or []
+        manual_url = data.get('manual_url')
+
+        if not isinstance(telnet_links, dict) or not all(
+                isinstance(url, str) for url in telnet_links.values()):
+            return jsonify({
+                'status': 'error',
+                'message': 'telnet_links must be an object of strings'
+            }), 400
+        if not isinstance(interface_mapping, list) or not all(
+                isinstance(connection, dict) for connection in interface_mapping):
+            return jsonify({
+                'status': 'error',
+                'message': 'interface_mapping must be a list of objects'
+            }), 400
+        if manual_url is not None and not isinstance(manual_url, str):
+            return jsonify({
+                'status': 'error',
+                'message': 'manual_url must be a string'
+            }), 400
+        if rerender_lab(group_id, telnet_links, interface_mapping, manual_url) is None:
+            return jsonify({
+                'status': 'error',
+                'message': f'Render inputs for group {group_id} not found'
+            }), 404
+        return unl_response(group_id)
+    except RenderQueueFullError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, {'Retry-After': '5'}
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+@app.route('/api/warm_slots', methods=['GET'])
+def api_warm_slots():
+    """API endpoint to list pre-warmed lab slots"""
+    return jsonify({
+        'status': 'success',
+        'slots': warm_pool.slots()
+    })
+
+
+@app.route('/api/render/metrics', methods=['GET'])
+def api_render_metrics():
+    """API endpoint to get UNL rendering queue and timing metrics"""
+    return jsonify({
+        'status': 'success',
+        **render_service.metrics()
+    })
+
+
 @app.route('/api/openapi.json', methods=['GET'])
 def api_openapi():
     return send_file('templates/openapi.json', mimetype='application/json')
@@ -648,8 +935,36 @@ swaggerui_blueprint = get_swaggerui_blueprint(
 
 app.register_blueprint(swaggerui_blueprint)
 
+_services_started = False
+
+
+def create_app():
+    """
+    Подготовка сервиса до приёма запросов: миграции схемы, каталог лабораторных
+    работ, процессы генерации UNL, восстановление заданий и слотов прогрева.
+    Процессы генерации создаются здесь, до потоков заданий, прогрева и запросов,
+    и заранее компилируют шаблоны. WSGI-сервер вызывает фабрику в рабочем
+    процессе: gunicorn 'main:create_app()' (без --preload).
+    """
+    global _services_started
+    if _services_started:
+        return app
+    _services_started = True
+    db_pool.migrate()
+    lab_catalog.load()
+    # Ключи каталога - lab<номер>
+    render_service.start(lab_template_path(lab_key.removeprefix('lab')) for lab_key in lab_catalog.labs())
+    job_queue.recover()
+    warm_pool.recover()
+    warm_pool.start()
+    return app
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5005, debug=False)
+    try:
+        create_app().run(host='0.0.0.0', port=5005, debug=False)
+    finally:
+        render_service.shutdown()
     # run_lab(1, '1')
 
 # curl -X POST -H "Content-Type: application/json" -d '{"lab_number":1, "vendor":"Cisco"}' http://localhost:5000/api/run_lab
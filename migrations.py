@@ -0,0 +1,310 @@
+from sqlite3 import Connection
+from typing import Callable, List, Tuple, Union
+
+from allocator import claim_query
+from unl_store import unl_files_migrate
+
+
+def vlan_config_deduplicate(db: Connection) -> None:
+    """
+    Миграция: оставляет последнюю запись vlan_config по каждому порту коммутатора.
+    Удалённые записи выводятся в журнал, чтобы их можно было сверить с коммутаторами.
+    """
+    removed = db.execute("""
+        DELETE FROM vlan_config WHERE rowid NOT IN (
+            SELECT MAX(rowid) FROM vlan_config GROUP BY audience, switchport
+        )
+        RETURNING vlan, switchport, groups_id, audience, connection
+    """).fetchall()
+    if removed:
+        print(f"Удалено {len(removed)} повторяющихся записей vlan_config:")
+        for vlan, switchport, groups_id, audience, connection in removed:
+            print(f"  {audience} {switchport}: VLAN {vlan}, группа {groups_id}, {connection}")
+    return None
+
+
+# Версия схемы хранится в PRAGMA user_version. Миграции применяются по
+# порядку, каждая - в своей транзакции, и никогда не меняются задним числом.
+# Шаг миграции - SQL-запрос или функция, получающая соединение (без commit).
+MIGRATIONS: List[Tuple[int, str, List[Union[str, Callable[[Connection], None]]]]] = [
+    (1, "Базовая схема: components, vlan_config, files", [
+        """
+        CREATE TABLE IF NOT EXISTS components (
+            component_id INTEGER PRIMARY KEY,
+            component_type TEXT,
+            location INTEGER,
+            model TEXT,
+            status TEXT,
+            port1 TEXT,
+            port2 TEXT,
+            groups_id TEXT DEFAULT NULL,
+            ip TEXT,
+            port1_user TEXT,
+            port2_user TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS vlan_config (
+            vlan INTEGER,
+            switchport TEXT,
+            groups_id TEXT DEFAULT NULL,
+            audience INTEGER DEFAULT NULL,
+            connection TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS files (
+            groups_id TEXT PRIMARY KEY,
+            content BLOB NOT NULL
+        )
+        """,
+    ]),
+    (2, "Индексы горячих запросов и уникальность порта коммутатора", [
+        # update_bd: подбор свободного устройства по типу, статусу и модели
+        "CREATE INDEX IF NOT EXISTS idx_components_type_status_model "
+        "ON components (component_type, status, model)",
+        # get_devices: покрывающий индекс, порядок строк - по component_id
+        "CREATE INDEX IF NOT EXISTS idx_components_location "
+        "ON components (location, component_id, component_type, model, status, groups_id)",
+        # clear_bd: освобождение устройств группы
+        "CREATE INDEX IF NOT EXISTS idx_components_groups_id ON components (groups_id)",
+        # clear_vlan: выборка и удаление VLAN группы
+        "CREATE INDEX IF NOT EXISTS idx_vlan_config_groups_id ON vlan_config (groups_id)",
+        # Порт коммутатора в аудитории может одновременно принадлежать только одному VLAN.
+        # Перед созданием ограничения оставляем последнюю запись по каждому порту.
+        vlan_config_deduplicate,
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_vlan_config_audience_switchport "
+        "ON vlan_config (audience, switchport)",
+    ]),
+    (3, "Пулы свободных устройств для allocator", [
+        "ALTER TABLE components ADD COLUMN last_claimed_at INTEGER NOT NULL DEFAULT 0",
+        # Пулы (тип), (тип, модель) и (тип, аудитория) в порядке ротации
+        "CREATE INDEX IF NOT EXISTS idx_free_pool_type "
+        "ON components (component_type, last_claimed_at) WHERE status = 'Free'",
+        "CREATE INDEX IF NOT EXISTS idx_free_pool_model "
+        "ON components (component_type, model, last_claimed_at) WHERE status = 'Free'",
+        "CREATE INDEX IF NOT EXISTS idx_free_pool_location "
+        "ON components (component_type, location, last_claimed_at) WHERE status = 'Free'",
+    ]),
+    (4, "Битовые карты пулов VLAN по доменам", [
+        """
+        CREATE TABLE IF NOT EXISTS vlan_pool (
+            domain TEXT PRIMARY KEY,
+            first_vlan INTEGER NOT NULL,
+            last_vlan INTEGER NOT NULL,
+            step INTEGER NOT NULL,
+            bitmap BLOB NOT NULL,
+            next_index INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+    ]),
+    (5, "Очередь фоновых заданий", [
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            stage TEXT,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)",
+    ]),
+    (6, "Хранилище UNL-артефактов по SHA-256 со сжатием", [
+        """
+        CREATE TABLE IF NOT EXISTS artifacts (
+            hash TEXT PRIMARY KEY,
+            encoding TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            stored_size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            content BLOB NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS artifact_refs (
+            groups_id TEXT PRIMARY KEY,
+            hash TEXT NOT NULL REFERENCES artifacts (hash),
+            updated_at REAL NOT NULL
+        )
+        """,
+        # Сборка мусора: есть ли ещё ссылки на артефакт
+        "CREATE INDEX IF NOT EXISTS idx_artifact_refs_hash ON artifact_refs (hash)",
+        unl_files_migrate,
+    ]),
+    (7, "Последнее отправленное на коммутаторы состояние портов", [
+        """
+        CREATE TABLE IF NOT EXISTS switchport_state (
+            audience TEXT NOT NULL,
+            switchport TEXT NOT NULL,
+            mode TEXT,
+            vlan INTEGER,
+            cdp INTEGER NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (audience, switchport)
+        )
+        """,
+        # Порты занятых групп уже настроены полными заданиями
+        """
+        INSERT OR IGNORE INTO switchport_state (audience, switchport, mode, vlan, cdp, updated_at)
+        SELECT audience, switchport, CASE connection WHEN 'trunk' THEN 'dot1q-tunnel' ELSE 'access' END,
+               vlan, 0, strftime('%s', 'now')
+        FROM vlan_config WHERE connection IN ('default', 'trunk')
+        """,
+    ]),
+    (8, "Заранее запущенные лабораторные работы (слоты прогрева)", [
+        """
+        CREATE TABLE IF NOT EXISTS warm_slots (
+            groups_id TEXT PRIMARY KEY,
+            period TEXT NOT NULL,
+            lab TEXT NOT NULL,
+            vendor TEXT NOT NULL,
+            manual_url TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            claimed_by TEXT,
+            claimed_at REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_warm_slots_ready "
+        "ON warm_slots (lab, vendor, manual_url, created_at) WHERE status = 'ready'",
+        "CREATE INDEX IF NOT EXISTS idx_warm_slots_period ON warm_slots (period)",
+    ]),
+    (9, "Входные данные и состояние подстановки UNL-файлов групп", [
+        """
+        CREATE TABLE IF NOT EXISTS unl_inputs (
+            groups_id TEXT PRIMARY KEY,
+            template_path TEXT NOT NULL,
+            lab_name TEXT NOT NULL,
+            manual_url TEXT NOT NULL,
+            telnet_links TEXT NOT NULL,
+            interface_mapping TEXT NOT NULL,
+            guid TEXT NOT NULL,
+            template_mtime_ns INTEGER NOT NULL,
+            slot_values TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+    ]),
+    (10, "Неподтверждённые отправки состояния портов", [
+        # Состояние записывается в транзакции резервирования и подтверждается после отправки
+        "ALTER TABLE switchport_state ADD COLUMN confirmed INTEGER NOT NULL DEFAULT 1",
+    ]),
+]
+
+# Запросы горячего пути; ни один из них не должен сканировать таблицу целиком
+HOT_QUERIES: List[Tuple[str, str, tuple]] = [
+    ("claim_component: устройство модели",
+     claim_query("Cisco", None),
+     ("1", 0, "Switch", "Cisco")),
+    ("claim_component: устройство любой модели",
+     claim_query(None, None),
+     ("1", 0, "Switch")),
+    ("claim_component: устройство в аудитории",
+     claim_query(None, 344),
+     ("1", 0, "Switch", 344)),
+    ("get_devices",
+     "SELECT component_type, model, status, groups_id FROM components WHERE location = ? ORDER BY component_id",
+     (224,)),
+    ("clear_bd",
+     "UPDATE components SET groups_id = NULL, status = 'Free' "
+     "WHERE groups_id = ? AND status IN ('Active', 'Free')",
+     ("1",)),
+    ("group_launched: устройства группы",
+     "SELECT 1 FROM components WHERE groups_id = ? AND status = 'Active' LIMIT 1 OFFSET ?",
+     ("1", 0)),
+    ("clear_vlan",
+     "DELETE FROM vlan_config WHERE groups_id = ? RETURNING vlan, switchport, groups_id, audience, connection",
+     ("1",)),
+    ("switch_state.load_states",
+     "SELECT switchport, mode, vlan, cdp, confirmed FROM switchport_state WHERE audience = ? AND switchport IN (?, ?)",
+     ("KK-344", "f1/0/1", "f1/0/2")),
+    ("WarmPool.claim: готовый слот",
+     "SELECT groups_id FROM warm_slots WHERE status = 'ready' AND lab = ? AND vendor = ? AND manual_url = ? "
+     "AND expires_at > ? ORDER BY created_at LIMIT 1",
+     ("1", "Any", "", 0.0)),
+    ("unl_file_info",
+     "SELECT r.groups_id, a.hash, a.rowid, a.size, a.stored_size, a.encoding, a.created_at, r.updated_at "
+     "FROM artifact_refs r JOIN artifacts a ON a.hash = r.hash WHERE r.groups_id = ?",
+     ("1",)),
+    ("unl_inputs_get",
+     "SELECT template_path, lab_name, manual_url, telnet_links, interface_mapping, guid, template_mtime_ns, "
+     "slot_values FROM unl_inputs WHERE groups_id = ?",
+     ("1",)),
+    ("unl_file_delete: сборка мусора",
+     "DELETE FROM artifacts WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM artifact_refs WHERE hash = ?)",
+     ("h", "h")),
+]
+
+
+def configure_connection(db: Connection, busy_timeout_ms: int = 5000) -> None:
+    """Настройки соединения: WAL, synchronous=NORMAL и ожидание блокировки"""
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA synchronous = NORMAL")
+    db.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    db.execute("PRAGMA temp_store = MEMORY")
+    return None
+
+
+def schema_version(db: Connection) -> int:
+    """Текущая версия схемы базы данных"""
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db: Connection) -> int:
+    """Применяет недостающие миграции и возвращает итоговую версию схемы"""
+    configure_connection(db)
+    db.commit()
+    version = schema_version(db)
+    for target, description, statements in MIGRATIONS:
+        if target <= version:
+            continue
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Миграцию мог уже применить другой процесс
+            if schema_version(db) >= target:
+                db.commit()
+                version = target
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(db)
+                else:
+                    db.execute(statement)
+            db.execute(f"PRAGMA user_version = {target}")
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        print(f"Миграция схемы до версии {target}: {description}")
+        version = target
+    return version
+
+
+def hot_query_scans(db: Connection) -> List[Tuple[str, str]]:
+    """
+    Проверка планов горячих запросов через EXPLAIN QUERY PLAN.
+    Возвращает запросы, в плане которых есть полный проход (SCAN) по таблице.
+    """
+    scans = []
+    for name, query, params in HOT_QUERIES:
+        for row in db.execute(f"EXPLAIN QUERY PLAN {query}", params):
+            detail = row[3]
+            if detail.startswith("SCAN "):
+                scans.append((name, detail))
+    return scans
+
+
+if __name__ == "__main__":
+    import sqlite3
+
+    with sqlite3.connect("test.db") as conn:
+        print(f"Версия схемы: {migrate(conn)}")
+        for name, detail in hot_query_scans(conn):
+            print(f"✖ {name}: {detail}")
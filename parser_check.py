@@ -0,0 +1,106 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import pnetLabParser
+from pnetLabParser import TemplateParams, available_parsers, compile_template, process_template_html
+
+# Эталонный вывод шаблонов (разбор html.parser), с которым сравниваются все бэкенды
+TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
+GOLDEN_DIR = TEMPLATES_DIR / "golden"
+REFERENCE_PARSER = "html.parser"
+# Значения с символами, которые экранирует сериализация
+TELNET_URL = 'telnet://10.0.0.1:{port}/?a=1&b="{name}"<'
+INTERFACE = "f0/{index}&<>"
+
+# Случай проверки: имя, telnet-ссылки, соответствие интерфейсов
+Case = Tuple[str, Dict[str, str], List[Dict[str, str]]]
+
+
+def lab_templates() -> List[Path]:
+    """Шаблоны лабораторных работ (страницы сервиса, например table.html, не содержат узлов)"""
+    return [path for path in sorted(TEMPLATES_DIR.glob("*.html"))
+            if compile_template(path, REFERENCE_PARSER).nodes]
+
+
+def template_cases(template_path: Path) -> Iterator[Case]:
+    """Без подстановок и со ссылками и интерфейсами для всех узлов и соединений шаблона"""
+    compiled = compile_template(template_path, REFERENCE_PARSER)
+    yield "empty", {}, []
+    telnet_links = {node.name: TELNET_URL.format(port=2000 + index, name=node.name)
+                    for index, node in enumerate(compiled.nodes)}
+    pairs = list(dict.fromkeys(tuple(overlay.real_names) for overlay in compiled.overlays))
+    interface_mapping = [{src: INTERFACE.format(index=2 * index), dst: INTERFACE.format(index=2 * index + 1)}
+                         for index, (src, dst) in enumerate(pairs)]
+    yield "full", telnet_links, interface_mapping
+
+
+def render(template_path: Path, parser: str, case: Case) -> Dict[str, str]:
+    """Вывод скомпилированного шаблона и эталонной обработки process_template_html"""
+    _, telnet_links, interface_mapping = case
+    params = TemplateParams(template_path, "MyLab", telnet_links, interface_mapping, parser=parser)
+    return {
+        "compiled": compile_template(template_path, parser).render(telnet_links, interface_mapping),
+        "processed": pnetLabParser.clean_html_content(
+            process_template_html(template_path.read_text(encoding="utf-8"), params)),
+    }
+
+
+def golden_path(template_path: Path, case: Case) -> Path:
+    return GOLDEN_DIR / f"{template_path.stem}.{case[0]}.html"
+
+
+def save() -> int:
+    """Записывает эталонный вывод шаблонов"""
+    GOLDEN_DIR.mkdir(exist_ok=True)
+    for template_path in lab_templates():
+        for case in template_cases(template_path):
+            output = render(template_path, REFERENCE_PARSER, case)["compiled"]
+            golden_path(template_path, case).write_text(output, encoding="utf-8")
+            print(f"✓ {golden_path(template_path, case).name}")
+    return 0
+
+
+def check(parsers: Tuple[str, ...] = ()) -> int:
+    """Сравнивает вывод бэкендов parsers (по умолчанию всех установленных) с эталоном байт в байт"""
+    parsers = parsers or available_parsers()
+    failed = 0
+    for template_path in lab_templates():
+        for case in template_cases(template_path):
+            path = golden_path(template_path, case)
+            if not path.exists():
+                print(f"✖ {template_path.name} [{case[0]}]: нет эталона {path.name} (python parser_check.py save)")
+                failed += 1
+                continue
+            golden = path.read_text(encoding="utf-8")
+            for parser in parsers:
+                for kind, output in render(template_path, parser, case).items():
+                    if output != golden:
+                        failed += 1
+                        print(f"✖ {template_path.name} [{case[0]}] {parser} {kind}: вывод отличается от эталона")
+    print(f"Бэкенды: {', '.join(parsers)}; расхождений: {failed}")
+    return 1 if failed else 0
+
+
+def bench(runs: int) -> int:
+    """Время компиляции шаблона каждым бэкендом (медиана из runs запусков)"""
+    for template_path in lab_templates():
+        for parser in available_parsers():
+            timings = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                compile_template(template_path, parser)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            print(f"{template_path.name:<24} {parser:<12} {timings[len(timings) // 2]:7.2f} мс")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка бэкендов разбора шаблонов UNL по эталонам")
+    parser.add_argument("command", choices=("check", "save", "bench"))
+    parser.add_argument("--runs", type=int, default=50, help="запусков на шаблон для bench")
+    args = parser.parse_args()
+    sys.exit({"check": check, "save": save, "bench": lambda: bench(args.runs)}[args.command]())
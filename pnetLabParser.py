@@ -1,13 +1,38 @@
+from __future__ import annotations
+
 import base64
-import hashlib
+import functools
+import importlib.util
+import io
+import os
 import re
+import threading
 import uuid
 import xml.etree.ElementTree as ET
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Set, Tuple
+
+from render_state import RenderState
+from unl_writer import lab_attributes, write_unl
+
+# bs4 импортируется при первом разборе шаблона, а не при старте сервиса
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup, Tag
+
+CONNECTOR_CLASSES = frozenset(('jtk-connector', 'jtk-endpoint', 'jtk-overlay'))
+
+# Бэкенды разбора HTML для BeautifulSoup: html.parser - эталонный, lxml - быстрее
+# (если установлен). UNL_PARSER=auto выбирает самый быстрый из установленных.
+# Бэкенд задаётся только окружением: процессы генерации получают его при
+# создании пула вместе с остальными настройками.
+# Совпадение результата с html.parser проверяет parser_check.py.
+PARSER_BACKENDS = ('html.parser', 'lxml')
+UNL_PARSER = os.getenv("UNL_PARSER", "auto")
+
 
-from bs4 import BeautifulSoup
+class ParserBackendError(ValueError):
+    """Неизвестный или не установленный бэкенд разбора HTML"""
 
 
 @dataclass
@@ -17,6 +42,33 @@ class TemplateParams:
     telnet_links: Dict[str, str]
     interface_mapping: List[Dict[str, str]]
     debug: bool = False
+    parser: Optional[str] = None
+
+
+@functools.lru_cache(maxsize=None)
+def available_parsers() -> Tuple[str, ...]:
+    """Установленные бэкенды разбора, от эталонного к самому быстрому"""
+    return tuple(name for name in PARSER_BACKENDS
+                 if name == 'html.parser' or importlib.util.find_spec(name) is not None)
+
+
+def resolve_parser(name: Optional[str] = None) -> str:
+    """Бэкенд разбора по имени (None - из UNL_PARSER, auto - самый быстрый установленный)"""
+    name = name or UNL_PARSER
+    if name == 'auto':
+        return available_parsers()[-1]
+    if name not in PARSER_BACKENDS:
+        raise ParserBackendError(f"Неизвестный бэкенд разбора HTML: {name} (доступны {', '.join(PARSER_BACKENDS)})")
+    if name not in available_parsers():
+        raise ParserBackendError(f"Бэкенд разбора HTML {name} не установлен")
+    return name
+
+
+def parse_html(content: str, parser: Optional[str] = None) -> BeautifulSoup:
+    """Разбор HTML шаблона выбранным бэкендом"""
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(content, resolve_parser(parser))
 
 
 def debug_log(message: str, params: TemplateParams) -> None:
@@ -55,25 +107,7 @@ def create_iframe_workbooks(iframe_url) -> str:
 def create_lab_xml(lab_name: str, physical_topology_base64: str, workbook_base64: str) -> bytes:
     """Создание UNL-файла с топологией"""
     guid = str(uuid.uuid4())
-    lab = ET.Element("lab", {
-        "name": lab_name,
-        "id": guid,
-        "version": "1",
-        "scripttimeout": "300",
-        "password": hashlib.md5(guid.encode()).hexdigest(),
-        "author": "1",
-        "countdown": "60",
-        "darkmode": "",
-        "mode3d": "",
-        "nogrid": "",
-        "joinable": "2",
-        "joinable_emails": "admin",
-        "openable": "2",
-        "openable_emails": "admin",
-        "editable": "2",
-        "editable_emails": "admin",
-        "multi_config_active": ""
-    })
+    lab = ET.Element("lab", lab_attributes(lab_name, guid))
 
     ET.SubElement(lab, "topology")
     objects = ET.SubElement(lab, "objects")
@@ -105,31 +139,138 @@ def clean_html_content(content: str) -> str:
     return content.strip().replace(" ", "")
 
 
+@dataclass
+class TemplateIndex:
+    """Индекс разобранного шаблона, собранный за один проход по дереву"""
+    nodes: List[Tag] = field(default_factory=list)
+    node_names: Dict[str, str] = field(default_factory=dict)
+    connectors: List[Tag] = field(default_factory=list)
+    connector_overlays: List[Tuple[Tag, List[Tag]]] = field(default_factory=list)
+
+
+def index_template(soup: BeautifulSoup) -> TemplateIndex:
+    """
+    Очистка ненужных элементов и индексация шаблона за один проход:
+    узлы, соответствие CSS-класса узла его data-name, соединения
+    и подписи интерфейсов (node_interface) каждого соединения.
+    """
+    index = TemplateIndex()
+    overlays_by_connector: Dict[int, Tuple[Tag, List[Tag]]] = {}
+    # Удалённые элементы и их потомки. Не element.decomposed: у живого тега
+    # это обращение через Tag.__getattr__ - поиск по всему поддереву.
+    removed: Set[int] = set()
+
+    def remove(element: Tag) -> None:
+        removed.add(id(element))
+        removed.update(id(child) for child in element.descendants)
+        element.decompose()
+
+    for element in soup.find_all(True):
+        # Потомки удалённых элементов уже не входят в дерево
+        if id(element) in removed:
+            continue
+        if 'data-status' in element.attrs:
+            del element['data-status']
+        if 'onmousedown' in element.attrs:
+            del element['onmousedown']
+        class_list = element.get('class', [])
+        if class_list == ['hidden']:
+            remove(element)
+            continue
+        if element.name == 'i' and 'node_status' in class_list:
+            remove(element)
+            continue
+
+        if element.name == 'div':
+            for cls in class_list:
+                if cls.startswith('node'):
+                    # Как и soup.find(): первый div с этим классом
+                    index.node_names.setdefault(cls, element.get('data-name'))
+            if 'node' in class_list:
+                index.nodes.append(element)
+            if 'node_interface' in class_list:
+                parent = element.find_parent('div', class_='jtk-overlay')
+                if parent:
+                    entry = overlays_by_connector.setdefault(id(parent), (parent, []))
+                    entry[1].append(element)
+
+        if any(cls in CONNECTOR_CLASSES for cls in class_list):
+            index.connectors.append(element)
+
+    index.connector_overlays = list(overlays_by_connector.values())
+    return index
+
+
+def build_iface_dict(interface_mapping: List[Dict[str, str]]) -> Dict[frozenset, Dict[str, str]]:
+    """Индекс соединений: пара имён узлов -> интерфейсы каждого из них"""
+    iface_dict = {}
+    for conn in interface_mapping:
+        if len(conn) != 2:
+            continue
+        devices = list(conn.items())
+        src_node, src_iface = devices[0]
+        dst_node, dst_iface = devices[1]
+        key = frozenset((src_node, dst_node))
+        iface_dict[key] = {src_node: src_iface, dst_node: dst_iface}
+    return iface_dict
+
+
+def _nested(elements: List[Tag]) -> bool:
+    """Есть ли среди элементов вложенные друг в друга"""
+    ids = {id(element) for element in elements}
+    return any(id(parent) in ids for element in elements for parent in element.parents)
+
+
+def build_container(index: TemplateIndex, move: bool = False) -> BeautifulSoup:
+    """
+    Создание контейнера customText1 с узлами и соединениями.
+    move=True - элементы переносятся из разобранного дерева без копирования
+    (дерево после этого не используется). Если элементы вложены друг в
+    друга, перенос изменил бы результат, и они копируются.
+    """
+    from bs4 import BeautifulSoup
+
+    container = BeautifulSoup(features='html.parser')
+    custom_div = container.new_tag('div', id='customText1',
+                                   **{
+                                       'class': 'customShape customText context-menu ck-content jtk-draggable dragstopped ui-selectee',
+                                       'data-path': '1',
+                                       'style': 'position: absolute; display: block; top: 0px; left: 0px; width: 100%; height: 100vh; z-index: 1001;'
+                                   })
+    container.append(custom_div)
+
+    elements = index.nodes + index.connectors
+    if move and not _nested(elements):
+        for element in elements:
+            custom_div.append(element.extract())
+    else:
+        for element in elements:
+            custom_div.append(element.__copy__())
+
+    return container
+
+
 def process_template_html(content: str, params: TemplateParams) -> str:
-    """Обработка HTML: очистка, telnet-ссылки, копирование, обновление интерфейсов"""
+    """
+    Обработка HTML: очистка, telnet-ссылки, копирование, обновление интерфейсов.
+    Эталонная обработка разобранного дерева без компиляции; с ней parser_check.py
+    сверяет вывод скомпилированных шаблонов.
+    """
     try:
         debug_log("Начало обработки HTML шаблона", params)
 
         # 1. Парсинг исходного HTML
-        soup = BeautifulSoup(content, 'html.parser')
+        soup = parse_html(content, params.parser)
         if not soup:
             raise ValueError("Не удалось разобрать HTML")
 
-        # 2. Очистка ненужных элементов
-        for element in soup.find_all(True):
-            if 'data-status' in element.attrs:
-                del element['data-status']
-            if 'onmousedown' in element.attrs:
-                del element['onmousedown']
-            if element.get('class') == ['hidden']:
-                element.decompose()
-            if element.name == 'i' and 'node_status' in element.get('class', []):
-                element.decompose()
+        # 2. Очистка ненужных элементов и индексация за один проход
+        index = index_template(soup)
 
         # 3. Обработка telnet-ссылок
         if params.telnet_links:
             debug_log(f"Обработка telnet ссылок: {params.telnet_links}", params)
-            for node in soup.find_all('div', class_='node'):
+            for node in index.nodes:
                 node_name = node.get('data-name', '').strip()
                 telnet_url = params.telnet_links.get(node_name)
                 if not node_name or not telnet_url:
@@ -148,141 +289,337 @@ def process_template_html(content: str, params: TemplateParams) -> str:
         if params.interface_mapping:
             debug_log(f"Обновление интерфейсов: {params.interface_mapping}", params)
 
-            iface_dict = {}
-            for conn in params.interface_mapping:
-                if len(conn) != 2:
-                    continue
-                devices = list(conn.items())
-                src_node, src_iface = devices[0]
-                dst_node, dst_iface = devices[1]
-                key = frozenset((src_node, dst_node))
-                iface_dict[key] = {src_node: src_iface, dst_node: dst_iface}
-
-            for overlay_div in soup.find_all('div', class_='node_interface'):
-                position = overlay_div.get('position')
-
-                parent = overlay_div.find_parent('div', class_='jtk-overlay')
-                if not parent:
-                    continue
+            iface_dict = build_iface_dict(params.interface_mapping)
 
-                class_list = parent.get('class', [])
+            for connector, overlays in index.connector_overlays:
+                class_list = connector.get('class', [])
                 node_classes = [cls for cls in class_list if cls.startswith('node')]
                 if len(node_classes) != 2:
                     continue
 
-                name1 = node_classes[0]
-                name2 = node_classes[1]
-
                 # Найди реальные имена узлов
-                node1_div = soup.find('div', class_=name1)
-                node2_div = soup.find('div', class_=name2)
-                if not node1_div or not node2_div:
-                    continue
-
-                real_name1 = node1_div.get('data-name')
-                real_name2 = node2_div.get('data-name')
+                real_name1 = index.node_names.get(node_classes[0])
+                real_name2 = index.node_names.get(node_classes[1])
                 if not real_name1 or not real_name2:
                     continue
 
-                conn_key = frozenset((real_name1, real_name2))
-                iface_pair = iface_dict.get(conn_key)
+                iface_pair = iface_dict.get(frozenset((real_name1, real_name2)))
                 if not iface_pair:
                     continue
 
-                if position == 'src':
-                    overlay_div.string = iface_pair.get(real_name1, '')
-                elif position == 'dst':
-                    overlay_div.string = iface_pair.get(real_name2, '')
-
-        # 5. Создание контейнера
-        container = BeautifulSoup(features='html.parser')
-        custom_div = container.new_tag('div', id='customText1',
-                                       **{
-                                           'class': 'customShape customText context-menu ck-content jtk-draggable dragstopped ui-selectee',
-                                           'data-path': '1',
-                                           'style': 'position: absolute; display: block; top: 0px; left: 0px; width: 100%; height: 100vh; z-index: 1001;'
-                                       })
-        container.append(custom_div)
-
-        # 6. Копирование узлов и соединений
-        for node in soup.find_all('div', class_='node'):
-            custom_div.append(node.__copy__())
+                for overlay_div in overlays:
+                    position = overlay_div.get('position')
+                    if position == 'src':
+                        overlay_div.string = iface_pair.get(real_name1, '')
+                    elif position == 'dst':
+                        overlay_div.string = iface_pair.get(real_name2, '')
 
-        for connector in soup.find_all(class_=['jtk-connector', 'jtk-endpoint', 'jtk-overlay']):
-            custom_div.append(connector.__copy__())
-
-        return str(container)
+        # 5-6. Создание контейнера и перенос узлов и соединений
+        return str(build_container(index, move=True))
 
     except Exception as e:
         debug_log(f"Критическая ошибка обработки: {str(e)}", params)
         raise ValueError(f"Ошибка обработки HTML: {str(e)}") from e
 
 
-def generate_unl_from_template(
-        template_path: str,
-        lab_name: str,
-        manual_url: str,
-        telnet_links: Dict[str, str],
-        interface_mapping: List[Dict[str, str]],
-        output_dir: str = None,
-        debug: bool = False
-) -> bytes:
+# Маркеры изменяемых частей скелета: значение в тексте элемента
+# и атрибут целиком. Символы из Private Use Area не встречаются в шаблонах
+# и не затрагиваются clean_html_content.
+_TEXT_SLOT = '\ue000{}\ue001'
+_ATTR_SLOT = '\ue002{}\ue001'
+_SLOT_RE = re.compile(r'\ue000(\d+)\ue001| [^\s=]+="\ue002(\d+)\ue001"')
+
+
+@functools.lru_cache(maxsize=None)
+def _formatter():
+    """Форматтер BeautifulSoup 'minimal', которым сериализуется шаблон"""
+    from bs4.formatter import HTMLFormatter
+
+    return HTMLFormatter.REGISTRY['minimal']
+
+
+def _clean_fragment(content: str) -> str:
+    """Очистка фрагмента внутри документа: как clean_html_content, но без strip()"""
+    if '\r' not in content and '\n' not in content and '\t' not in content and '  ' not in content:
+        return content.replace("\u00a0", "")
+    content = re.sub(r'[\r\n\t]+', ' ', content)
+    content = re.sub(r'[ ]{2,}', ' ', content)
+    return content.replace("\u00a0", "")
+
+
+def _attr_fragment(key: str, value: Optional[str]) -> str:
+    """Атрибут в том виде, в котором его выводит BeautifulSoup (пустая строка - нет атрибута)"""
+    if value is None:
+        return ''
+    formatter = _formatter()
+    text = formatter.attribute_value(value)
+    return _clean_fragment(f" {key}={formatter.quoted_attribute_value(text)}")
+
+
+@dataclass
+class NodeSlots:
+    """Изменяемые атрибуты узла, зависящие от telnet-ссылки"""
+    name: str
+    style: Tuple[int, Optional[str]]
+    onclick: Tuple[int, Optional[str]]
+    icon_title: Optional[Tuple[int, Optional[str]]]
+    name_title: Optional[Tuple[int, Optional[str]]]
+
+
+@dataclass
+class OverlaySlot:
+    """Подпись интерфейса на соединении между двумя узлами"""
+    slot: int
+    real_names: Tuple[str, str]
+    position: str
+    original: str
+
+
+@dataclass
+class CompiledTemplate:
     """
-    Генерация UNL файла из HTML шаблона
-
-    Параметры:
-        template_path (str): Путь к HTML шаблону
-        lab_name (str): Название лабораторной работы (без расширения)
-        manual_url (str): URL для сервиса методичек лаб
-        telnet_links (Dict[str, str]): Словарь с telnet-ссылками в формате {имя_узла: url}
-        interface_mapping (List[Dict[str, str]]): Список маппинга интерфейсов
-        output_dir (str, optional): Директория для сохранения. По умолчанию - директория шаблона
-        debug (bool, optional): Включить отладочный режим
-
-    Возвращает:
-        str: Путь к созданному UNL файлу
+    Разобранный и очищенный шаблон: неизменяемые части скелета и
+    изменяемые места (атрибуты узлов и подписи интерфейсов).
+    """
+    template_path: Path
+    mtime_ns: int
+    parts: List[str]
+    slots: List[Optional[int]]
+    slot_count: int
+    nodes: List[NodeSlots]
+    overlays: List[OverlaySlot]
+    # Места шаблона по имени узла и по паре узлов соединения - для частичной подстановки
+    nodes_by_name: Dict[str, List[NodeSlots]] = field(default_factory=dict, init=False)
+    overlays_by_pair: Dict[frozenset, List[OverlaySlot]] = field(default_factory=dict, init=False)
+
+    def __post_init__(self) -> None:
+        for node in self.nodes:
+            self.nodes_by_name.setdefault(node.name, []).append(node)
+        for overlay in self.overlays:
+            self.overlays_by_pair.setdefault(frozenset(overlay.real_names), []).append(overlay)
+
+    def render(self, telnet_links: Dict[str, str], interface_mapping: List[Dict[str, str]]) -> str:
+        """Подстановка telnet-ссылок и интерфейсов в скелет без разбора HTML"""
+        return ''.join(self.iter_render(telnet_links, interface_mapping))
+
+    def iter_render(self, telnet_links: Dict[str, str], interface_mapping: List[Dict[str, str]]) -> Iterator[str]:
+        """Результат render() по частям - для потоковой записи без склейки документа"""
+        return self.iter_parts(self.slot_values(telnet_links, interface_mapping))
+
+    def iter_parts(self, values: List[str]) -> Iterator[str]:
+        """Документ по частям с подставленными значениями мест"""
+        for part, slot in zip(self.parts, self.slots):
+            yield part if slot is None else values[slot]
+
+    def slot_values(self, telnet_links: Dict[str, str], interface_mapping: List[Dict[str, str]]) -> List[str]:
+        """Значения всех изменяемых мест шаблона"""
+        values: List[str] = [''] * self.slot_count
+        for node in self.nodes:
+            self._fill_node(values, node, telnet_links.get(node.name) if telnet_links else None)
+        iface_dict = build_iface_dict(interface_mapping) if interface_mapping else {}
+        for overlay in self.overlays:
+            self._fill_overlay(values, overlay, iface_dict)
+        return values
+
+    def patch_values(self, values: List[str],
+                     previous_links: Dict[str, str], previous_mapping: List[Dict[str, str]],
+                     telnet_links: Dict[str, str], interface_mapping: List[Dict[str, str]]) -> int:
+        """
+        Обновляет значения мест, подставленные для previous_links/previous_mapping,
+        под новые входные данные: пересчитываются только узлы с изменившейся
+        telnet-ссылкой и подписи соединений с изменившимися интерфейсами.
+        Возвращает число пересчитанных мест.
+        """
+        changed = 0
+        previous_links, telnet_links = previous_links or {}, telnet_links or {}
+        for name in previous_links.keys() | telnet_links.keys():
+            if previous_links.get(name) != telnet_links.get(name):
+                for node in self.nodes_by_name.get(name, ()):
+                    changed += self._fill_node(values, node, telnet_links.get(name))
+        previous_ifaces = build_iface_dict(previous_mapping) if previous_mapping else {}
+        iface_dict = build_iface_dict(interface_mapping) if interface_mapping else {}
+        for pair in previous_ifaces.keys() | iface_dict.keys():
+            if previous_ifaces.get(pair) != iface_dict.get(pair):
+                for overlay in self.overlays_by_pair.get(pair, ()):
+                    self._fill_overlay(values, overlay, iface_dict)
+                    changed += 1
+        return changed
+
+    @staticmethod
+    def _fill_node(values: List[str], node: NodeSlots, telnet_url: Optional[str]) -> int:
+        """Атрибуты узла для telnet-ссылки (None - исходные); возвращает число мест"""
+        style_slot, style = node.style
+        onclick_slot, onclick = node.onclick
+        if telnet_url:
+            style = f"cursor: pointer; {style or ''}"
+            onclick = f"window.open('{telnet_url}', '_blank')"
+        values[style_slot] = _attr_fragment('style', style)
+        values[onclick_slot] = _attr_fragment('onclick', onclick)
+        filled = 2
+        if node.icon_title:
+            slot, title = node.icon_title
+            if telnet_url:
+                title = f"Telnet: {telnet_url.split('://')[-1].split('/')[0]}"
+            values[slot] = _attr_fragment('title', title)
+            filled += 1
+        if node.name_title:
+            slot, title = node.name_title
+            if telnet_url:
+                title = f"Подключиться: {telnet_url}"
+            values[slot] = _attr_fragment('title', title)
+            filled += 1
+        return filled
+
+    @staticmethod
+    def _fill_overlay(values: List[str], overlay: OverlaySlot, iface_dict: Dict[frozenset, Dict[str, str]]) -> None:
+        iface_pair = iface_dict.get(frozenset(overlay.real_names))
+        if not iface_pair:
+            values[overlay.slot] = overlay.original
+        elif overlay.position == 'src':
+            values[overlay.slot] = _clean_fragment(_formatter().substitute(iface_pair.get(overlay.real_names[0], '')))
+        else:
+            values[overlay.slot] = _clean_fragment(_formatter().substitute(iface_pair.get(overlay.real_names[1], '')))
+
+
+def compile_template(template_path: Path, parser: Optional[str] = None) -> CompiledTemplate:
+    """
+    Однократный разбор шаблона: очистка, индексация и замена изменяемых
+    мест маркерами. Результат - очищенный скелет, разбитый на части.
     """
-    # Подготовка параметров
     template_path = Path(template_path)
-    if not output_dir:
-        output_dir = template_path.parent
-    else:
-        output_dir = Path(output_dir)
-
-    params = TemplateParams(
+    mtime_ns = template_path.stat().st_mtime_ns
+    soup = parse_html(template_path.read_text(encoding='utf-8'), parser)
+    index = index_template(soup)
+    slot_count = 0
+
+    def attr_slot(element: Tag, key: str) -> Tuple[int, Optional[str]]:
+        nonlocal slot_count
+        original = element.get(key)
+        element[key] = _ATTR_SLOT.format(slot_count)
+        slot_count += 1
+        return slot_count - 1, original
+
+    nodes = []
+    for node in index.nodes:
+        node_name = node.get('data-name', '').strip()
+        if not node_name:
+            continue
+        # Порядок совпадает с process_template_html
+        style = attr_slot(node, 'style')
+        onclick = attr_slot(node, 'onclick')
+        icon = node.find('i', class_='nodehtmlconsole')
+        name_div = node.find('div', class_='node_name')
+        nodes.append(NodeSlots(
+            name=node_name,
+            style=style,
+            onclick=onclick,
+            icon_title=attr_slot(icon, 'title') if icon else None,
+            name_title=attr_slot(name_div, 'title') if name_div else None,
+        ))
+
+    overlays = []
+    for connector, connector_overlays in index.connector_overlays:
+        node_classes = [cls for cls in connector.get('class', []) if cls.startswith('node')]
+        if len(node_classes) != 2:
+            continue
+        real_name1 = index.node_names.get(node_classes[0])
+        real_name2 = index.node_names.get(node_classes[1])
+        if not real_name1 or not real_name2:
+            continue
+        for overlay_div in connector_overlays:
+            position = overlay_div.get('position')
+            if position not in ('src', 'dst'):
+                continue
+            original = _clean_fragment(overlay_div.decode_contents())
+            overlay_div.string = _TEXT_SLOT.format(slot_count)
+            overlays.append(OverlaySlot(slot_count, (real_name1, real_name2), position, original))
+            slot_count += 1
+
+    skeleton = clean_html_content(str(build_container(index, move=True)))
+    parts: List[str] = []
+    slots: List[Optional[int]] = []
+    position = 0
+    for match in _SLOT_RE.finditer(skeleton):
+        parts.append(skeleton[position:match.start()])
+        slots.append(None)
+        parts.append('')
+        slots.append(int(match.group(1) or match.group(2)))
+        position = match.end()
+    parts.append(skeleton[position:])
+    slots.append(None)
+
+    return CompiledTemplate(
         template_path=template_path,
-        lab_name=lab_name,
-        telnet_links=telnet_links,
-        interface_mapping=interface_mapping,
-        debug=debug
+        mtime_ns=mtime_ns,
+        parts=parts,
+        slots=slots,
+        slot_count=slot_count,
+        nodes=nodes,
+        overlays=overlays,
     )
 
-    # Чтение и обработка шаблона
-    html_content = template_path.read_text(encoding='utf-8')
-    processed_html = process_template_html(html_content, params)
-    base64_content = base64.b64encode(clean_html_content(processed_html).encode("utf-8")).decode()
 
-    # Обработка ссылки методички
-    iframe_workbook = create_iframe_workbooks(manual_url)
+_compiled_templates: Dict[Path, CompiledTemplate] = {}
+_compiled_templates_lock = threading.Lock()
 
-    # Сохранение UNL
-    content = create_lab_xml(lab_name, base64_content, iframe_workbook)
 
-    if debug:
-        debug_html = output_dir / f"{lab_name}_debug.html"
-        debug_html.write_text(processed_html, encoding='utf-8')
-        print(f"Debug HTML saved to: {debug_html}")
-        output_path = output_dir / f"{lab_name}.unl"
-        output_path.write_bytes(content)
+def get_compiled_template(template_path: Path) -> CompiledTemplate:
+    """Скомпилированный шаблон из кэша; перекомпилируется при изменении mtime файла"""
+    template_path = Path(template_path).resolve()
+    with _compiled_templates_lock:
+        compiled = _compiled_templates.get(template_path)
+        if compiled is None or compiled.mtime_ns != template_path.stat().st_mtime_ns:
+            compiled = compile_template(template_path)
+            _compiled_templates[template_path] = compiled
+        return compiled
+
 
-    return content
+def save_debug_output(output_dir: Path, lab_name: str, processed_html: str, content: bytes) -> None:
+    """Отладочный HTML и UNL рядом с шаблоном"""
+    debug_html = output_dir / f"{lab_name}_debug.html"
+    debug_html.write_text(processed_html, encoding='utf-8')
+    print(f"Debug HTML saved to: {debug_html}")
+    output_path = output_dir / f"{lab_name}.unl"
+    output_path.write_bytes(content)
 
 
-def debug_html_output(html_content: str, output_path: Path) -> None:
-    """Сохранение отладочного HTML"""
+def render_unl(
+        template_path: str,
+        lab_name: str,
+        manual_url: str,
+        telnet_links: Dict[str, str],
+        interface_mapping: List[Dict[str, str]],
+        previous: Optional[RenderState] = None,
+        debug: bool = False
+) -> Tuple[bytes, RenderState, Optional[int]]:
+    """
+    Генерация UNL с сохранением состояния подстановки.
+    previous - состояние предыдущей генерации: если оно получено для той же
+    версии шаблона, пересчитываются только изменившиеся места, а
+    идентификатор лабораторной работы сохраняется.
+    Возвращает содержимое, новое состояние и число пересчитанных мест
+    (None - полная генерация).
+    """
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        print(f"✓ Отладочный HTML сохранён: {output_path.resolve()}")
+        compiled = get_compiled_template(Path(template_path))
     except Exception as e:
-        print(f"✖ Ошибка сохранения отладочного файла: {str(e)}")
+        raise ValueError(f"Ошибка обработки HTML: {str(e)}") from e
+
+    if (previous is not None and previous.template_path == str(template_path)
+            and previous.mtime_ns == compiled.mtime_ns and len(previous.values) == compiled.slot_count):
+        values = list(previous.values)
+        changed = compiled.patch_values(values, previous.telnet_links, previous.interface_mapping,
+                                        telnet_links, interface_mapping)
+        guid = previous.guid
+    else:
+        values = compiled.slot_values(telnet_links, interface_mapping)
+        changed = None
+        guid = str(uuid.uuid4())
+
+    buffer = io.BytesIO()
+    write_unl(buffer, lab_name, compiled.iter_parts(values), create_iframe_workbooks(manual_url), guid)
+    content = buffer.getvalue()
+    if debug:
+        save_debug_output(Path(template_path).parent, lab_name, ''.join(compiled.iter_parts(values)), content)
+    state = RenderState(str(template_path), compiled.mtime_ns, guid, telnet_links, interface_mapping, values)
+    return content, state, changed
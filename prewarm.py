@@ -0,0 +1,273 @@
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from datetime import time as day_time
+from typing import Callable, FrozenSet, List, Optional, Tuple, Union
+
+import yaml
+
+from database import ConnectionPool
+from unl_store import unl_file_content_get, unl_file_rebind
+
+# Расписание занятий, по которому заранее готовятся лабораторные работы
+PREWARM_TIMETABLE = os.getenv("PREWARM_TIMETABLE", "timetable.yaml")
+# Как часто планировщик проверяет расписание и истёкшие слоты (с)
+PREWARM_INTERVAL = float(os.getenv("PREWARM_INTERVAL", "30"))
+DEFAULT_LEAD_MINUTES = 10
+DEFAULT_HOLD_MINUTES = 30
+WARM_PREFIX = "warm-"
+
+# Готовый слот для запуска: лабораторная, вендор и manual_url совпадают, окно не закончилось
+READY_SLOT = "status = 'ready' AND lab = ? AND vendor = ? AND manual_url = ? AND expires_at > ?"
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+# Запуск лабораторной работы: (номер, groups_id, manual_url, vendor) -> UNL или None
+Launcher = Callable[[str, str, str, Union[str, list]], Optional[bytes]]
+# Освобождение устройств, VLAN и UNL группы; False (или исключение) - освободить не удалось
+Releaser = Callable[[str], object]
+
+
+class TimetableError(ValueError):
+    """Некорректное расписание прогрева"""
+
+
+@dataclass(frozen=True)
+class TimetableEntry:
+    """Занятие: сколько слотов лабораторной работы подготовить и когда"""
+    index: int
+    lab: str
+    start: day_time
+    weekdays: FrozenSet[int]
+    lead: timedelta
+    hold: timedelta
+    slots: int
+    vendor: Union[str, list] = "Any"
+    manual_url: str = ""
+
+    def window_at(self, now: datetime) -> Optional[Tuple[str, float]]:
+        """Окно прогрева, в которое попадает now: (ключ окна, конец окна) или None"""
+        start = datetime.combine(now.date(), self.start)
+        if now.weekday() not in self.weekdays or not start - self.lead <= now < start + self.hold:
+            return None
+        return f"{self.index}:lab{self.lab}@{start.isoformat(timespec='minutes')}", (start + self.hold).timestamp()
+
+
+def vendor_key(vendor: Union[str, list, None]) -> str:
+    """Вендоры запуска как ключ слота: строка или JSON списка"""
+    if vendor is None:
+        return "Any"
+    return vendor if isinstance(vendor, str) else json.dumps(vendor)
+
+
+def parse_timetable(content: str) -> List[TimetableEntry]:
+    """Разбор и проверка расписания"""
+    config = yaml.safe_load(content) or {}
+    if not isinstance(config, dict) or not isinstance(config.get("prewarm", []), list):
+        raise TimetableError("В расписании нет списка prewarm")
+    entries = []
+    for index, item in enumerate(config.get("prewarm", [])):
+        if not isinstance(item, dict) or "lab" not in item or "start" not in item:
+            raise TimetableError(f"Занятие {index}: нужны lab и start")
+        try:
+            start = datetime.strptime(str(item["start"]), "%H:%M").time()
+        except ValueError:
+            raise TimetableError(f"Занятие {index}: start должен быть в формате ЧЧ:ММ") from None
+        weekdays = item.get("weekdays", WEEKDAYS)
+        unknown = [day for day in weekdays if day not in WEEKDAYS]
+        if unknown:
+            raise TimetableError(f"Занятие {index}: неизвестные дни недели {unknown}")
+        slots = item.get("slots", 1)
+        if not isinstance(slots, int) or slots < 0:
+            raise TimetableError(f"Занятие {index}: slots должно быть неотрицательным числом")
+        entries.append(TimetableEntry(
+            index=index,
+            lab=str(item["lab"]),
+            start=start,
+            weekdays=frozenset(WEEKDAYS.index(day) for day in weekdays),
+            lead=timedelta(minutes=item.get("lead_minutes", DEFAULT_LEAD_MINUTES)),
+            hold=timedelta(minutes=item.get("hold_minutes", DEFAULT_HOLD_MINUTES)),
+            slots=slots,
+            vendor=item.get("vendor", "Any"),
+            manual_url=item.get("manual_url", ""),
+        ))
+    return entries
+
+
+class WarmPool:
+    """
+    Заранее запущенные лабораторные работы (слоты).
+    Перед занятием по расписанию слоты запускаются целиком (устройства, VLAN
+    на коммутаторах, UNL) под служебной группой warm-*. Запрос группы
+    забирает готовый слот: служебная группа переименовывается в группу
+    запроса одной транзакцией. Незабранные слоты освобождаются после окна.
+    """
+
+    def __init__(self, db_pool: ConnectionPool, launch: Launcher, release: Releaser,
+                 timetable_path: str = PREWARM_TIMETABLE, interval: float = PREWARM_INTERVAL):
+        self.db_pool = db_pool
+        self.launch = launch
+        self.release = release
+        self.timetable_path = timetable_path
+        self.interval = interval
+        self._entries: List[TimetableEntry] = []
+        self._mtime_ns: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def timetable(self) -> List[TimetableEntry]:
+        """Расписание; перечитывается при изменении файла, битый файл не заменяет прежнее"""
+        try:
+            mtime_ns = os.stat(self.timetable_path).st_mtime_ns
+        except OSError:
+            self._entries, self._mtime_ns = [], None
+            return self._entries
+        if mtime_ns != self._mtime_ns:
+            self._mtime_ns = mtime_ns
+            try:
+                with open(self.timetable_path, "r", encoding="utf-8") as file:
+                    self._entries = parse_timetable(file.read())
+            except (OSError, yaml.YAMLError, TimetableError) as e:
+                print(f"Ошибка чтения {self.timetable_path}, используется прежнее расписание: {e}")
+        return self._entries
+
+    def claim(self, lab_number, groups_id: str, manual_url: str = "", vendor="Any") -> Optional[bytes]:
+        """Передаёт группе готовый слот лабораторной работы; UNL или None, если слота нет"""
+        now = time.time()
+        key = (str(lab_number), vendor_key(vendor), manual_url or "", now)
+        # Без готовых слотов запуск не должен брать блокировку записи
+        with self.db_pool.checkout() as conn:
+            if not conn.execute(f"SELECT 1 FROM warm_slots WHERE {READY_SLOT} LIMIT 1", key).fetchone():
+                return None
+        with self.db_pool.unit_of_work() as conn:
+            row = conn.execute(f"""
+                UPDATE warm_slots SET status = 'claimed', claimed_by = ?, claimed_at = ?
+                WHERE groups_id = (
+                    SELECT groups_id FROM warm_slots WHERE {READY_SLOT}
+                    ORDER BY created_at LIMIT 1
+                )
+                RETURNING groups_id
+            """, (groups_id, now, *key)).fetchone()
+            if not row:
+                return None
+            slot = row[0]
+            conn.execute("UPDATE components SET groups_id = ? WHERE groups_id = ?", (groups_id, slot))
+            conn.execute("UPDATE vlan_config SET groups_id = ? WHERE groups_id = ?", (groups_id, slot))
+            unl_file_rebind(conn, slot, groups_id)
+        print(f"Группе {groups_id} выдан заранее запущенный слот {slot} (лабораторная {lab_number})")
+        with self.db_pool.checkout() as conn:
+            return unl_file_content_get(conn, groups_id)
+
+    def tick(self, now: Optional[datetime] = None) -> int:
+        """Освобождает истёкшие слоты и догревает слоты активных окон; возвращает число новых слотов"""
+        now = now or datetime.now()
+        self.expire(now.timestamp())
+        warmed = 0
+        for entry in self.timetable():
+            window = entry.window_at(now)
+            if window is None:
+                continue
+            key, expires_at = window
+            with self.db_pool.checkout() as conn:
+                existing = conn.execute(
+                    "SELECT COUNT(*) FROM warm_slots WHERE period = ?", (key,)).fetchone()[0]
+            for _ in range(entry.slots - existing):
+                if self._stop.is_set() or not self._warm(entry, key, expires_at):
+                    break
+                warmed += 1
+        return warmed
+
+    def _warm(self, entry: TimetableEntry, key: str, expires_at: float) -> bool:
+        slot = f"{WARM_PREFIX}{uuid.uuid4().hex[:12]}"
+        with self.db_pool.unit_of_work() as conn:
+            conn.execute("""
+                INSERT INTO warm_slots (groups_id, period, lab, vendor, manual_url, status, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, 'warming', ?, ?)
+            """, (slot, key, entry.lab, vendor_key(entry.vendor), entry.manual_url, time.time(), expires_at))
+        try:
+            content = self.launch(entry.lab, slot, entry.manual_url, entry.vendor)
+        except Exception as e:
+            print(f"Не удалось подготовить слот лабораторной {entry.lab}: {e}")
+            content = None
+        if content is None:
+            self._release(slot)
+            return False
+        with self.db_pool.unit_of_work() as conn:
+            conn.execute("UPDATE warm_slots SET status = 'ready' WHERE groups_id = ?", (slot,))
+        return True
+
+    def _release(self, slot: str) -> bool:
+        """
+        Освобождает слот. Запись слота удаляется только после успешного освобождения,
+        иначе слот остаётся в releasing и освобождается повторно (expire, recover):
+        устройства и VLAN не остаются за служебной группой без записи.
+        """
+        try:
+            released = self.release(slot) is not False
+        except Exception as e:
+            print(f"Не удалось освободить слот {slot}: {e}")
+            released = False
+        with self.db_pool.unit_of_work() as conn:
+            if released:
+                conn.execute("DELETE FROM warm_slots WHERE groups_id = ?", (slot,))
+            else:
+                conn.execute("UPDATE warm_slots SET status = 'releasing' WHERE groups_id = ?", (slot,))
+        return released
+
+    def expire(self, now: float) -> int:
+        """Освобождает незабранные слоты закончившихся окон и повторяет неудавшиеся освобождения"""
+        # Планировщик проверяет слоты на каждом шаге: без истёкших блокировка записи не нужна
+        with self.db_pool.checkout() as conn:
+            if not conn.execute(
+                    "SELECT 1 FROM warm_slots WHERE status = 'releasing' "
+                    "OR (status IN ('ready', 'claimed') AND expires_at <= ?) LIMIT 1", (now,)).fetchone():
+                return 0
+        with self.db_pool.unit_of_work() as conn:
+            # Слот, переведённый в releasing, уже нельзя забрать
+            slots = [row[0] for row in conn.execute(
+                "UPDATE warm_slots SET status = 'releasing' "
+                "WHERE status = 'releasing' OR (status = 'ready' AND expires_at <= ?) "
+                "RETURNING groups_id", (now,))]
+            conn.execute("DELETE FROM warm_slots WHERE status = 'claimed' AND expires_at <= ?", (now,))
+        for slot in slots:
+            self._release(slot)
+        return len(slots)
+
+    def recover(self) -> int:
+        """После перезапуска освобождает слоты, подготовка или освобождение которых прервались"""
+        with self.db_pool.unit_of_work() as conn:
+            slots = [row[0] for row in conn.execute(
+                "UPDATE warm_slots SET status = 'releasing' WHERE status IN ('warming', 'releasing') "
+                "RETURNING groups_id")]
+        for slot in slots:
+            self._release(slot)
+        return len(slots)
+
+    def slots(self) -> List[dict]:
+        columns = ("groups_id", "period", "lab", "vendor", "manual_url", "status",
+                   "created_at", "expires_at", "claimed_by", "claimed_at")
+        with self.db_pool.checkout() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(columns)} FROM warm_slots ORDER BY created_at").fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Ошибка планировщика прогрева: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, name="prewarm", daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,252 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import pnetLabParser
+from render_state import RenderState
+
+# Процессов генерации UNL (0 - генерация в потоке запроса, без пула)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 1)))
+# Сколько генераций может ждать свободного процесса сверх выполняющихся
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", "32"))
+# Сколько запрос ждёт места в очереди генерации, прежде чем получить отказ (с)
+RENDER_QUEUE_TIMEOUT = float(os.getenv("RENDER_QUEUE_TIMEOUT", "5"))
+# Предельное время одной генерации (с)
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "60"))
+# Сколько последних генераций учитывается в метриках
+METRICS_WINDOW = 256
+
+
+class RenderQueueFullError(Exception):
+    """Очередь генерации UNL заполнена"""
+
+
+@dataclass(frozen=True)
+class RenderSpec:
+    """
+    Параметры генерации UNL (передаются в процесс генерации, поэтому только простые типы).
+    previous - состояние прошлой генерации группы: пересчитываются только изменения.
+    """
+    template_path: str
+    lab_name: str
+    manual_url: str
+    telnet_links: Dict[str, str]
+    interface_mapping: List[Dict[str, str]]
+    debug: bool = False
+    previous: Optional[RenderState] = None
+
+
+@dataclass
+class RenderResult:
+    """UNL и состояние подстановки для следующей генерации"""
+    content: bytes
+    state: RenderState
+    # Пересчитанных мест шаблона; None - полная генерация
+    changed_slots: Optional[int]
+
+
+def render_spec(spec: RenderSpec) -> Tuple[RenderResult, float]:
+    """Генерация UNL; выполняется в процессе пула. Возвращает результат и время генерации (с)"""
+    started = time.perf_counter()
+    content, state, changed_slots = pnetLabParser.render_unl(
+        template_path=spec.template_path,
+        lab_name=spec.lab_name,
+        manual_url=spec.manual_url,
+        telnet_links=spec.telnet_links,
+        interface_mapping=spec.interface_mapping,
+        previous=spec.previous,
+        debug=spec.debug,
+    )
+    return RenderResult(content, state, changed_slots), time.perf_counter() - started
+
+
+def _init_worker(template_paths: Tuple[str, ...]) -> None:
+    """Подготовка процесса пула: разбор HTML и компиляция шаблонов один раз на процесс"""
+    for template_path in template_paths:
+        try:
+            pnetLabParser.get_compiled_template(template_path)
+        except Exception as e:
+            print(f"Шаблон {template_path} не скомпилирован заранее: {e}")
+
+
+@dataclass
+class RenderMetrics:
+    """Счётчики и времена генераций (мс) за последние METRICS_WINDOW генераций"""
+    rendered: int = 0
+    # Из них повторных генераций по прошлому состоянию (только изменившиеся места)
+    incremental: int = 0
+    failed: int = 0
+    rejected: int = 0
+    render_ms: deque = field(default_factory=lambda: deque(maxlen=METRICS_WINDOW))
+    wait_ms: deque = field(default_factory=lambda: deque(maxlen=METRICS_WINDOW))
+
+
+def _percentile(values: List[float], share: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * share))], 1)
+
+
+class RenderService:
+    """
+    Генерация UNL в пуле процессов, чтобы разбор шаблонов не занимал GIL
+    процесса API. Процессы создаются один раз при start() (до потоков
+    запросов) и заранее компилируют шаблоны лабораторных работ.
+    Число генераций в работе и в очереди ограничено: при заполненной очереди
+    запрос ждёт не дольше queue_timeout и получает RenderQueueFullError.
+    """
+
+    def __init__(self, workers: int = RENDER_WORKERS, queue_size: int = RENDER_QUEUE_SIZE,
+                 queue_timeout: float = RENDER_QUEUE_TIMEOUT, timeout: float = RENDER_TIMEOUT):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.template_paths: Tuple[str, ...] = ()
+        self._started = False
+        self.capacity = max(workers, 1) + queue_size
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._metrics = RenderMetrics()
+        self._metrics_lock = threading.Lock()
+        self._in_flight = 0
+
+    def start(self, template_paths: Iterable[str] = ()) -> None:
+        """
+        Создаёт процессы пула заранее (вызывать до запуска потоков сервиса);
+        каждый процесс компилирует шаблоны template_paths.
+        """
+        self.template_paths = tuple(template_paths)
+        self._started = True
+        # Неверный UNL_PARSER - ошибка при старте, а не при первой генерации
+        print(f"Бэкенд разбора шаблонов UNL: {pnetLabParser.resolve_parser()}")
+        if self.workers > 0:
+            self._executor().submit(int).result()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                if not self._started:
+                    print("Пул генерации UNL создаётся из потока запроса без start(): "
+                          "шаблоны не скомпилированы заранее (см. main.create_app)")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(self.template_paths,))
+            return self._pool
+
+    def _reset(self, pool: ProcessPoolExecutor) -> None:
+        """Заменяет пул, процесс которого аварийно завершился"""
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        print("Процесс генерации UNL завершился аварийно, пул пересоздаётся")
+
+    def has_capacity(self) -> bool:
+        """Есть ли место в очереди генерации (проверка до резервирования устройств)"""
+        return self._in_flight < self.capacity
+
+    def submit(self, spec: RenderSpec, block_timeout: Optional[float] = -1) -> "Future[RenderResult]":
+        """
+        Ставит генерацию в очередь и возвращает Future с результатом (RenderResult).
+        block_timeout - сколько ждать места в очереди (None - без ограничения,
+        по умолчанию queue_timeout).
+        """
+        if block_timeout == -1:
+            block_timeout = self.queue_timeout
+        if not self._slots.acquire(timeout=block_timeout):
+            with self._metrics_lock:
+                self._metrics.rejected += 1
+            raise RenderQueueFullError(f"Очередь генерации UNL заполнена ({self.capacity})")
+        with self._metrics_lock:
+            self._in_flight += 1
+        result: "Future[RenderResult]" = Future()
+        queued = time.perf_counter()
+
+        def done(future: Future, pool: Optional[ProcessPoolExecutor] = None) -> None:
+            total = time.perf_counter() - queued
+            with self._metrics_lock:
+                self._in_flight -= 1
+            self._slots.release()
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool) and pool is not None:
+                self._reset(pool)
+            with self._metrics_lock:
+                if error is not None:
+                    self._metrics.failed += 1
+                else:
+                    rendered, elapsed = future.result()
+                    self._metrics.rendered += 1
+                    if rendered.changed_slots is not None:
+                        self._metrics.incremental += 1
+                    self._metrics.render_ms.append(elapsed * 1000)
+                    self._metrics.wait_ms.append(max(total - elapsed, 0.0) * 1000)
+            if error is not None:
+                result.set_exception(error)
+            else:
+                result.set_result(future.result()[0])
+
+        if self.workers <= 0:
+            inline: Future = Future()
+            try:
+                inline.set_result(render_spec(spec))
+            except Exception as e:
+                inline.set_exception(e)
+            done(inline)
+            return result
+        pool = self._executor()
+        try:
+            try:
+                future = pool.submit(render_spec, spec)
+            except BrokenProcessPool:
+                self._reset(pool)
+                pool = self._executor()
+                future = pool.submit(render_spec, spec)
+        except BaseException:
+            with self._metrics_lock:
+                self._in_flight -= 1
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: done(f, pool))
+        return result
+
+    def render(self, spec: RenderSpec) -> RenderResult:
+        """Генерация одного UNL с ожиданием результата"""
+        return self.submit(spec).result(timeout=self.timeout)
+
+    def render_many(self, specs: Dict[Hashable, RenderSpec]) -> Dict[Hashable, RenderResult]:
+        """
+        Генерация нескольких UNL {ключ: параметры}. Очередь не отказывает:
+        генерации ждут освободившихся мест, чтобы не нагружать пул сверх лимита.
+        """
+        futures = {key: self.submit(spec, block_timeout=None) for key, spec in specs.items()}
+        return {key: future.result(timeout=self.timeout) for key, future in futures.items()}
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            render_ms = list(self._metrics.render_ms)
+            wait_ms = list(self._metrics.wait_ms)
+            return {
+                'workers': self.workers,
+                'capacity': self.capacity,
+                'in_flight': self._in_flight,
+                'rendered': self._metrics.rendered,
+                'incremental': self._metrics.incremental,
+                'failed': self._metrics.failed,
+                'rejected': self._metrics.rejected,
+                'render_ms': {'p50': _percentile(render_ms, 0.5), 'p95': _percentile(render_ms, 0.95),
+                              'max': _percentile(render_ms, 1.0)},
+                'wait_ms': {'p50': _percentile(wait_ms, 0.5), 'p95': _percentile(wait_ms, 0.95),
+                            'max': _percentile(wait_ms, 1.0)},
+            }
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,17 @@
+from dataclasses import dataclass
+from typing import Dict, List
+
+
+@dataclass
+class RenderState:
+    """
+    Подстановка последней генерации UNL: входные данные, значения мест
+    шаблона и идентификатор лабораторной работы. По нему повторная
+    генерация пересчитывает только места, затронутые изменением входных данных.
+    """
+    template_path: str
+    mtime_ns: int
+    guid: str
+    telnet_links: Dict[str, str]
+    interface_mapping: List[Dict[str, str]]
+    values: List[str]
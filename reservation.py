@@ -0,0 +1,196 @@
+import random
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from sqlite3 import Connection
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from allocator import claim_component, free_pool_size
+
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.05
+
+# Действия в транзакции резервирования: получают соединение и выданные устройства
+OnReserved = Callable[[Connection, List[Dict[str, str]]], None]
+# То же для нескольких групп: соединение, группа и выданные ей устройства
+OnGroupReserved = Callable[[Connection, str, List[Dict[str, str]]], None]
+
+
+@dataclass
+class ReservationResult:
+    """Итог резервирования набора устройств лабораторной работы"""
+    success: bool
+    components: List[Dict[str, str]] = field(default_factory=list)
+    missing: List[Dict[str, object]] = field(default_factory=list)
+    attempts: int = 0
+    error: Optional[str] = None
+
+    def __bool__(self) -> bool:
+        return self.success
+
+    def describe(self) -> str:
+        """Человекочитаемое описание нехватки оборудования"""
+        if self.error:
+            return self.error
+        return "; ".join(
+            f"{item['name']}: нет свободных {item['device_type']}"
+            + (f" ({item['model']})" if item['model'] else "")
+            + f", требуется {item['required']}, свободно {item['free']}"
+            for item in self.missing
+        )
+
+
+class ReservationError(Exception):
+    """Набор устройств не может быть зарезервирован целиком"""
+
+    def __init__(self, result: ReservationResult):
+        super().__init__(result.describe())
+        self.result = result
+
+
+class GroupLaunchedError(Exception):
+    """У группы уже есть UNL или выданные устройства: второй набор не резервируется"""
+
+    def __init__(self, groups_id: str):
+        super().__init__(f"Лабораторная работа группы {groups_id} уже запущена")
+        self.groups_id = groups_id
+
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    message = str(error)
+    return "database is locked" in message or "database is busy" in message
+
+
+def _device_model(device: Dict[str, str]) -> Optional[str]:
+    if device["device_type"] == 'PC' or device.get("vendor", "Any") == "Any":
+        return None
+    return device["vendor"]
+
+
+def _claim_all(db: Connection, devices: List[Dict[str, str]], groups_id: str):
+    """Выдаёт устройства по порядку; возвращает выданные и виды, которых не хватило"""
+    components = []
+    missing_kinds = []
+    for device in devices:
+        kind = (device["device_type"], _device_model(device))
+        component = claim_component(db, kind[0], groups_id, model=kind[1])
+        if component:
+            components.append(component)
+        elif kind not in missing_kinds:
+            missing_kinds.append(kind)
+    return components, missing_kinds
+
+
+def _describe_missing(db: Connection, devices: List[Dict[str, str]], missing_kinds) -> List[Dict[str, object]]:
+    missing = []
+    for device_type, model in missing_kinds:
+        names = [device["name"] for device in devices
+                 if (device["device_type"], _device_model(device)) == (device_type, model)]
+        missing.append({
+            "name": names[0],
+            "device_type": device_type,
+            "model": model,
+            "required": len(names),
+            "free": free_pool_size(db, device_type, model=model),
+        })
+    return missing
+
+
+def reserve_devices(
+        db: Connection,
+        devices: List[Dict[str, str]],
+        groups_id: str,
+        retries: int = BUSY_RETRIES,
+        backoff: float = BUSY_BACKOFF,
+        on_reserved: Optional[OnReserved] = None,
+) -> ReservationResult:
+    """
+    Резервирует весь набор устройств лабораторной работы в одной транзакции
+    BEGIN IMMEDIATE: либо группа получает все устройства, либо ни одного.
+    on_reserved выполняется в той же транзакции после выдачи устройств
+    (например, запись VLAN); исключение в нём отменяет резервирование.
+    При занятой базе повторяет попытку с экспоненциальной задержкой.
+    """
+    db.commit()
+    last_error = None
+    for attempt in range(1, retries + 1):
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            components, missing_kinds = _claim_all(db, devices, groups_id)
+            if missing_kinds:
+                db.rollback()
+                return ReservationResult(success=False, missing=_describe_missing(db, devices, missing_kinds),
+                                         attempts=attempt)
+            if on_reserved is not None:
+                on_reserved(db, components)
+            db.commit()
+            return ReservationResult(success=True, components=components, attempts=attempt)
+        except sqlite3.OperationalError as e:
+            if db.in_transaction:
+                db.rollback()
+            if not _is_busy(e):
+                raise
+            last_error = e
+            if attempt < retries:
+                time.sleep(backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+        except Exception:
+            if db.in_transaction:
+                db.rollback()
+            raise
+    return ReservationResult(success=False, attempts=retries, error=f"База данных занята: {last_error}")
+
+
+def reserve_many(
+        db: Connection,
+        requests: Sequence[Tuple[str, List[Dict[str, str]]]],
+        retries: int = BUSY_RETRIES,
+        backoff: float = BUSY_BACKOFF,
+        on_reserved: Optional[OnGroupReserved] = None,
+) -> Dict[str, ReservationResult]:
+    """
+    Резервирует наборы устройств нескольких групп (groups_id, devices) в одной
+    транзакции BEGIN IMMEDIATE. Каждая группа - в своей точке сохранения:
+    группа получает все свои устройства или ни одного, а нехватка оборудования
+    или исключение в on_reserved у одной группы не отменяют остальные.
+    """
+    db.commit()
+    last_error = None
+    for attempt in range(1, retries + 1):
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            results = {}
+            for groups_id, devices in requests:
+                db.execute("SAVEPOINT reserve_group")
+                components, missing_kinds = _claim_all(db, devices, groups_id)
+                if missing_kinds:
+                    db.execute("ROLLBACK TO reserve_group")
+                    result = ReservationResult(success=False, missing=_describe_missing(db, devices, missing_kinds),
+                                               attempts=attempt)
+                else:
+                    result = ReservationResult(success=True, components=components, attempts=attempt)
+                    try:
+                        if on_reserved is not None:
+                            on_reserved(db, groups_id, components)
+                    except sqlite3.OperationalError:
+                        raise
+                    except Exception as e:
+                        db.execute("ROLLBACK TO reserve_group")
+                        result = ReservationResult(success=False, attempts=attempt, error=str(e))
+                db.execute("RELEASE reserve_group")
+                results[groups_id] = result
+            db.commit()
+            return results
+        except sqlite3.OperationalError as e:
+            if db.in_transaction:
+                db.rollback()
+            if not _is_busy(e):
+                raise
+            last_error = e
+            if attempt < retries:
+                time.sleep(backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+        except Exception:
+            if db.in_transaction:
+                db.rollback()
+            raise
+    error = f"База данных занята: {last_error}"
+    return {groups_id: ReservationResult(success=False, attempts=retries, error=error) for groups_id, _ in requests}
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+# Бюджет холодного импорта API (мс) и модули, которых не должно быть
+# на пути запроса: графический стек и разбор HTML подгружаются по требованию
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "800"))
+HEAVY_MODULES = ("matplotlib", "pandas", "numpy", "bs4")
+
+_PROBE = (
+    "import resource, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = (time.perf_counter() - started) * 1000\n"
+    "heavy = [name for name in {heavy!r} if name in sys.modules]\n"
+    "print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, ','.join(heavy))\n"
+)
+
+
+def measure_startup(module: str = "main", runs: int = 3) -> Tuple[float, int, List[str]]:
+    """
+    Холодный импорт модуля в отдельном процессе, лучший из runs запусков.
+    Возвращает время импорта (мс), пиковую память процесса (КБ) и загруженные тяжёлые модули.
+    """
+    root = Path(__file__).resolve().parent
+    best = None
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=root, capture_output=True, text=True, check=True,
+            env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+        ).stdout.splitlines()[-1]
+        elapsed, rss, heavy = output.split(" ", 2)
+        result = (float(elapsed), int(rss), [name for name in heavy.split(",") if name])
+        if best is None or result[0] < best[0]:
+            best = result
+    return best
+
+
+if __name__ == "__main__":
+    elapsed, rss, heavy = measure_startup()
+    print(f"Импорт main: {elapsed:.0f} мс (бюджет {STARTUP_BUDGET_MS:.0f} мс), память {rss / 1024:.1f} МБ")
+    if heavy:
+        print(f"✖ На пути старта загружены тяжёлые модули: {', '.join(heavy)}")
+    if elapsed > STARTUP_BUDGET_MS:
+        print("✖ Бюджет времени старта превышен")
+    sys.exit(1 if heavy or elapsed > STARTUP_BUDGET_MS else 0)
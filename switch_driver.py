@@ -0,0 +1,380 @@
+import os
+import re
+import shlex
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Pattern, Sequence, Tuple, Union
+
+from ansible_runner import AnsibleBackend
+
+# Способ применения плеев: ansible (ansible-playbook) или native (прямые
+# Telnet-сессии к коммутаторам с ansible-playbook в качестве запасного пути)
+SWITCH_BACKEND = os.getenv("SWITCH_BACKEND", "ansible")
+# Таймаут подключения и ожидания ответа коммутатора (с)
+SWITCH_TIMEOUT = float(os.getenv("SWITCH_TIMEOUT", "10"))
+# Сессия, простаивавшая дольше (с), открывается заново: коммутатор мог её закрыть
+SESSION_IDLE = float(os.getenv("SWITCH_SESSION_IDLE", "300"))
+
+# Служебные байты Telnet (RFC 854)
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+OPT_ECHO, OPT_SGA = 1, 3
+
+PROMPT_RE = re.compile(rb"[\w.\-]+(?:\([\w\-]+\))?[>#] ?$")
+LOGIN_RE = re.compile(rb"(?:[Uu]sername|[Ll]ogin): ?$")
+PASSWORD_RE = re.compile(rb"[Pp]assword: ?$")
+# Сообщения IOS об ошибке команды: «% Invalid input detected», «% Incomplete command» и т.п.
+ERROR_RE = re.compile(r"^% .*$", re.M)
+
+
+class SwitchError(Exception):
+    """Ошибка настройки коммутатора"""
+
+
+class SwitchConnectionError(SwitchError):
+    """Сессия оборвалась или коммутатор перестал отвечать"""
+
+
+class SwitchUnavailableError(SwitchError):
+    """Коммутатор группы недоступен напрямую (нет в inventory, не Telnet, не отвечает)"""
+
+
+@dataclass(frozen=True)
+class SwitchHost:
+    name: str
+    address: str
+    port: int
+    username: str
+    password: str
+    enable_password: str
+
+
+def _inventory_vars(tokens: Sequence[str]) -> Dict[str, str]:
+    return dict(token.split("=", 1) for token in tokens if "=" in token)
+
+
+def load_inventory(path: str) -> Dict[str, List[SwitchHost]]:
+    """
+    Коммутаторы групп из INI-inventory Ansible, доступные по Telnet:
+    у хоста (или в [группа:vars]) должно быть native_transport=telnet.
+    Используются ansible_host, native_port (по умолчанию 23), ansible_user,
+    ansible_password и ansible_become_password.
+    """
+    hosts: Dict[str, List[Tuple[str, Dict[str, str]]]] = {}
+    group_vars: Dict[str, Dict[str, str]] = {}
+    section = None
+    with open(path, "r", encoding="utf-8") as file:
+        for raw in file:
+            line = raw.strip()
+            if not line or line[0] in "#;":
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                section = line[1:-1]
+                continue
+            if section is None:
+                continue
+            if section.endswith(":vars"):
+                group_vars.setdefault(section[:-5], {}).update(_inventory_vars([line.replace(" = ", "=")]))
+            elif ":" not in section:
+                tokens = shlex.split(line)
+                hosts.setdefault(section, []).append((tokens[0], _inventory_vars(tokens[1:])))
+    inventory = {}
+    for group_name, members in hosts.items():
+        switches = []
+        for name, host_vars in members:
+            variables = {**group_vars.get("all", {}), **group_vars.get(group_name, {}), **host_vars}
+            if variables.get("native_transport") != "telnet":
+                continue
+            password = variables.get("ansible_password", "")
+            switches.append(SwitchHost(
+                name=name,
+                address=variables.get("ansible_host", name),
+                port=int(variables.get("native_port", "23")),
+                username=variables.get("ansible_user", ""),
+                password=password,
+                enable_password=variables.get("ansible_become_password", password),
+            ))
+        if switches:
+            inventory[group_name] = switches
+    return inventory
+
+
+class TelnetSession:
+    """
+    CLI-сессия коммутатора Cisco IOS поверх сокета: вход, enable,
+    выполнение команд с проверкой ответа. Опции Telnet отклоняются,
+    кроме ECHO и SUPPRESS-GO-AHEAD со стороны коммутатора.
+    """
+
+    def __init__(self, host: SwitchHost, timeout: float = SWITCH_TIMEOUT):
+        self.host = host
+        self.timeout = timeout
+        self.sock = socket.create_connection((host.address, host.port), timeout=timeout)
+        # Команды короткие и идут по одной: без задержки Нейгла
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.last_used = time.monotonic()
+        self._buffer = b""
+        self._iac_tail = b""
+
+    def _negotiate(self, data: bytes) -> bytes:
+        """Убирает из потока команды Telnet и отвечает на запросы опций"""
+        data, self._iac_tail = self._iac_tail + data, b""
+        out, replies = bytearray(), bytearray()
+        i = 0
+        while i < len(data):
+            if data[i] != IAC:
+                out.append(data[i])
+                i += 1
+                continue
+            if i + 1 >= len(data):
+                self._iac_tail = data[i:]
+                break
+            command = data[i + 1]
+            if command == IAC:
+                out.append(IAC)
+                i += 2
+            elif command in (DO, DONT, WILL, WONT):
+                if i + 2 >= len(data):
+                    self._iac_tail = data[i:]
+                    break
+                option = data[i + 2]
+                if command == DO:
+                    replies += bytes((IAC, WONT, option))
+                elif command == WILL:
+                    replies += bytes((IAC, DO if option in (OPT_ECHO, OPT_SGA) else DONT, option))
+                i += 3
+            elif command == SB:
+                end = data.find(bytes((IAC, SE)), i + 2)
+                if end < 0:
+                    self._iac_tail = data[i:]
+                    break
+                i = end + 2
+            else:
+                i += 2
+        if replies:
+            self.sock.sendall(bytes(replies))
+        return bytes(out)
+
+    def expect(self, patterns: Sequence[Pattern]) -> Tuple[int, str]:
+        """Читает до совпадения одного из шаблонов в конце вывода: (номер шаблона, вывод)"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            for index, pattern in enumerate(patterns):
+                if pattern.search(self._buffer):
+                    output, self._buffer = self._buffer, b""
+                    return index, output.decode("utf-8", errors="replace")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise SwitchConnectionError(f"{self.host.name}: нет ответа, получено {self._buffer[-200:]!r}")
+            self.sock.settimeout(remaining)
+            try:
+                data = self.sock.recv(4096)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                raise SwitchConnectionError(f"{self.host.name}: {e}") from e
+            if not data:
+                raise SwitchConnectionError(f"{self.host.name}: соединение закрыто")
+            self._buffer += self._negotiate(data)
+
+    def send(self, line: str) -> None:
+        try:
+            self.sock.sendall(line.encode("utf-8") + b"\r\n")
+        except OSError as e:
+            raise SwitchConnectionError(f"{self.host.name}: {e}") from e
+        self.last_used = time.monotonic()
+
+    def login(self) -> None:
+        """Вход и переход в привилегированный режим"""
+        for _ in range(6):
+            index, output = self.expect((LOGIN_RE, PASSWORD_RE, PROMPT_RE))
+            if index == 0:
+                self.send(self.host.username)
+            elif index == 1:
+                self.send(self.host.password)
+            elif output.rstrip().endswith(">"):
+                self.send("enable")
+                index, _ = self.expect((PASSWORD_RE, PROMPT_RE))
+                if index == 0:
+                    self.send(self.host.enable_password)
+                    self.expect((PROMPT_RE,))
+                break
+            else:
+                break
+        else:
+            raise SwitchError(f"{self.host.name}: не удалось войти")
+        self.command("terminal length 0")
+
+    def command(self, line: str) -> str:
+        """Выполняет команду и ждёт приглашения; ответ IOS с ошибкой - исключение"""
+        self.send(line)
+        _, output = self.expect((PROMPT_RE, LOGIN_RE, PASSWORD_RE))
+        error = ERROR_RE.search(output)
+        if error:
+            raise SwitchError(f"{self.host.name}: «{line}»: {error.group(0).strip()}")
+        return output
+
+    def configure(self, tasks: List[dict]) -> str:
+        """Применяет задания ios_config (parents + lines) в режиме конфигурации"""
+        transcript = [self.command("configure terminal")]
+        try:
+            for task in tasks:
+                config = task["ios_config"]
+                parents = config.get("parents")
+                if parents:
+                    transcript.append(self.command(parents))
+                for line in config.get("lines", []):
+                    transcript.append(self.command(line))
+                if parents:
+                    transcript.append(self.command("exit"))
+        finally:
+            transcript.append(self.command("end"))
+        return "".join(transcript)
+
+    def close(self) -> None:
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class SessionPool:
+    """
+    Долгоживущие сессии коммутаторов: одна на коммутатор, команды в неё
+    идут последовательно. Сессия, простаивавшая дольше idle, открывается заново.
+    """
+
+    def __init__(self, timeout: float = SWITCH_TIMEOUT, idle: float = SESSION_IDLE):
+        self.timeout = timeout
+        self.idle = idle
+        self._sessions: Dict[str, Optional[TelnetSession]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _host_lock(self, host: SwitchHost) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(host.name, threading.Lock())
+
+    def _open(self, host: SwitchHost) -> TelnetSession:
+        try:
+            session = TelnetSession(host, self.timeout)
+        except OSError as e:
+            raise SwitchUnavailableError(f"{host.name}: {e}") from e
+        try:
+            session.login()
+        except Exception:
+            session.close()
+            raise
+        return session
+
+    def configure(self, host: SwitchHost, tasks: List[dict]) -> str:
+        """
+        Применяет задания на коммутаторе. Если сохранённая сессия оборвалась,
+        открывает новую и повторяет: строки ios_config идемпотентны.
+        """
+        with self._host_lock(host):
+            session = self._sessions.pop(host.name, None)
+            if session is not None and time.monotonic() - session.last_used > self.idle:
+                session.close()
+                session = None
+            if session is not None:
+                try:
+                    return self._configure(host, session, tasks)
+                except SwitchConnectionError:
+                    pass
+            return self._configure(host, self._open(host), tasks)
+
+    def _configure(self, host: SwitchHost, session: TelnetSession, tasks: List[dict]) -> str:
+        try:
+            output = session.configure(tasks)
+        except SwitchConnectionError:
+            session.close()
+            raise
+        except SwitchError:
+            # Ошибка команды: сессия исправна и остаётся в пуле
+            self._sessions[host.name] = session
+            raise
+        self._sessions[host.name] = session
+        return output
+
+    def close(self) -> None:
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            if session is not None:
+                session.close()
+
+
+class NativeBackend:
+    """Применение плея напрямую через Telnet-сессии коммутаторов группы"""
+    name = "native"
+
+    def __init__(self, inventory_path: str = "inventory.ini", pool: Optional[SessionPool] = None):
+        self.inventory_path = inventory_path
+        self.pool = pool if pool is not None else SessionPool()
+        self._inventory: Optional[Dict[str, List[SwitchHost]]] = None
+
+    def hosts(self, group_name: str) -> List[SwitchHost]:
+        if self._inventory is None:
+            try:
+                self._inventory = load_inventory(self.inventory_path)
+            except OSError as e:
+                raise SwitchUnavailableError(f"inventory {self.inventory_path}: {e}") from e
+        hosts = self._inventory.get(group_name)
+        if not hosts:
+            raise SwitchUnavailableError(f"{group_name}: нет коммутаторов с native_transport=telnet")
+        return hosts
+
+    def apply(self, group_name: str, play: dict) -> Dict[str, Union[bool, str]]:
+        stdout = []
+        for host in self.hosts(group_name):
+            try:
+                stdout.append(self.pool.configure(host, play['tasks']))
+            except SwitchUnavailableError:
+                raise
+            except (OSError, SwitchError) as e:
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "stdout": "".join(stdout),
+                    "stderr": "",
+                    "backend": self.name,
+                }
+        return {"success": True, "stdout": "".join(stdout), "stderr": "", "backend": self.name}
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class FallbackBackend:
+    """Основной backend, при его ошибке - запасной (строки ios_config идемпотентны)"""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+
+    def apply(self, group_name: str, play: dict) -> Dict[str, Union[bool, str]]:
+        try:
+            result = self.primary.apply(group_name, play)
+        except SwitchUnavailableError as e:
+            result = {"success": False, "error": str(e)}
+        if result["success"]:
+            return result
+        print(f"{self.primary.name}: {group_name}: {result.get('error')}, применяется через {self.fallback.name}")
+        return self.fallback.apply(group_name, play)
+
+    def close(self) -> None:
+        self.primary.close()
+        self.fallback.close()
+
+
+def create_backend(name: str = SWITCH_BACKEND, inventory_path: str = "inventory.ini", verbose: bool = True):
+    """Backend исполнителя плеев по имени (переменная окружения SWITCH_BACKEND)"""
+    ansible = AnsibleBackend(inventory_path, verbose)
+    if name == "ansible":
+        return ansible
+    if name == "native":
+        return FallbackBackend(NativeBackend(inventory_path), ansible)
+    raise ValueError(f"Неизвестный SWITCH_BACKEND: {name}")
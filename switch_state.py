@@ -0,0 +1,197 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from sqlite3 import Connection
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Режимы порта коммутатора по типу соединения лабораторной работы
+MODE_ACCESS = 'access'
+MODE_TUNNEL = 'dot1q-tunnel'
+CONNECTION_MODES = {"default": MODE_ACCESS, "trunk": MODE_TUNNEL}
+ENCAPSULATION = 'dot1q'
+
+# Порт: (группа коммутаторов, интерфейс)
+PortKey = Tuple[str, str]
+
+
+@dataclass(frozen=True)
+class PortState:
+    """Конфигурация порта коммутатора, которой управляет сервис"""
+    mode: Optional[str]
+    vlan: Optional[int]
+    cdp: bool
+
+
+# Порт освобождён: режим и VLAN сняты, CDP включён
+DEFAULT_STATE = PortState(None, None, True)
+
+
+def target_state(connection: str, vlan: int) -> PortState:
+    """Желаемое состояние порта соединения лабораторной работы"""
+    return PortState(CONNECTION_MODES[connection], int(vlan), False)
+
+
+def diff_lines(current: Optional[PortState], target: PortState) -> List[str]:
+    """
+    Минимальный набор строк ios_config для перевода порта из current в target.
+    current=None - состояние порта неизвестно, отправляется полная конфигурация.
+    Порядок строк совпадает с прежними полными заданиями.
+    """
+    if current == target:
+        return []
+    mode_lines, vlan_lines, cdp_lines = [], [], []
+    if current is None or current.mode != target.mode:
+        if target.mode is not None:
+            mode_lines.append(f"switchport mode {target.mode}")
+        elif current is not None and current.mode is not None:
+            if current.mode == MODE_TUNNEL:
+                mode_lines.append(f"no switchport trunk encapsulation {ENCAPSULATION}")
+            mode_lines.append(f"no switchport mode {current.mode}")
+    if current is None or current.vlan != target.vlan:
+        if target.vlan is not None:
+            vlan_lines.append(f"switchport access vlan {target.vlan}")
+        elif current is not None and current.vlan is not None:
+            vlan_lines.append(f"no switchport access vlan {current.vlan}")
+    if current is None or current.cdp != target.cdp:
+        cdp_lines.append("cdp enable" if target.cdp else "no cdp enable")
+    # Для dot1q-tunnel VLAN задаётся до смены режима, для access - после
+    previous_mode = current.mode if current is not None else None
+    if MODE_TUNNEL in (target.mode, previous_mode if target.mode is None else None):
+        return vlan_lines + mode_lines + cdp_lines
+    return mode_lines + vlan_lines + cdp_lines
+
+
+def load_states(db: Connection, ports: Iterable[PortKey]) -> Dict[PortKey, Optional[PortState]]:
+    """
+    Последние отправленные на коммутаторы состояния портов (неизвестные порты отсутствуют).
+    Для портов, отправка на которые ещё не подтверждена, состояние None.
+    """
+    by_group: Dict[str, List[str]] = {}
+    for audience, switchport in ports:
+        by_group.setdefault(audience, []).append(switchport)
+    states = {}
+    for audience, switchports in by_group.items():
+        placeholders = ", ".join("?" * len(switchports))
+        for switchport, mode, vlan, cdp, confirmed in db.execute(
+                "SELECT switchport, mode, vlan, cdp, confirmed FROM switchport_state "
+                f"WHERE audience = ? AND switchport IN ({placeholders})", (audience, *switchports)):
+            states[(audience, switchport)] = PortState(mode, vlan, bool(cdp)) if confirmed else None
+    return states
+
+
+def save_states(db: Connection, states: Dict[PortKey, PortState], confirmed: bool = True) -> None:
+    """Запоминает состояния портов (без commit); confirmed=False - отправка ещё не подтверждена"""
+    now = time.time()
+    db.executemany("""
+        INSERT INTO switchport_state (audience, switchport, mode, vlan, cdp, confirmed, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (audience, switchport) DO UPDATE SET
+            mode = excluded.mode, vlan = excluded.vlan, cdp = excluded.cdp,
+            confirmed = excluded.confirmed, updated_at = excluded.updated_at
+    """, [(audience, switchport, state.mode, state.vlan, int(state.cdp), int(confirmed), now)
+          for (audience, switchport), state in states.items()])
+    return None
+
+
+def confirm_states(db: Connection, states: Dict[PortKey, PortState]) -> None:
+    """
+    Подтверждает отправленные на коммутаторы состояния портов (без commit).
+    Порты, которые после этой отправки уже запланированы другим запуском, не меняются.
+    """
+    db.executemany("""
+        UPDATE switchport_state SET confirmed = 1, updated_at = ?
+        WHERE audience = ? AND switchport = ? AND confirmed = 0 AND mode IS ? AND vlan IS ? AND cdp = ?
+    """, [(time.time(), audience, switchport, state.mode, state.vlan, int(state.cdp))
+          for (audience, switchport), state in states.items()])
+    return None
+
+
+def forget_states(db: Connection, states: Dict[PortKey, PortState]) -> None:
+    """
+    Забывает неподтверждённые состояния портов (ошибка playbook или отправка отключена):
+    при следующей настройке на них уйдёт полная конфигурация. Без commit.
+    Порты, которые после этой отправки уже запланированы другим запуском, не меняются.
+    """
+    db.executemany("""
+        DELETE FROM switchport_state
+        WHERE audience = ? AND switchport = ? AND confirmed = 0 AND mode IS ? AND vlan IS ? AND cdp = ?
+    """, [(audience, switchport, state.mode, state.vlan, int(state.cdp))
+          for (audience, switchport), state in states.items()])
+    return None
+
+
+def reconcile(db: Connection, targets: Dict[PortKey, PortState],
+              assumed: Optional[Dict[PortKey, PortState]] = None) -> Dict[PortKey, List[str]]:
+    """
+    Сравнивает желаемые состояния портов с последними подтверждёнными.
+    Возвращает строки конфигурации только для портов, которые действительно
+    меняются. assumed - состояние портов, которых нет в switchport_state
+    (иначе для них отправляется полная конфигурация); на порты с
+    неподтверждённой отправкой тоже уходит полная конфигурация.
+    Желаемые состояния меняющихся портов запоминаются как неподтверждённые
+    в транзакции вызывающего кода; после отправки на коммутаторы их
+    подтверждает confirm_states или снимает forget_states.
+    """
+    current = load_states(db, targets)
+    changes = {}
+    for key, target in targets.items():
+        lines = diff_lines(current[key] if key in current else (assumed or {}).get(key), target)
+        if lines:
+            changes[key] = lines
+    save_states(db, {key: targets[key] for key in changes}, confirmed=False)
+    return changes
+
+
+class PortPush:
+    """Отправка конфигурации на порты коммутаторов в очереди PortPushQueue"""
+
+    def __init__(self, queue: "PortPushQueue"):
+        self._queue = queue
+        self._done = threading.Event()
+        self._after: Set[threading.Event] = set()
+        self.ports: Set[PortKey] = set()
+
+    def add(self, ports: Iterable[PortKey]) -> None:
+        """Добавляет порты в отправку; вызывается в транзакции, которая их планирует"""
+        self._queue._enqueue(self, ports)
+
+    def wait(self) -> None:
+        """Ждёт завершения отправок на те же порты, запланированных раньше"""
+        for event in self._after:
+            event.wait()
+
+
+class PortPushQueue:
+    """
+    Очерёдность отправки конфигурации на порты коммутаторов.
+    Порядок задаётся транзакциями резервирования и освобождения (PortPush.add
+    вызывается внутри них): строки отправки на порт рассчитаны относительно
+    предыдущей запланированной отправки и не должны её обогнать.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last: Dict[PortKey, threading.Event] = {}
+
+    @contextmanager
+    def sequence(self) -> Iterator[PortPush]:
+        """Отправка на время блока with; по выходу следующие отправки на её порты продолжаются"""
+        push = PortPush(self)
+        try:
+            yield push
+        finally:
+            push._done.set()
+            with self._lock:
+                for port in push.ports:
+                    if self._last.get(port) is push._done:
+                        del self._last[port]
+
+    def _enqueue(self, push: PortPush, ports: Iterable[PortKey]) -> None:
+        with self._lock:
+            for port in ports:
+                previous = self._last.get(port)
+                if previous is not None and previous is not push._done:
+                    push._after.add(previous)
+                self._last[port] = push._done
+                push.ports.add(port)
@@ -0,0 +1,39 @@
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Настройки читаются при импорте модулей сервиса: генерация в потоке теста, без Ansible
+os.environ["RENDER_WORKERS"] = "0"
+os.environ["ANSIBLE_DISABLE"] = "true"
+
+
+@pytest.fixture(scope="session")
+def workdir(tmp_path_factory):
+    """Каталог сервиса: каталог лабораторных работ и шаблон лабораторной работы 1"""
+    path = tmp_path_factory.mktemp("rlk2")
+    shutil.copy(ROOT / "labs_config.yaml", path)
+    (path / "templates").mkdir()
+    shutil.copy(ROOT / "templates" / "Lab_2_2.html", path / "templates" / "1.html")
+    return path
+
+
+@pytest.fixture
+def service(workdir, monkeypatch):
+    """Модуль main с новой базой данных test.db"""
+    monkeypatch.chdir(workdir)
+    import bd
+    import main
+
+    main.db_pool.close()
+    for suffix in ("-wal", "-shm"):
+        Path(f"test.db{suffix}").unlink(missing_ok=True)
+    bd.create_and_populate_database("test.db")
+    main.dashboard.invalidate()
+    yield main
+    main.db_pool.close()
@@ -0,0 +1,29 @@
+def active_devices(conn):
+    return dict(conn.execute(
+        "SELECT groups_id, COUNT(*) FROM components WHERE status = 'Active' GROUP BY groups_id"))
+
+
+def test_bulk_skips_groups_with_running_lab(service):
+    assert service.run_lab(1, "G1")
+    with service.db_pool.checkout() as conn:
+        launched = service.unl_file_info(conn, "G1")
+
+    manifest = service.run_labs_bulk(1, ["G1", "G2"])
+
+    assert [(group["group_id"], group["status"]) for group in manifest["groups"]] == [
+        ("G1", "exists"), ("G2", "success")]
+    with service.db_pool.checkout() as conn:
+        assert service.unl_file_info(conn, "G1").hash == launched.hash
+        assert service.unl_file_info(conn, "G2") is not None
+        assert active_devices(conn) == {"G1": 4, "G2": 4}
+
+
+def test_bulk_relaunch_after_clear(service):
+    service.run_labs_bulk(1, ["G1"])
+    service.clear_bd("G1")
+
+    manifest = service.run_labs_bulk(1, ["G1"])
+
+    assert manifest["groups"][0]["status"] == "success"
+    with service.db_pool.checkout() as conn:
+        assert active_devices(conn) == {"G1": 4}
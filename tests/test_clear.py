@@ -0,0 +1,41 @@
+import sqlite3
+
+
+def group_rows(conn, group_id):
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE groups_id = ?", (group_id,)).fetchone()[0]
+            for table in ("components", "vlan_config", "artifact_refs", "unl_inputs")}
+
+
+def test_clear_releases_group_in_one_transaction(service, monkeypatch):
+    assert service.run_lab(1, "G1")
+    commits = []
+    pushed = []
+    run_playbook = service.run_playbook
+
+    def traced_run_playbook(plays, port_states=None, push=None):
+        with service.db_pool.checkout() as other:
+            pushed.append((len(commits), group_rows(other, "G1")))
+        return run_playbook(plays, port_states, push)
+
+    monkeypatch.setattr(service, "run_playbook", traced_run_playbook)
+    with service.db_pool.checkout() as conn:
+        assert all(group_rows(conn, "G1").values())
+        conn.set_trace_callback(lambda statement: commits.append(statement) if statement == "COMMIT" else None)
+        assert service.clear_bd("G1")
+        conn.set_trace_callback(None)
+        assert not any(group_rows(conn, "G1").values())
+    # Коммутаторы перенастраиваются после единственного commit освобождения
+    assert pushed == [(1, {"components": 0, "vlan_config": 0, "artifact_refs": 0, "unl_inputs": 0})]
+    assert service.run_lab(1, "G2")
+
+
+def test_clear_failure_keeps_group(service, monkeypatch):
+    assert service.run_lab(1, "G1")
+
+    def broken_save(pool):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(service.VlanPool, "save", broken_save)
+    assert service.clear_bd("G1") is False
+    with service.db_pool.checkout() as conn:
+        assert all(group_rows(conn, "G1").values())
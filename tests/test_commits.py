@@ -0,0 +1,27 @@
+def successful_push(plays):
+    return {group_name: {"success": True, "stdout": "", "backend": "test", "batch_size": 1}
+            for group_name in plays}
+
+
+def count_commits(service, action):
+    commits = []
+    # Соединение потока выдаётся и вложенным checkout: все запросы action идут через него
+    with service.db_pool.checkout() as conn:
+        conn.set_trace_callback(lambda statement: commits.append(statement) if statement == "COMMIT" else None)
+        try:
+            assert action()
+        finally:
+            conn.set_trace_callback(None)
+    return len(commits)
+
+
+def test_commits_per_launch_and_clear(service, monkeypatch):
+    monkeypatch.setenv("ANSIBLE_DISABLE", "false")
+    monkeypatch.setattr(service.playbook_executor, "run", successful_push)
+
+    # Резервирование вместе с VLAN, подтверждение состояния портов, сохранение UNL
+    assert count_commits(service, lambda: service.run_lab(1, "G1")) == 3
+    with service.db_pool.checkout() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM vlan_config WHERE groups_id = 'G1'").fetchone()[0] == 4
+    # Освобождение одной транзакцией и подтверждение состояния портов
+    assert count_commits(service, lambda: service.clear_bd("G1")) == 2
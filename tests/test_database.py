@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+from database import ConnectionPool, PoolTimeoutError
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_connections=2, timeout=0.1)
+    yield pool
+    pool.close()
+
+
+def test_connection_is_reused_between_checkouts(pool):
+    with pool.checkout() as first:
+        with pool.checkout() as nested:
+            assert nested is first
+    with pool.unit_of_work() as conn:
+        assert conn is first
+
+
+def test_checkout_waits_for_free_connection(pool):
+    held = [pool.acquire(), pool.acquire()]
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    pool.release(held.pop())
+    assert pool.acquire() is not None
+
+
+def test_connection_used_by_other_thread(pool):
+    with pool.checkout() as conn:
+        pass
+    result = []
+
+    def work():
+        with pool.checkout() as other:
+            result.append((other, other.execute("SELECT COUNT(*) FROM components").fetchone()[0]))
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+    assert result == [(conn, 0)]
+
+
+def test_returned_connection_is_rolled_back(pool):
+    with pool.checkout() as conn:
+        conn.execute("INSERT INTO jobs (id, kind, payload, status, created_at) VALUES ('1', 'k', '{}', 'pending', 0)")
+        assert conn.in_transaction
+    assert not conn.in_transaction
+    with pool.checkout() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 0
+
+
+def test_connections_checked_out_before_close_are_closed_on_return(pool):
+    conn = pool.acquire()
+    pool.close()
+    pool.release(conn)
+    with pool.checkout() as fresh:
+        assert fresh is not conn
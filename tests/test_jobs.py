@@ -0,0 +1,63 @@
+import sqlite3
+import time
+
+import pytest
+
+
+def active_devices(conn):
+    return dict(conn.execute(
+        "SELECT groups_id, COUNT(*) FROM components WHERE status = 'Active' GROUP BY groups_id"))
+
+
+def wait_jobs(service, job_ids, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        jobs = [service.job_queue.get(job_id) for job_id in job_ids]
+        if all(job["status"] in ("done", "failed") for job in jobs):
+            return jobs
+        time.sleep(0.02)
+    raise AssertionError("Задания не завершились")
+
+
+def test_clear_job_fails_when_database_is_not_cleared(service, monkeypatch):
+    assert service.run_lab(1, "G1")
+
+    def broken_save(pool):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(service.VlanPool, "save", broken_save)
+    [job] = wait_jobs(service, [service.job_queue.submit("clear_db", {"group_id": "G1"})])
+
+    assert job["status"] == "failed"
+    with service.db_pool.checkout() as conn:
+        assert active_devices(conn) == {"G1": 4}
+
+
+def test_repeated_run_lab_job_returns_existing_lab(service):
+    first = service.job_run_lab({"lab_number": 1, "group_id": "G1"}, lambda stage: None)
+    second = service.job_run_lab({"lab_number": 1, "group_id": "G1"}, lambda stage: None)
+
+    assert second == {**first, "existing": True}
+    with service.db_pool.checkout() as conn:
+        assert active_devices(conn) == {"G1": 4}
+
+
+def test_queued_run_lab_jobs_reserve_group_once(service):
+    payload = {"lab_number": 1, "group_id": "G1"}
+    jobs = wait_jobs(service, [service.job_queue.submit("run_lab", payload) for _ in range(3)])
+
+    assert "done" in {job["status"] for job in jobs}
+    with service.db_pool.checkout() as conn:
+        assert active_devices(conn) == {"G1": 4}
+
+
+def test_reservation_rechecks_group_in_transaction(service):
+    assert service.run_lab(1, "G1")
+    lab = service.lab_catalog.get(1)
+    lab_config = lab.instantiate()
+
+    # Проверка до резервирования пройдена раньше, чем первый запуск занял устройства
+    with pytest.raises(service.GroupLaunchedError):
+        service.planner(lab_config["devices"], lab_config["topology"], lab.topology, "G1")
+    with service.db_pool.checkout() as conn:
+        assert active_devices(conn) == {"G1": 4}
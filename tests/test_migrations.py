@@ -0,0 +1,38 @@
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import migrations
+from migrations import MIGRATIONS, hot_query_scans, migrate, schema_version
+
+
+def test_duplicate_switchports_are_reported(tmp_path, capsys):
+    db = sqlite3.connect(tmp_path / "old.db")
+    for statement in MIGRATIONS[0][2]:
+        db.execute(statement)
+    db.execute("PRAGMA user_version = 1")
+    db.executemany("INSERT INTO vlan_config (vlan, switchport, groups_id, audience, connection) VALUES (?, ?, ?, ?, ?)",
+                   [(10, "f0/1", "1", 344, "default"), (20, "f0/1", "2", 344, "default"),
+                    (30, "f0/2", "2", 344, "default")])
+    db.commit()
+
+    migrate(db)
+
+    assert schema_version(db) == MIGRATIONS[-1][0]
+    assert db.execute("SELECT vlan FROM vlan_config ORDER BY vlan").fetchall() == [(20,), (30,)]
+    output = capsys.readouterr().out
+    assert "Удалено 1 повторяющихся записей vlan_config" in output
+    assert "344 f0/1: VLAN 10, группа 1" in output
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    db = sqlite3.connect(tmp_path / "new.db")
+    migrate(db)
+    assert hot_query_scans(db) == []
+
+
+def test_migrations_do_not_import_template_parser():
+    # Миграции выполняются при старте и в bd.py: разбор шаблонов им не нужен
+    check = "import sys, migrations; sys.exit('pnetLabParser' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", check], cwd=Path(migrations.__file__).parent).returncode == 0
@@ -0,0 +1,16 @@
+import pytest
+
+import parser_check
+from pnetLabParser import available_parsers
+
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_backend_matches_golden_output(parser, capsys):
+    if parser not in available_parsers():
+        pytest.skip(f"бэкенд {parser} не установлен")
+
+    failed = parser_check.check((parser,))
+
+    output = capsys.readouterr().out
+    assert failed == 0, output
+    assert f"Бэкенды: {parser}; расхождений: 0" in output
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from database import ConnectionPool
+from prewarm import WarmPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "warm.db"))
+    yield pool
+    pool.close()
+
+
+def add_slot(pool, groups_id, status, expires_at):
+    with pool.unit_of_work() as conn:
+        conn.execute("""
+            INSERT INTO warm_slots (groups_id, period, lab, vendor, manual_url, status, created_at, expires_at)
+            VALUES (?, 'p', '1', 'Any', '', ?, 0, ?)
+        """, (groups_id, status, expires_at))
+
+
+def slot_statuses(pool):
+    with pool.checkout() as conn:
+        return dict(conn.execute("SELECT groups_id, status FROM warm_slots"))
+
+
+class FlakyRelease:
+    """Освобождение, которое сначала не удаётся (False или исключение)"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def __call__(self, slot):
+        self.calls.append(slot)
+        outcome = self.outcomes.pop(0) if self.outcomes else True
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.mark.parametrize("failure", [False, RuntimeError("database is locked")])
+def test_failed_release_keeps_slot_for_retry(pool, failure):
+    release = FlakyRelease(failure)
+    warm_pool = WarmPool(pool, launch=None, release=release)
+    add_slot(pool, "warm-1", "ready", expires_at=time.time() - 1)
+
+    assert warm_pool.expire(time.time()) == 1
+    assert slot_statuses(pool) == {"warm-1": "releasing"}
+
+    assert warm_pool.expire(time.time()) == 1
+    assert slot_statuses(pool) == {}
+    assert release.calls == ["warm-1", "warm-1"]
+
+
+def test_failed_release_on_recover_keeps_slot(pool):
+    warm_pool = WarmPool(pool, launch=None, release=FlakyRelease(False))
+    add_slot(pool, "warm-1", "warming", expires_at=time.time() + 60)
+
+    assert warm_pool.recover() == 1
+    assert slot_statuses(pool) == {"warm-1": "releasing"}
+
+
+def test_expire_without_expired_slots_does_not_write(pool):
+    warm_pool = WarmPool(pool, launch=None, release=FlakyRelease())
+    add_slot(pool, "warm-1", "ready", expires_at=time.time() + 60)
+    add_slot(pool, "warm-2", "claimed", expires_at=time.time() + 60)
+    statements = []
+    with pool.checkout() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            assert warm_pool.expire(time.time()) == 0
+        finally:
+            conn.set_trace_callback(None)
+    assert not any(statement.startswith(("BEGIN", "UPDATE", "DELETE")) for statement in statements)
+    assert slot_statuses(pool) == {"warm-1": "ready", "warm-2": "claimed"}
@@ -0,0 +1,34 @@
+import pytest
+
+from render_service import RenderQueueFullError
+
+
+def group_rows(conn, group_id):
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE groups_id = ?", (group_id,)).fetchone()[0]
+            for table in ("components", "vlan_config", "artifact_refs")}
+
+
+@pytest.mark.parametrize("error", [TimeoutError, RenderQueueFullError])
+def test_failed_render_releases_reservation(service, monkeypatch, error):
+    def failed_render(spec):
+        raise error()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(service.render_service, "render", failed_render)
+        with pytest.raises(error):
+            service.run_lab(1, "G1")
+    with service.db_pool.checkout() as conn:
+        assert group_rows(conn, "G1") == {"components": 0, "vlan_config": 0, "artifact_refs": 0}
+    assert service.run_lab(1, "G1")
+
+
+def test_failed_bulk_render_releases_reservations(service, monkeypatch):
+    def failed_render_many(specs):
+        raise TimeoutError()
+
+    monkeypatch.setattr(service.render_service, "render_many", failed_render_many)
+    with pytest.raises(TimeoutError):
+        service.run_labs_bulk(1, ["G1", "G2"])
+    with service.db_pool.checkout() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM components WHERE status = 'Active'").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM vlan_config").fetchone()[0] == 0
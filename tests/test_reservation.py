@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from database import ConnectionPool
+from reservation import reserve_devices
+
+THREADS = 16
+RESERVATIONS_PER_THREAD = 20
+DEVICES_PER_TYPE = 100
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "stress.db"), max_connections=THREADS, timeout=30)
+    rows = []
+    for i in range(DEVICES_PER_TYPE):
+        rows.append((2 * i + 1, "Switch", 344, "Cisco", "Free", f"f1/0/{i}", f"f1/1/{i}", "10.0.0.1", "f0/1", "f0/2"))
+        rows.append((2 * i + 2, "PC", 123, None, "Free", str(100 + i), None, "10.0.0.2", None, None))
+    with pool.unit_of_work() as conn:
+        conn.executemany("""
+            INSERT INTO components (component_id, component_type, location, model, status,
+                                    port1, port2, ip, port1_user, port2_user)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+    yield pool
+    pool.close()
+
+
+def test_parallel_reservations_never_share_devices(pool):
+    results = {}
+    errors = []
+
+    def work(thread):
+        for number in range(RESERVATIONS_PER_THREAD):
+            group_id = f"G{thread}-{number}"
+            devices = [{"name": "PC1", "device_type": "PC"},
+                       {"name": "Switch1", "device_type": "Switch", "vendor": ("Any", "Cisco")[number % 2]}]
+            try:
+                with pool.checkout() as conn:
+                    results[group_id] = reserve_devices(conn, devices, group_id)
+            except Exception as e:
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=work, args=(thread,)) for thread in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(results) == THREADS * RESERVATIONS_PER_THREAD
+    reserved = {group_id: result for group_id, result in results.items() if result}
+    # Устройств хватает ровно на DEVICES_PER_TYPE групп, остальным честно отказано
+    assert len(reserved) == DEVICES_PER_TYPE
+    assert all(result.error is None and result.missing for result in results.values() if not result)
+    claimed = [component["component_id"] for result in reserved.values() for component in result.components]
+    assert len(claimed) == len(set(claimed)) == 2 * DEVICES_PER_TYPE
+    with pool.checkout() as conn:
+        owners = dict(conn.execute("SELECT component_id, groups_id FROM components WHERE status = 'Active'"))
+    assert owners == {component["component_id"]: group_id
+                      for group_id, result in reserved.items() for component in result.components}
@@ -0,0 +1,8 @@
+from startup_budget import STARTUP_BUDGET_MS, measure_startup
+
+
+def test_main_import_within_startup_budget():
+    elapsed, _, heavy = measure_startup("main")
+    # Графический стек и разбор HTML не должны попадать на путь старта API
+    assert heavy == []
+    assert elapsed <= STARTUP_BUDGET_MS
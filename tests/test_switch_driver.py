@@ -0,0 +1,114 @@
+import socket
+
+import pytest
+
+from fake_switch import FakeSwitch
+from switch_driver import FallbackBackend, NativeBackend, SessionPool
+
+
+class RecordingBackend:
+    """Запасной backend: запоминает плеи и сообщает об успехе"""
+    name = "ansible"
+
+    def __init__(self):
+        self.plays = []
+
+    def apply(self, group_name, play):
+        self.plays.append((group_name, play))
+        return {"success": True, "stdout": "", "stderr": "", "backend": self.name}
+
+    def close(self):
+        return None
+
+
+def port_play(port, lines):
+    return {"hosts": "KK-344", "gather_facts": "no",
+            "tasks": [{"name": f"Настройка порта {port}", "ios_config": {"parents": f"interface {port}", "lines": lines}}]}
+
+
+def write_inventory(path, port, password="admin"):
+    path.write_text(f"[KK-344]\nsw344 ansible_host=127.0.0.1 native_port={port} ansible_user=admin "
+                    f"ansible_password={password}\n\n[KK-344:vars]\nnative_transport=telnet\n", encoding="utf-8")
+    return str(path)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def switch():
+    switch = FakeSwitch("KK-344").start()
+    yield switch
+    switch.stop()
+
+
+@pytest.fixture
+def backend(switch, tmp_path):
+    backend = NativeBackend(write_inventory(tmp_path / "inventory.ini", switch.address[1]), SessionPool(timeout=2))
+    yield backend
+    backend.close()
+
+
+def test_native_backend_applies_interface_config(switch, backend):
+    result = backend.apply("KK-344", port_play("f1/0/1", ["switchport mode access", "switchport access vlan 10",
+                                                          "no cdp enable"]))
+    assert result["success"] and result["backend"] == "native"
+    assert switch.interfaces == {"f1/0/1": {"switchport mode": "access", "switchport access vlan": "10",
+                                            "cdp enable": False}}
+
+    assert backend.apply("KK-344", port_play("f1/0/1", ["no switchport access vlan 10", "cdp enable"]))["success"]
+    assert switch.interfaces["f1/0/1"] == {"switchport mode": "access", "cdp enable": True}
+
+
+def test_session_is_reused_between_plays(switch, backend):
+    for vlan in (10, 20, 30):
+        assert backend.apply("KK-344", port_play("f1/0/2", [f"switchport access vlan {vlan}"]))["success"]
+    assert switch.connections == 1
+    assert switch.interfaces["f1/0/2"] == {"switchport access vlan": "30"}
+
+
+def test_idle_session_is_reopened(switch, tmp_path):
+    backend = NativeBackend(write_inventory(tmp_path / "inventory.ini", switch.address[1]),
+                            SessionPool(timeout=2, idle=0))
+    try:
+        for vlan in (10, 20):
+            assert backend.apply("KK-344", port_play("f1/0/2", [f"switchport access vlan {vlan}"]))["success"]
+    finally:
+        backend.close()
+    assert switch.connections == 2
+
+
+def test_invalid_input_fails_play_and_keeps_session(switch, backend):
+    result = backend.apply("KK-344", port_play("f1/0/3", ["switchport access vlan 10", "switchport nonsense"]))
+    assert not result["success"]
+    assert "% Invalid input" in result["error"] and "switchport nonsense" in result["error"]
+
+    assert backend.apply("KK-344", port_play("f1/0/3", ["switchport access vlan 20"]))["success"]
+    assert switch.connections == 1
+    assert switch.interfaces["f1/0/3"] == {"switchport access vlan": "20"}
+
+
+@pytest.mark.parametrize("failure", ["refused", "authentication", "not in inventory"])
+def test_fallback_when_switch_is_unreachable(switch, tmp_path, failure):
+    port, password, group_name = switch.address[1], "admin", "KK-344"
+    if failure == "refused":
+        port = free_port()
+    elif failure == "authentication":
+        password = "wrong"
+    else:
+        group_name = "KK-224"
+    fallback = RecordingBackend()
+    backend = FallbackBackend(NativeBackend(write_inventory(tmp_path / "inventory.ini", port, password),
+                                            SessionPool(timeout=2)), fallback)
+    play = port_play("f1/0/4", ["switchport access vlan 10"])
+    try:
+        result = backend.apply(group_name, play)
+    finally:
+        backend.close()
+
+    assert result["success"] and result["backend"] == "ansible"
+    assert fallback.plays == [(group_name, play)]
+    assert switch.interfaces == {}
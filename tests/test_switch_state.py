@@ -0,0 +1,105 @@
+import threading
+
+
+def port_states(service):
+    with service.db_pool.checkout() as conn:
+        return {(audience, switchport): (mode, vlan) for audience, switchport, mode, vlan in conn.execute(
+            "SELECT audience, switchport, mode, vlan FROM switchport_state WHERE confirmed = 1")}
+
+
+def group_ports(service, group_id):
+    with service.db_pool.checkout() as conn:
+        return {(audience, switchport): vlan for audience, switchport, vlan in conn.execute(
+            "SELECT audience, switchport, vlan FROM vlan_config WHERE groups_id = ?", (group_id,))}
+
+
+def pushed_lines(plays):
+    return {(group_name, task['ios_config']['parents'].removeprefix('interface ')): task['ios_config']['lines']
+            for group_name, play in plays.items() for task in play['tasks']}
+
+
+def failed_push(plays):
+    return {group_name: {"success": False, "error": "timeout", "stderr": ""} for group_name in plays}
+
+
+def successful_push(plays):
+    return {group_name: {"success": True, "stdout": "", "backend": "test", "batch_size": 1}
+            for group_name in plays}
+
+
+def test_states_not_saved_when_push_disabled(service):
+    assert service.run_lab(1, "G1")
+    assert group_ports(service, "G1")
+    assert port_states(service) == {}
+
+    service.clear_bd("G1")
+    assert port_states(service) == {}
+    with service.db_pool.checkout() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM switchport_state").fetchone() == (0,)
+
+
+def test_states_not_saved_when_push_fails(service, monkeypatch):
+    monkeypatch.setenv("ANSIBLE_DISABLE", "false")
+    monkeypatch.setattr(service.playbook_executor, "run", failed_push)
+
+    assert service.run_lab(1, "G1")
+    assert group_ports(service, "G1")
+    assert port_states(service) == {}
+
+
+def test_states_confirmed_after_push(service, monkeypatch):
+    monkeypatch.setenv("ANSIBLE_DISABLE", "false")
+    monkeypatch.setattr(service.playbook_executor, "run", successful_push)
+
+    assert service.run_lab(1, "G1")
+    ports = group_ports(service, "G1")
+    assert ports
+    assert {key: vlan for key, (_, vlan) in port_states(service).items()} == ports
+
+    assert service.clear_bd("G1")
+    assert set(port_states(service).values()) == {(None, None)}
+
+
+def test_launch_waits_for_teardown_of_same_ports(service, monkeypatch):
+    monkeypatch.setenv("ANSIBLE_DISABLE", "false")
+    monkeypatch.setattr(service.playbook_executor, "run", successful_push)
+    assert service.run_lab(1, "G1")
+    first_ports = group_ports(service, "G1")
+    with service.db_pool.unit_of_work() as conn:
+        # G2 получит устройства и порты G1
+        conn.execute("UPDATE components SET status = 'Maintenance' WHERE status = 'Free'")
+
+    pushes = []
+    teardown_started = threading.Event()
+    teardown_finish = threading.Event()
+
+    def slow_teardown_push(plays):
+        pushes.append(pushed_lines(plays))
+        if len(pushes) == 1:
+            teardown_started.set()
+            assert teardown_finish.wait(10)
+        return successful_push(plays)
+
+    monkeypatch.setattr(service.playbook_executor, "run", slow_teardown_push)
+    teardown = threading.Thread(target=service.clear_bd, args=("G1",))
+    teardown.start()
+    assert teardown_started.wait(10)
+    # Порты освобождены в базе, но снятие их конфигурации ещё не отправлено
+    launch = threading.Thread(target=service.run_lab, args=(1, "G2"))
+    launch.start()
+    launch.join(0.5)
+    assert launch.is_alive()
+    assert len(pushes) == 1
+
+    teardown_finish.set()
+    teardown.join(10)
+    launch.join(10)
+    second_ports = group_ports(service, "G2")
+    shared = first_ports.keys() & second_ports.keys()
+    assert shared
+    # Снятие G1 отправлено раньше, а G2 получает полную конфигурацию своих портов
+    assert len(pushes) == 2
+    for key in shared:
+        assert pushes[1][key][-1] == "no cdp enable"
+        assert f"switchport access vlan {second_ports[key]}" in pushes[1][key]
+    assert {key: vlan for key, (_, vlan) in port_states(service).items() if vlan is not None} == second_ports
@@ -0,0 +1,59 @@
+import sqlite3
+
+from unl_store import unl_file_save_or_update
+
+
+def download(client, group_id, **headers):
+    with client.get(f"/api/labs/{group_id}.unl", headers=headers) as response:
+        return response.status_code, response.headers.get("ETag"), response.get_data()
+
+
+def test_validators_follow_the_database(service):
+    assert service.run_lab(1, "G1")
+    client = service.app.test_client()
+    status, etag, body = download(client, "G1")
+    assert status == 200 and etag and body.startswith(b"<?xml")
+    assert download(client, "G1", **{"If-None-Match": etag})[0] == 304
+
+    # Файл заменён другим процессом сервиса: прежний ETag больше не подходит
+    other = sqlite3.connect("test.db")
+    unl_file_save_or_update(other, "G1", b"<lab />")
+    other.close()
+    assert download(client, "G1", **{"If-None-Match": etag})[0:3:2] == (200, b"<lab />")
+
+    service.clear_bd("G1")
+    assert download(client, "G1", **{"If-None-Match": etag})[0] == 404
+
+
+def test_connections_returned_after_download(service):
+    assert service.run_lab(1, "G1")
+    client = service.app.test_client()
+    etag = download(client, "G1")[1]
+    requests = [
+        ({}, 200), ({"Range": "bytes=0-9"}, 206), ({"If-None-Match": etag}, 304),
+        ({"Accept-Encoding": "gzip"}, 200), ({"Accept-Encoding": "gzip", "Range": "bytes=0-9"}, 206),
+    ]
+    for _ in range(service.db_pool.max_connections):
+        for headers, status in requests:
+            assert download(client, "G1", **headers)[0] == status
+        with client.head("/api/labs/G1.unl") as response:
+            assert response.status_code == 200
+    held = [service.db_pool.acquire() for _ in range(service.db_pool.max_connections)]
+    for conn in held:
+        service.db_pool.release(conn)
+
+
+def test_slow_downloads_do_not_hold_connections(service, monkeypatch):
+    assert service.run_lab(1, "G1")
+    client = service.app.test_client()
+    monkeypatch.setattr(service.db_pool, "timeout", 0.5)
+    # Клиенты ещё не дочитали ответы
+    responses = [client.get("/api/labs/G1.unl", headers=headers)
+                 for _ in range(service.db_pool.max_connections)
+                 for headers in ({}, {"Accept-Encoding": "gzip"})]
+    held = [service.db_pool.acquire() for _ in range(service.db_pool.max_connections)]
+    for conn in held:
+        service.db_pool.release(conn)
+    for response in responses:
+        assert response.status_code == 200
+        response.close()
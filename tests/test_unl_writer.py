@@ -0,0 +1,49 @@
+import base64
+import tracemalloc
+
+from pnetLabParser import clean_html_content, create_iframe_workbooks, create_lab_xml
+from unl_writer import write_unl
+
+NODES = 4000
+
+
+def topology_parts():
+    """Части HTML топологии, как их отдаёт CompiledTemplate.iter_parts (~1.5 МБ)"""
+    for i in range(NODES):
+        yield (f'<div id="node{i}" class="context-menu node node{i} node_frame" style="top:{i}px" '
+               f'data-name="N{i}"><i title="Telnet:10.0.0.1:{2000 + i}" class="node_icon nodehtmlconsole"></i>'
+               f'<div class="node_name">N{i}</div></div>')
+        yield (f'<div class="jtk-overlay node{i} node{i + 1}"><div class="node_interface" position="src">f0/1'
+               f'</div><div class="node_interface" position="dst">f0/2</div></div>')
+
+
+def peak_memory(action):
+    tracemalloc.start()
+    try:
+        action()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def full_string_unl():
+    html = clean_html_content(''.join(topology_parts()))
+    return create_lab_xml("MyLab", base64.b64encode(html.encode("utf-8")).decode("utf-8"),
+                          create_iframe_workbooks("http://example.com/manual"))
+
+
+def test_streaming_writer_keeps_memory_bounded(tmp_path):
+    template_size = sum(len(part.encode("utf-8")) for part in topology_parts())
+    workbook = create_iframe_workbooks("http://example.com/manual")
+
+    def streaming_unl():
+        with open(tmp_path / "lab.unl", "wb") as out:
+            write_unl(out, "MyLab", topology_parts(), workbook)
+
+    streaming = peak_memory(streaming_unl)
+    full = peak_memory(full_string_unl)
+
+    # Прежний путь держит несколько полных копий шаблона, потоковый - один кусок base64
+    assert full > 3 * template_size
+    assert streaming < template_size / 4
+    assert (tmp_path / "lab.unl").stat().st_size > template_size
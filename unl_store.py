@@ -1,42 +1,215 @@
-from sqlite3 import Connection
-from typing import Optional
-
-
-def unl_table_create(db: Connection) -> None:
-    """Создает таблицу, если она не существует"""
-    cursor = db.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS files (
-            groups_id TEXT PRIMARY KEY,
-            content BLOB NOT NULL
-        )
-    ''')
+import gzip
+import hashlib
+import json
+import time
+import zlib
+from dataclasses import dataclass
+from sqlite3 import Blob, Connection
+from typing import Dict, Iterable, Iterator, Optional
+
+from render_state import RenderState
+
+# Артефакты (UNL-файлы) хранятся один раз на содержимое: ключ - SHA-256
+# несжатых данных, тело - gzip. Группа ссылается на артефакт через artifact_refs,
+# одинаковые лабораторные работы разных групп занимают место один раз.
+ENCODING = 'gzip'
+COMPRESS_LEVEL = 6
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class UnlArtifact:
+    """Запись индекса: UNL-файл группы и его артефакт"""
+    groups_id: str
+    hash: str
+    rowid: int
+    size: int
+    stored_size: int
+    encoding: str
+    created_at: float
+    updated_at: float
+
+
+@dataclass
+class UnlInputs:
+    """
+    Входные данные генерации UNL-файла группы (telnet-ссылки и интерфейсы
+    из prepare_unl - в state) и состояние подстановки для повторной генерации
+    """
+    lab_name: str
+    manual_url: str
+    state: RenderState
+
+
+def _store(db: Connection, groups_id: str, content: bytes) -> str:
+    """Кладёт содержимое в хранилище и перевешивает ссылку группы (без commit)"""
+    digest = hashlib.sha256(content).hexdigest()
+    now = time.time()
+    exists = db.execute('SELECT 1 FROM artifacts WHERE hash = ?', (digest,)).fetchone()
+    if not exists:
+        compressed = gzip.compress(content, compresslevel=COMPRESS_LEVEL, mtime=0)
+        db.execute('''
+            INSERT INTO artifacts (hash, encoding, size, stored_size, created_at, content)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (digest, ENCODING, len(content), len(compressed), now, compressed))
+    previous = db.execute('SELECT hash FROM artifact_refs WHERE groups_id = ?', (groups_id,)).fetchone()
+    db.execute('''
+        INSERT INTO artifact_refs (groups_id, hash, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT (groups_id) DO UPDATE SET hash = excluded.hash, updated_at = excluded.updated_at
+    ''', (groups_id, digest, now))
+    if previous and previous[0] != digest:
+        _collect(db, previous[0])
+    return digest
+
+
+def _store_inputs(db: Connection, groups_id: str, inputs: Optional[UnlInputs]) -> None:
+    """Входные данные генерации файла группы; без них прежние удаляются (без commit)"""
+    if inputs is None:
+        db.execute('DELETE FROM unl_inputs WHERE groups_id = ?', (groups_id,))
+    else:
+        state = inputs.state
+        db.execute('''
+            INSERT OR REPLACE INTO unl_inputs (groups_id, template_path, lab_name, manual_url, telnet_links,
+                                               interface_mapping, guid, template_mtime_ns, slot_values, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (groups_id, state.template_path, inputs.lab_name, inputs.manual_url,
+              json.dumps(state.telnet_links, ensure_ascii=False),
+              json.dumps(state.interface_mapping, ensure_ascii=False),
+              state.guid, state.mtime_ns, json.dumps(state.values, ensure_ascii=False), time.time()))
+    return None
+
+
+def _collect(db: Connection, digest: str) -> None:
+    """Удаляет артефакт, на который больше никто не ссылается"""
+    db.execute('''
+        DELETE FROM artifacts
+        WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM artifact_refs WHERE hash = ?)
+    ''', (digest, digest))
+    return None
+
+
+def unl_files_migrate(db: Connection) -> None:
+    """Миграция: перенос UNL-файлов из старой таблицы files в хранилище артефактов"""
+    for groups_id, content in db.execute('SELECT groups_id, content FROM files').fetchall():
+        _store(db, groups_id, content)
+    db.execute('DROP TABLE files')
+    return None
+
+
+def unl_file_save_or_update(db: Connection, groups_id: str, content: bytes,
+                            inputs: Optional[UnlInputs] = None) -> None:
+    """Сохраняет или обновляет файл в базе данных (вместе с входными данными генерации)"""
+    _store(db, groups_id, content)
+    _store_inputs(db, groups_id, inputs)
     db.commit()
     return None
 
 
-def unl_file_save_or_update(db: Connection, groups_id: str, content: bytes) -> None:
-    """Сохраняет или обновляет файл в базе данных"""
-    cursor = db.cursor()
-    cursor.execute('''
-        INSERT OR REPLACE INTO files (groups_id, content)
-        VALUES (?, ?)
-    ''', (groups_id, content))
+def unl_files_save_or_update(db: Connection, files: Dict[str, bytes],
+                             inputs: Optional[Dict[str, UnlInputs]] = None) -> None:
+    """Сохраняет файлы нескольких групп {groups_id: содержимое} одним commit"""
+    for groups_id, content in files.items():
+        _store(db, groups_id, content)
+        _store_inputs(db, groups_id, (inputs or {}).get(groups_id))
     db.commit()
     return None
 
 
 def unl_file_delete(db: Connection, groups_id: str) -> None:
-    """Удаляет файл из базы данных по group_id"""
-    cursor = db.cursor()
-    cursor.execute('DELETE FROM files WHERE groups_id = ?', (groups_id,))
-    db.commit()
+    """Удаляет файл из базы данных по group_id. Без commit"""
+    row = db.execute('DELETE FROM artifact_refs WHERE groups_id = ? RETURNING hash', (groups_id,)).fetchone()
+    if row:
+        _collect(db, row[0])
+    db.execute('DELETE FROM unl_inputs WHERE groups_id = ?', (groups_id,))
     return None
 
 
+def unl_file_rebind(db: Connection, source_groups_id: str, target_groups_id: str) -> None:
+    """Передаёт файл группы source группе target (прежний файл target удаляется). Без commit"""
+    row = db.execute('DELETE FROM artifact_refs WHERE groups_id = ? RETURNING hash', (target_groups_id,)).fetchone()
+    db.execute('UPDATE artifact_refs SET groups_id = ?, updated_at = ? WHERE groups_id = ?',
+               (target_groups_id, time.time(), source_groups_id))
+    if row:
+        _collect(db, row[0])
+    db.execute('DELETE FROM unl_inputs WHERE groups_id = ?', (target_groups_id,))
+    db.execute('UPDATE unl_inputs SET groups_id = ? WHERE groups_id = ?', (target_groups_id, source_groups_id))
+    return None
+
+
+def unl_inputs_get(db: Connection, groups_id: str) -> Optional[UnlInputs]:
+    """Входные данные и состояние подстановки последней генерации UNL группы или None"""
+    row = db.execute('''
+        SELECT template_path, lab_name, manual_url, telnet_links, interface_mapping, guid,
+               template_mtime_ns, slot_values
+        FROM unl_inputs WHERE groups_id = ?
+    ''', (groups_id,)).fetchone()
+    if not row:
+        return None
+    template_path, lab_name, manual_url, telnet_links, interface_mapping, guid, mtime_ns, values = row
+    state = RenderState(template_path, mtime_ns, guid, json.loads(telnet_links), json.loads(interface_mapping),
+                        json.loads(values))
+    return UnlInputs(lab_name, manual_url, state)
+
+
+def unl_file_info(db: Connection, groups_id: str) -> Optional[UnlArtifact]:
+    """Запись индекса для файла группы или None"""
+    row = db.execute('''
+        SELECT r.groups_id, a.hash, a.rowid, a.size, a.stored_size, a.encoding, a.created_at, r.updated_at
+        FROM artifact_refs r JOIN artifacts a ON a.hash = r.hash
+        WHERE r.groups_id = ?
+    ''', (groups_id,)).fetchone()
+    return UnlArtifact(*row) if row else None
+
+
+def unl_file_open(db: Connection, artifact: UnlArtifact) -> Blob:
+    """Сжатое тело артефакта как файл (read/seek) без чтения в память"""
+    return db.blobopen('artifacts', 'content', artifact.rowid, readonly=True)
+
+
+def unl_file_read(db: Connection, artifact: UnlArtifact) -> bytes:
+    """Сжатое тело артефакта целиком (gzip UNL-файла занимает десятки КБ)"""
+    with unl_file_open(db, artifact) as blob:
+        return blob.read()
+
+
+def _blob_chunks(db: Connection, artifact: UnlArtifact, chunk_size: int) -> Iterator[bytes]:
+    with unl_file_open(db, artifact) as blob:
+        while True:
+            chunk = blob.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _gunzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    decoder = zlib.decompressobj(wbits=31)
+    for chunk in chunks:
+        data = decoder.decompress(chunk)
+        if data:
+            yield data
+    tail = decoder.flush()
+    if tail:
+        yield tail
+
+
+def unl_file_chunks(db: Connection, artifact: UnlArtifact, decompress: bool = True,
+                    chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Содержимое артефакта частями: BLOB читается через blobopen, без копии
+    целиком в памяти. decompress=False - сжатые данные как есть (gzip).
+    """
+    chunks = _blob_chunks(db, artifact, chunk_size)
+    return _gunzip(chunks) if decompress else chunks
+
+
+def unl_decompress_chunks(stored: bytes, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Распаковка сжатого тела артефакта (unl_file_read) частями, без обращения к базе"""
+    return _gunzip(stored[offset:offset + chunk_size] for offset in range(0, len(stored), chunk_size))
+
+
 def unl_file_content_get(db: Connection, groups_id: str) -> Optional[bytes]:
     """Получает содержимое файла по group_id или возвращает None"""
-    cursor = db.cursor()
-    cursor.execute('SELECT content FROM files WHERE groups_id = ?', (groups_id,))
-    result = cursor.fetchone()
-    return result[0] if result else None
+    artifact = unl_file_info(db, groups_id)
+    if artifact is None:
+        return None
+    return b''.join(unl_file_chunks(db, artifact))
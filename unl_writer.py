@@ -0,0 +1,99 @@
+import base64
+import hashlib
+import itertools
+import uuid
+from typing import BinaryIO, Dict, Iterable, List, Optional
+
+# Кратно 3 байтам, чтобы куски base64 склеивались без паддинга внутри
+CHUNK_SIZE = 3 * 16 * 1024
+
+
+def lab_attributes(lab_name: str, guid: str) -> Dict[str, str]:
+    """Атрибуты корневого элемента <lab> UNL-файла"""
+    return {
+        "name": lab_name,
+        "id": guid,
+        "version": "1",
+        "scripttimeout": "300",
+        "password": hashlib.md5(guid.encode()).hexdigest(),
+        "author": "1",
+        "countdown": "60",
+        "darkmode": "",
+        "mode3d": "",
+        "nogrid": "",
+        "joinable": "2",
+        "joinable_emails": "admin",
+        "openable": "2",
+        "openable_emails": "admin",
+        "editable": "2",
+        "editable_emails": "admin",
+        "multi_config_active": ""
+    }
+
+
+def _escape_attrib(text: str) -> str:
+    """Экранирование значения атрибута так же, как в xml.etree.ElementTree"""
+    return (text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+            .replace("\"", "&quot;").replace("\r", "&#13;").replace("\n", "&#10;")
+            .replace("\t", "&#09;"))
+
+
+def write_base64(out: BinaryIO, parts: Iterable[str], chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Потоковое base64-кодирование текста (UTF-8): части копятся до chunk_size байт
+    и кодируются одним куском, в памяти - не больше куска и одной части.
+    Возвращает количество закодированных байт.
+    """
+    pending: List[bytes] = []
+    filled = 0
+    total = 0
+    for part in parts:
+        data = part.encode("utf-8")
+        pending.append(data)
+        filled += len(data)
+        if filled >= chunk_size:
+            block = b"".join(pending)
+            # Остаток (меньше 3 байт) переходит в следующий кусок: паддинга внутри нет
+            size = filled - filled % 3
+            with memoryview(block) as view:
+                out.write(base64.b64encode(view[:size]))
+            total += size
+            pending = [block[size:]]
+            filled -= size
+    if filled:
+        out.write(base64.b64encode(b"".join(pending)))
+        total += filled
+    return total
+
+
+def write_unl(out: BinaryIO, lab_name: str, topology_parts: Iterable[str], workbook_base64: str,
+              guid: Optional[str] = None) -> None:
+    """
+    Потоковая запись UNL-файла в файл или поток ответа.
+
+    Выходные байты совпадают с create_lab_xml, но HTML топологии кодируется
+    в base64 по частям и пишется сразу в out, без промежуточных копий.
+    guid - идентификатор лабораторной работы (по умолчанию новый).
+    """
+    guid = guid or str(uuid.uuid4())
+    attributes = " ".join(f'{key}="{_escape_attrib(value)}"' for key, value in lab_attributes(lab_name, guid).items())
+    out.write(f"<?xml version='1.0' encoding='utf-8'?>\n<lab {attributes}>".encode("utf-8"))
+    out.write(b'<topology /><objects><textobjects>'
+              b'<textobject id="physical-topology" name="physical" type="text">')
+    parts = iter(topology_parts)
+    first_part = next((part for part in parts if part), '')
+    if first_part:
+        out.write(b'<data>')
+        write_base64(out, itertools.chain((first_part,), parts))
+        out.write(b'</data>')
+    else:
+        # ElementTree сворачивает пустой элемент в <data />
+        out.write(b'<data />')
+    out.write(b'</textobject></textobjects></objects>')
+    if workbook_base64:
+        out.write(b'<workbooks><workbook id="Manual" weight="0" type="html"><content><page>')
+        out.write(workbook_base64.encode("utf-8"))
+        out.write(b'</page></content></workbook></workbooks>')
+    else:
+        out.write(b'<workbooks />')
+    out.write(b'</lab>')
@@ -0,0 +1,153 @@
+from dataclasses import dataclass
+from sqlite3 import Connection
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+# Диапазон VLAN по умолчанию для каждого домена (группы коммутаторов аудитории):
+# первый, последний, шаг
+DEFAULT_VLAN_RANGE = (10, 1000, 10)
+
+
+class VlanPoolExhaustedError(Exception):
+    """В доменах нет общего свободного VLAN"""
+
+
+@dataclass
+class VlanDomain:
+    """Состояние пула VLAN одного домена: битовая карта занятых номеров"""
+    domain: str
+    first_vlan: int
+    last_vlan: int
+    step: int
+    bitmap: bytearray
+    next_index: int
+    dirty: bool = False
+
+    @property
+    def size(self) -> int:
+        return (self.last_vlan - self.first_vlan) // self.step + 1
+
+    def index_of(self, vlan: int) -> Optional[int]:
+        """Номер бита для VLAN или None, если VLAN вне диапазона домена"""
+        try:
+            vlan = int(vlan)
+        except (TypeError, ValueError):
+            return None
+        if vlan < self.first_vlan or vlan > self.last_vlan or (vlan - self.first_vlan) % self.step:
+            return None
+        return (vlan - self.first_vlan) // self.step
+
+    def vlan_of(self, index: int) -> int:
+        return self.first_vlan + index * self.step
+
+    def is_free(self, vlan: int) -> bool:
+        index = self.index_of(vlan)
+        return index is not None and not self.bitmap[index >> 3] & (1 << (index & 7))
+
+    def set(self, vlan: int, used: bool) -> None:
+        index = self.index_of(vlan)
+        if index is None:
+            return
+        if used:
+            self.bitmap[index >> 3] |= 1 << (index & 7)
+        else:
+            self.bitmap[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+        self.dirty = True
+
+    def free_vlans(self) -> Iterator[int]:
+        """Свободные VLAN по кругу, начиная с курсора; полностью занятые байты пропускаются"""
+        size = self.size
+        if size <= 0:
+            return
+        start = self.next_index % size
+        for low, high in ((start, size), (0, start)):
+            index = low
+            while index < high:
+                byte = self.bitmap[index >> 3]
+                if not index & 7 and byte == 0xFF:
+                    index += 8
+                    continue
+                if not byte & (1 << (index & 7)):
+                    yield self.vlan_of(index)
+                index += 1
+
+
+def _load_domain(db: Connection, domain: str) -> VlanDomain:
+    row = db.execute(
+        "SELECT first_vlan, last_vlan, step, bitmap, next_index FROM vlan_pool WHERE domain = ?", (domain,)
+    ).fetchone()
+    if row:
+        first_vlan, last_vlan, step, bitmap, next_index = row
+        return VlanDomain(domain, first_vlan, last_vlan, step, bytearray(bitmap), next_index)
+    return _new_domain(db, domain, *DEFAULT_VLAN_RANGE)
+
+
+def _new_domain(db: Connection, domain: str, first_vlan: int, last_vlan: int, step: int) -> VlanDomain:
+    """Новый домен; занятые VLAN берутся из vlan_config"""
+    if step <= 0 or last_vlan < first_vlan:
+        raise ValueError(f"Некорректный диапазон VLAN: {first_vlan}-{last_vlan}, шаг {step}")
+    size = (last_vlan - first_vlan) // step + 1
+    state = VlanDomain(domain, first_vlan, last_vlan, step, bytearray((size + 7) // 8), 0, dirty=True)
+    for (vlan,) in db.execute(
+            "SELECT vlan FROM vlan_config WHERE audience = ? AND groups_id != 0", (domain,)):
+        state.set(vlan, True)
+    return state
+
+
+def _save_domain(db: Connection, state: VlanDomain) -> None:
+    db.execute("""
+        INSERT OR REPLACE INTO vlan_pool (domain, first_vlan, last_vlan, step, bitmap, next_index)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (state.domain, state.first_vlan, state.last_vlan, state.step, bytes(state.bitmap), state.next_index))
+    state.dirty = False
+
+
+def vlan_pool_configure(db: Connection, domain: str, first_vlan: int, last_vlan: int, step: int) -> None:
+    """Задаёт диапазон и шаг VLAN домена (состояние пересчитывается по vlan_config)"""
+    _save_domain(db, _new_domain(db, domain, first_vlan, last_vlan, step))
+    db.commit()
+    return None
+
+
+class VlanPool:
+    """
+    Пулы VLAN доменов в рамках одной транзакции вызывающего кода.
+    Изменённые битовые карты записываются в базу методом save().
+    """
+
+    def __init__(self, db: Connection):
+        self.db = db
+        self.domains: Dict[str, VlanDomain] = {}
+
+    def domain(self, name: str) -> VlanDomain:
+        if name not in self.domains:
+            self.domains[name] = _load_domain(self.db, name)
+        return self.domains[name]
+
+    def allocate(self, domains: Iterable[str]) -> Optional[int]:
+        """Свободный во всех указанных доменах VLAN; помечается занятым. None - пул исчерпан"""
+        states = [self.domain(name) for name in dict.fromkeys(domains)]
+        if not states:
+            return None
+        primary, others = states[0], states[1:]
+        for vlan in primary.free_vlans():
+            if all(state.is_free(vlan) for state in others):
+                for state in states:
+                    state.set(vlan, True)
+                primary.next_index = primary.index_of(vlan) + 1
+                return vlan
+        return None
+
+    def reserve(self, domains: Iterable[str], vlan: int) -> None:
+        """Помечает занятым заранее известный VLAN (например, VLAN порта PC)"""
+        for name in dict.fromkeys(domains):
+            self.domain(name).set(vlan, True)
+
+    def release(self, rows: Iterable[Tuple[str, int]]) -> None:
+        """Массовое освобождение VLAN: пары (домен, vlan)"""
+        for name, vlan in rows:
+            self.domain(name).set(vlan, False)
+
+    def save(self) -> None:
+        for state in self.domains.values():
+            if state.dirty:
+                _save_domain(self.db, state)